@@ -9,9 +9,16 @@ from aiogram.filters import Command, CommandObject
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.models import User, Admins, History, Punishment
+from app.database.models import User, Admins, History, Punishment, MemeCountry
+import app.database.requests as rq
 from app.filters import IsRPAdmin, IsCountryRuler
+from app.text_commands import TextCommand
 from app.utils.html_helpers import escape_html
+from app.database.profiler import profiler
+from app.database.render_cache import render_cache
+from app.database.session import pool_status
+from app.broadcast import Broadcaster
+from app.fsm_storage import DatabaseStorage
 from config import OWNER_ID
 
 admin_router = Router()
@@ -19,7 +26,7 @@ admin_router = Router()
 
 
 # ==================== РП НАЗНАЧИТЬ ====================
-@admin_router.message(F.text.lower().startswith("рп назначить"))
+@admin_router.message(TextCommand("рп назначить"))
 async def handle_set_admin_level(message: Message, session: AsyncSession):
     try:
         args = message.text.strip().split()
@@ -64,8 +71,7 @@ async def handle_set_admin_level(message: Message, session: AsyncSession):
         if caller_id == OWNER_ID:
             caller_level = 5
         else:
-            result = await session.execute(select(Admins.adminlevel).where(Admins.user_id == caller_id))
-            caller_level = result.scalar() or 0
+            caller_level = await rq.get_current_user_admin_level(session, caller_id)
             if caller_level < 5:
                 await message.reply("🚫 У вас нет прав для назначения админов.")
                 return
@@ -109,7 +115,7 @@ async def handle_set_admin_level(message: Message, session: AsyncSession):
 
 
 # ==================== РП СНЯТЬ ====================
-@admin_router.message(F.text.lower().startswith("рп снять"))
+@admin_router.message(TextCommand("рп снять"))
 async def handle_remove_admin(message: Message, session: AsyncSession):
     try:
         args = message.text.strip().split()
@@ -151,8 +157,7 @@ async def handle_remove_admin(message: Message, session: AsyncSession):
         if caller_id == OWNER_ID:
             caller_level = 5
         else:
-            result = await session.execute(select(Admins.adminlevel).where(Admins.user_id == caller_id))
-            caller_level = result.scalar() or 0
+            caller_level = await rq.get_current_user_admin_level(session, caller_id)
             if caller_level < 5:
                 await message.reply("🚫 Недостаточно прав.")
                 return
@@ -183,7 +188,7 @@ async def handle_remove_admin(message: Message, session: AsyncSession):
 
 
 # ==================== РП АДМИНЫ (СПИСОК) ====================
-@admin_router.message(F.text.lower().startswith("рп админы"))
+@admin_router.message(TextCommand("рп админы"))
 async def list_admins(message: Message, session: AsyncSession):
     try:
         result = await session.execute(
@@ -213,7 +218,7 @@ async def list_admins(message: Message, session: AsyncSession):
 
 
 # ==================== РП НАЧИСЛИТЬ (ОБЫЧНЫЙ АДМИН) ====================
-@admin_router.message(F.text.lower().startswith("рп начислить"))
+@admin_router.message(TextCommand("рп начислить"))
 async def handle_give_points(message: Message, session: AsyncSession):
     try:
         args = message.text.strip().split()
@@ -269,8 +274,7 @@ async def handle_give_points(message: Message, session: AsyncSession):
         if caller_id == OWNER_ID:
             caller_level = 5
         else:
-            result = await session.execute(select(Admins.adminlevel).where(Admins.user_id == caller_id))
-            caller_level = result.scalar() or 0
+            caller_level = await rq.get_current_user_admin_level(session, caller_id)
 
         if caller_level < 1:
             await message.reply("🚫 У вас нет прав на начисление очков.")
@@ -289,26 +293,14 @@ async def handle_give_points(message: Message, session: AsyncSession):
             return
 
         # Проверка иерархии
-        target_admin_result = await session.execute(select(Admins.adminlevel).where(Admins.user_id == target_user.user_id))
-        target_level = target_admin_result.scalar() or 0
+        target_level = await rq.get_current_user_admin_level(session, target_user.user_id)
 
         if caller_id != OWNER_ID and target_level >= caller_level:
             await message.reply("🚫 Вы не можете изменять очки админу равного или выше вас.")
             return
 
-        # Начисление
-        target_user.points = (target_user.points or 0) + points
-        session.add(target_user)
-
-        # Запись в историю
-        session.add(History(
-            admin_id=caller_id,
-            target_id=target_user.user_id,
-            event_type="admin_give",
-            points=points,
-            reason=reason,
-            timestamp=datetime.now()
-        ))
+        # Начисление + запись в историю (один запрос)
+        await rq.credit(session, target_user.user_id, points, event_type="admin_give", reason=reason, admin_id=caller_id)
 
         # Ответ
         display_name = target_user.userfullname or f"@{target_user.username or 'без_ника'}"
@@ -328,7 +320,7 @@ async def handle_give_points(message: Message, session: AsyncSession):
         await message.reply("❌ Ошибка при начислении очков.")
 
 # ==================== РП ИСТОРИЯ (ПОСЛЕДНИЕ ДЕЙСТВИЯ) ====================
-@admin_router.message(F.text.lower().startswith("рп история"))
+@admin_router.message(TextCommand("рп история"))
 async def admin_history(message: Message, session: AsyncSession):
     try:
         limit = 20
@@ -650,4 +642,121 @@ async def reset_country_cooldown(message: Message, session: AsyncSession, comman
 
     except Exception as e:
         logger.error(f"[RESET CD ERROR] {e}")
-        await message.reply("❌ Ошибка при сбросе кулдауна.")
\ No newline at end of file
+        await message.reply("❌ Ошибка при сбросе кулдауна.")
+# ========================================================
+# РАССЫЛКА ВО ВСЕ ЧАТЫ СТРАН (/broadcast)
+# ========================================================
+@admin_router.message(Command("broadcast"), IsRPAdmin())
+async def broadcast_to_countries(
+    message: Message,
+    session: AsyncSession,
+    command: CommandObject,
+    broadcaster: Broadcaster
+):
+    """/broadcast <текст> — объявление во все чаты стран (уровень 4+)."""
+    level = await rq.get_current_user_admin_level(session, message.from_user.id)
+    if level < 4:
+        await message.reply("⛔ Рассылка доступна с 4 уровня админки.")
+        return
+
+    if not command.args:
+        await message.reply("❗ Формат: <code>/broadcast &lt;текст&gt;</code>", parse_mode="HTML")
+        return
+
+    chat_ids = (await session.scalars(select(MemeCountry.chat_id))).all()
+    if not chat_ids:
+        await message.reply("📭 Стран пока нет — рассылать некуда.")
+        return
+
+    text = f"📢 <b>Объявление администрации</b>\n\n{escape_html(command.args)}"
+    count = broadcaster.broadcast(chat_ids, text, report_to=message.chat.id, parse_mode="HTML")
+    await message.reply(f"📨 Рассылка поставлена в очередь: {count} чатов. Итог пришлю сюда.")
+
+
+# ========================================================
+# SQL-СТАТИСТИКА ПО ХЕНДЛЕРАМ (/dbstats)
+# ========================================================
+@admin_router.message(Command("dbstats"), IsRPAdmin())
+async def db_stats(
+    message: Message,
+    command: CommandObject,
+    update_scheduler=None,
+    broadcaster=None,
+    job_scheduler=None,
+    fsm_storage=None,
+):
+    """
+    /dbstats [db_time|queries|duration|count] — топ хендлеров по нагрузке на БД.
+    /dbstats reset — обнулить накопленное (только владелец).
+    """
+    arg = (command.args or "db_time").strip().lower()
+
+    if arg == "reset":
+        if message.from_user.id != OWNER_ID:
+            await message.reply("⛔ Сбрасывать статистику может только владелец.")
+            return
+        profiler.reset()
+        await message.reply("🧹 Статистика профайлера сброшена.")
+        return
+
+    if arg not in ("db_time", "queries", "duration", "count"):
+        await message.reply(
+            "❗ Формат: <code>/dbstats [db_time|queries|duration|count]</code> или <code>/dbstats reset</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    top = profiler.top(10, arg)
+    if not top:
+        await message.reply("📭 Статистики пока нет.")
+        return
+
+    lines = [f"<b>📊 Хендлеры по {arg}</b> (p50/p99 — границы корзин)\n"]
+    for name, stats in top:
+        count = stats.duration_ms.total
+        lines.append(
+            f"• <code>{escape_html(name)}</code> — {count} апд.\n"
+            f"  ⏱ p50 ≤{stats.duration_ms.quantile(0.5):g} мс, p99 ≤{stats.duration_ms.quantile(0.99):g} мс"
+            f"{f', медленных: {stats.slow}' if stats.slow else ''}\n"
+            f"  🗄 {stats.queries.sum / count:.1f} SQL/апд, {stats.db_time * 1000 / count:.1f} мс БД/апд, "
+            f"{stats.rows / count:.1f} строк/апд"
+        )
+
+    if update_scheduler is not None:
+        s = update_scheduler.snapshot()
+        lines.append(
+            f"\n<b>🚦 Очередь апдейтов:</b> в работе {s['in_flight']}/{s['max_concurrency']}, "
+            f"в очередях {s['queued']}, ждут слот {s['waiting_for_slot']}, отброшено {s['dropped']}, "
+            f"ожидание ср. {s['avg_wait_ms']} мс / макс. {s['max_wait_ms']} мс"
+        )
+    if broadcaster is not None:
+        b = broadcaster.snapshot()
+        lines.append(
+            f"\n<b>📨 Рассылки:</b> в очереди {b['pending']}, отправлено {b['sent']}, "
+            f"ошибок {b['failed']}, повторов {b['retried']}"
+        )
+    if job_scheduler is not None:
+        j = job_scheduler.snapshot()
+        lines.append(
+            f"\n<b>🗓 Фоновые задачи:</b> {j['jobs']}, выполняются: {', '.join(j['running']) or 'нет'}"
+        )
+    lookups = render_cache.hits + render_cache.misses
+    if lookups:
+        lines.append(
+            f"\n<b>🖼 Кэш сообщений:</b> {len(render_cache)} шт., попаданий {render_cache.hits / lookups:.0%} из {lookups}"
+        )
+    if isinstance(fsm_storage, DatabaseStorage):
+        lines.append(
+            f"\n<b>📝 FSM:</b> в памяти {len(fsm_storage)} ключей, чтений из БД {fsm_storage.loads}, "
+            f"записей пачкой {fsm_storage.flushes}"
+        )
+    pool = pool_status()
+    lines.append(
+        f"\n<b>🔌 Пул БД:</b> занято {pool['checked_out']}/{pool['capacity']} "
+        f"({pool['saturation']:.0%}), переполнение {pool['overflow']}"
+    )
+    lines.append(
+        f"\n🔧 Вне апдейтов: {profiler.background_queries} SQL, {profiler.background_db_time:.1f} с"
+    )
+
+    await message.reply("\n".join(lines), parse_mode="HTML")
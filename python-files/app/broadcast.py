@@ -0,0 +1,261 @@
+"""
+Очередь исходящих сообщений с учётом лимитов Telegram.
+
+Рассылки (ежедневный бонус, объявления РП-ивентов, админская рассылка)
+не шлют сообщения сами, а кладут их сюда:
+- общий token bucket — не больше BROADCAST_GLOBAL_RATE сообщений в секунду на бота;
+- bucket на чат — в группу не чаще BROADCAST_GROUP_PER_MINUTE в минуту,
+  в личку не чаще раза в секунду. Чат, у которого лимит исчерпан,
+  не держит воркер — сообщение откладывается и возвращается в очередь;
+- TelegramRetryAfter — ждём ровно столько, сколько сказал сервер,
+  и повторяем (до BROADCAST_MAX_RETRIES раз);
+- отправляют BROADCAST_WORKERS воркеров параллельно.
+
+send() возвращает future с результатом (Message) или ошибкой.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from config import (
+    BROADCAST_WORKERS,
+    BROADCAST_GLOBAL_RATE,
+    BROADCAST_GROUP_PER_MINUTE,
+    BROADCAST_MAX_RETRIES,
+    BROADCAST_QUEUE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас."""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена (0 — можно прямо сейчас, токен списан)."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while (wait := self.delay()) > 0:
+            await asyncio.sleep(wait)
+
+    def block(self, seconds: float) -> None:
+        """Flood control от Telegram: ничего не отправлять seconds секунд."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class _Outbound:
+    __slots__ = ("method", "future", "attempts")
+
+    def __init__(self, method: TelegramMethod, future: asyncio.Future):
+        self.method = method
+        self.future = future
+        self.attempts = 0
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = BROADCAST_WORKERS,
+        global_rate: float = BROADCAST_GLOBAL_RATE,
+        group_per_minute: float = BROADCAST_GROUP_PER_MINUTE,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+        queue_size: int = BROADCAST_QUEUE_SIZE,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.group_rate = group_per_minute / 60
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self.queue_size = queue_size
+        # Очередь без ограничения: отложенные сообщения возвращаются в неё всегда,
+        # а лимит queue_size проверяется при постановке (по числу неотправленных)
+        self._queue: asyncio.Queue[_Outbound] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # ==========================================
+    # ЖИЗНЕННЫЙ ЦИКЛ
+    # ==========================================
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"📨 Очередь рассылок запущена: {self.workers} воркеров.")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Досылает то, что успеет за timeout секунд, остальное отменяет."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Рассылка не успела: {self._pending} сообщений отменено.")
+        for task in [*self._workers, *self._background]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._background, return_exceptions=True)
+        self._workers.clear()
+
+    # ==========================================
+    # ПОСТАНОВКА В ОЧЕРЕДЬ
+    # ==========================================
+    def submit(self, method: TelegramMethod) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if self._pending >= self.queue_size:
+            self.failed += 1
+            future.set_exception(RuntimeError("Очередь рассылки переполнена"))
+            future.exception()
+            logger.warning(f"⚠️ Очередь рассылки переполнена, сообщение в {getattr(method, 'chat_id', '?')} отброшено.")
+            return future
+        self._queue.put_nowait(_Outbound(method, future))
+        self._pending += 1
+        self._idle.clear()
+        return future
+
+    def send(self, chat_id: int, text: str, **kwargs: Any) -> asyncio.Future:
+        return self.submit(SendMessage(chat_id=chat_id, text=text, **kwargs))
+
+    def broadcast(self, chat_ids: Iterable[int], text: str, report_to: Optional[int] = None, **kwargs: Any) -> int:
+        """
+        Рассылает text во все chat_ids. Если задан report_to — по окончании
+        отправит туда итог «доставлено / не доставлено». Возвращает число чатов.
+        """
+        futures = [self.send(chat_id, text, **kwargs) for chat_id in set(chat_ids)]
+        if report_to is not None:
+            task = asyncio.create_task(self._report(futures, report_to))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return len(futures)
+
+    async def _report(self, futures: list[asyncio.Future], chat_id: int) -> None:
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        failed = sum(isinstance(r, BaseException) for r in results)
+        self.send(chat_id, f"📬 Рассылка завершена: доставлено {len(results) - failed}, не доставлено {failed}.")
+
+    # ==========================================
+    # ОТПРАВКА
+    # ==========================================
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Группы и каналы — отрицательные id (или @username), личка — положительные
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = self._chats[chat_id] = TokenBucket(1.0 if private else self.group_rate, 1)
+        return bucket
+
+    def _requeue_later(self, item: _Outbound, delay: float) -> None:
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item)
+
+    def _resolve(self, item: _Outbound, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if not item.future.done():
+            if error is None:
+                item.future.set_result(result)
+            else:
+                item.future.set_exception(error)
+                # Никто может и не ждать результат — не засоряем лог "exception was never retrieved"
+                item.future.exception()
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+            self._prune_buckets()
+
+    def _prune_buckets(self) -> None:
+        """Забываем чаты, чей bucket уже полон снова: новый будет ровно таким же."""
+        now = time.monotonic()
+        self._chats = {
+            chat_id: b for chat_id, b in self._chats.items()
+            if b.blocked_until > now or b.tokens + (now - b.updated) * b.rate < b.capacity
+        }
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                logger.error(f"Воркер рассылки #{number} упал на сообщении: {e}", exc_info=True)
+                self._resolve(item, error=e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: _Outbound) -> None:
+        chat_id = getattr(item.method, "chat_id", None)
+        bucket = self._chat_bucket(chat_id)
+        wait = bucket.delay()
+        if wait > 0:
+            # Лимит чата исчерпан — не держим воркер, вернёмся позже
+            self._requeue_later(item, wait)
+            return
+
+        await self._global.acquire()
+        item.attempts += 1
+        try:
+            result = await self.bot(item.method)
+        except TelegramRetryAfter as e:
+            bucket.block(e.retry_after)
+            if item.attempts > self.max_retries:
+                self.failed += 1
+                logger.warning(f"⚠️ Чат {chat_id}: flood control, попытки кончились ({item.attempts}).")
+                self._resolve(item, error=e)
+                return
+            self.retried += 1
+            logger.info(f"⏳ Чат {chat_id}: flood control, повтор через {e.retry_after} с.")
+            self._requeue_later(item, e.retry_after)
+        except TelegramNetworkError as e:
+            if item.attempts > self.max_retries:
+                self.failed += 1
+                self._resolve(item, error=e)
+                return
+            self.retried += 1
+            self._requeue_later(item, 2 ** item.attempts)
+        except TelegramAPIError as e:
+            # Бот кикнут, чат удалён, кривая разметка — повторять бессмысленно
+            self.failed += 1
+            logger.warning(f"Ошибка рассылки в чат {chat_id}: {e}")
+            self._resolve(item, error=e)
+        else:
+            self.sent += 1
+            self._resolve(item, result)
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "pending": self._pending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "chats_tracked": len(self._chats),
+        }
@@ -4,6 +4,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime, timedelta 
 from aiogram.enums import ParseMode, ChatType
 from aiogram.enums import ContentType 
@@ -14,12 +15,14 @@ from sqlalchemy import func
 
 from config import REVIEW_COOLDOWN_DAYS
 from .database.models import User, MemeCountry, CountryReview
+from .database.render_cache import render_cache
+from .database.user_middleware import LazyUser
 import app.keyboard as kb
 import logging
 
 # Устанавливаем КД в секундах (например, 7 дней)
 COUNTRY_CREATE_COOLDOWN = 7 * 24 * 60 * 60 # 604800 секунд
-from app.keyboard import country_edit_menu, country_edit_confirm, cancel_inline_keyboard, back_to_menu_inline_keyboard
+from app.keyboard import country_edit_menu, country_edit_confirm, cancel_inline_keyboard, back_to_menu_inline_keyboard, country_list_keyboard
 from app.database.requests import (
     get_or_create_user, 
     get_full_user_profile, 
@@ -37,6 +40,7 @@ from app.database.requests import (
     collect_taxes,
     get_all_countries,
     get_global_stats,
+    get_leaderboard_rank,
     has_active_country_ban,
     check_creation_allowed,
     get_creation_status,
@@ -100,7 +104,7 @@ class CountryEditStates(StatesGroup):
 # ==========================================
 # A. ХЕНДЛЕР: НАЧАЛО /createcountry
 # ==========================================
-@country_create_router.message(Command("createcountry"))
+@country_create_router.message(Command("createcountry"), flags={"user": True})
 async def cmd_create_country(
     message: types.Message, 
     state: FSMContext, 
@@ -565,7 +569,7 @@ async def edit_flag_handler(message: types.Message, state: FSMContext, session:
 # ==========================================
 # 2. ХЕНДЛЕР: ВСТУПЛЕНИЕ В СТРАНУ (/join)
 # ==========================================
-@country_create_router.message(Command("join")) 
+@country_create_router.message(Command("join"), flags={"user": True})
 async def cmd_join_country_explicit(
     message: types.Message,
     session: AsyncSession,
@@ -612,7 +616,7 @@ async def cmd_join_country_explicit(
 # ==========================================
 # 3. ХЕНДЛЕР: ВЫХОД ИЗ СТРАНЫ (/leave)
 # ==========================================
-@country_create_router.message(Command("leave"))
+@country_create_router.message(Command("leave"), flags={"user": True})
 async def cmd_leave_country(
     message: types.Message,
     session: AsyncSession,
@@ -642,13 +646,14 @@ async def cmd_leave_country(
 # ==========================================
 @country_create_router.message(Command("mycountry"))
 @country_create_router.message(Command("country"))
-async def cmd_my_country(message: types.Message, session: AsyncSession, **kwargs): # Добавили **kwargs
+async def cmd_my_country(message: types.Message, session: AsyncSession, user: LazyUser, **kwargs): # Добавили **kwargs
     user_id = message.from_user.id
-    
-    # Получаем данные через твой requests.py
-    stats = await get_my_country_stats(session, user_id)
-    
-    if not stats:
+
+    # Профиль обычно уже в кэше — страну узнаём без запросов
+    profile = await user
+    card = await _render_country_card(session, user_id, profile.country_id if profile else None)
+
+    if card is None:
         await message.answer(
             "🏚 <b>Вы бездомный странник.</b>\n"
             "Вы не состоите ни в одной стране.\n\n"
@@ -658,9 +663,57 @@ async def cmd_my_country(message: types.Message, session: AsyncSession, **kwargs
         )
         return
 
+    text, avatar_url, country_id = card
+
+    # Пытаемся отправить фото, если оно есть
+    if avatar_url:
+        try:
+            await message.answer_photo(
+                photo=avatar_url,
+                caption=text,
+                parse_mode=ParseMode.HTML
+            )
+            return # Если отправили фото, выходим из функции
+        except Exception as e:
+            # Если file_id битый или тип ChatPhoto — логируем и шлем текстом
+            logger.error(f"Ошибка отправки фото страны {country_id}: {e}")
+            # Не делаем return, код пойдет дальше и отправит текст ниже
+
+    # Отправляем текстом (если фото нет или оно выдало ошибку)
+    await message.answer(
+        text=text,
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True
+    )
+
+
+async def _render_country_card(session: AsyncSession, user_id: int, country_id: int | None):
+    """
+    (текст, avatar_url, country_id) карточки страны или None, если страны нет.
+    Готовая карточка берётся из render_cache — без запросов к БД.
+    """
+    # Версия — до чтения из БД: если страну поменяют, пока мы читаем,
+    # карточка ляжет под старой версией и отдаваться не будет
+    version = None
+    if country_id is not None:
+        version = render_cache.country_version(country_id)
+        cached = render_cache.get("country_card", country_id, version)
+        if cached is not None:
+            return cached
+
+    # Получаем данные через твой requests.py
+    stats = await get_my_country_stats(session, user_id)
+    if not stats:
+        return None
+
     country = stats["country"]
+    if country.country_id != country_id:
+        # Профиль из кэша отстал: версии настоящей страны до чтения у нас нет — не кэшируем
+        version = None
     citizens_count = stats["citizens_count"]
     total_citizen_points = stats["citizens_total_points"]
+    influence_rank = await get_leaderboard_rank(session, "influence", country.country_id)
+    rating_rank = await get_leaderboard_rank(session, "rating", country.country_id)
     
     # Форматирование (используем html.escape для безопасности)
     name_safe = html.escape(country.name)
@@ -687,28 +740,14 @@ async def cmd_my_country(message: types.Message, session: AsyncSession, **kwargs
         f"✨ <b>Очки Влияния (Страна):</b> {country.influence_points}\n"
         f"💎 <b>Богатство граждан:</b> {total_citizen_points}\n"
         f"⭐ <b>Рейтинг:</b> {country.avg_rating:.1f}"
+        + (f"\n🏅 <b>Место:</b> #{influence_rank[0]} по влиянию, #{rating_rank[0]} по рейтингу"
+           if influence_rank and rating_rank else "")
     )
-    
-    # Пытаемся отправить фото, если оно есть
-    if country.avatar_url:
-        try:
-            await message.answer_photo(
-                photo=country.avatar_url,
-                caption=text,
-                parse_mode=ParseMode.HTML
-            )
-            return # Если отправили фото, выходим из функции
-        except Exception as e:
-            # Если file_id битый или тип ChatPhoto — логируем и шлем текстом
-            logger.error(f"Ошибка отправки фото страны {country.country_id}: {e}")
-            # Не делаем return, код пойдет дальше и отправит текст ниже
 
-    # Отправляем текстом (если фото нет или оно выдало ошибку)
-    await message.answer(
-        text=text,
-        parse_mode=ParseMode.HTML,
-        disable_web_page_preview=True
-    )
+    card = (text, country.avatar_url, country.country_id)
+    if version is not None:
+        render_cache.put("country_card", country.country_id, version, card)
+    return card
 
 # ===============================================================
 # ХЕЛПЕР ФУНКЦИЯ ДЛЯ ПОИСКА ЦЕЛИ (ПО REPLY ИЛИ ARGS)
@@ -822,7 +861,7 @@ async def cmd_kick_user(message: types.Message, session: AsyncSession, **kwargs)
 # ==========================================
 # 10. УСТАНОВКА Должности (/setposition)
 # ==========================================
-@country_create_router.message(Command("setposition"))
+@country_create_router.message(Command("setposition"), flags={"user": True})
 async def cmd_set_position(message: Message, session: AsyncSession, command: CommandObject, user: User):
     """
     Установка должности с использованием Match-Case.
@@ -892,8 +931,47 @@ async def cmd_country_list(message: types.Message, session: AsyncSession):
     args = message.text.split()
     page = int(args[1]) if len(args) > 1 and args[1].isdigit() else 1
     
-    countries_list = await get_all_countries(session, page)
-    await message.answer(countries_list, parse_mode="HTML")
+    countries_list, markup, _ = await _render_country_list(session, page)
+    await message.answer(
+        countries_list,
+        reply_markup=markup,
+        parse_mode="HTML"
+    )
+
+@country_create_router.callback_query(F.data.startswith("clist:"))
+async def on_country_list_page(call: types.CallbackQuery, session: AsyncSession):
+    # Формат: clist:PAGE:CURSOR — листаем курсором, без OFFSET
+    _, page, cursor = call.data.split(":", 2)
+    countries_list, markup, found = await _render_country_list(session, int(page), cursor)
+    if not found:
+        return await call.answer("Эта страница не существует.", show_alert=True)
+    try:
+        await call.message.edit_text(
+            countries_list,
+            reply_markup=markup,
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        pass
+    await call.answer()
+
+async def _render_country_list(session: AsyncSession, page: int, cursor: str | None = None):
+    """(текст, клавиатура, есть ли страны) страницы /countrylist — из render_cache, если есть."""
+    version = render_cache.list_version()
+    cached = render_cache.get("countrylist", (page, cursor), version)
+    if cached is not None:
+        return cached
+
+    countries_list, result = await get_all_countries(session, page, cursor=cursor)
+    rendered = (
+        countries_list,
+        country_list_keyboard(page, result.prev_cursor, result.next_cursor),
+        bool(result.countries),
+    )
+    # Пустые страницы не кэшируем: страна может появиться в любой момент
+    if result.countries:
+        render_cache.put("countrylist", (page, cursor), version, rendered)
+    return rendered
 
 # ==========================================
 # 13. СПИСОК СТРАН (/donate)
@@ -0,0 +1,111 @@
+"""
+Уровни админов в памяти процесса: user_id -> adminlevel.
+
+Проверка прав (фильтр IsRPAdmin, get_current_user_admin_level, give_points,
+команды РП-ивентов) — поиск в словаре, без SELECT по admins на каждое
+сообщение.
+
+Загружается на старте (prepare_database), дальше обновляется сам:
+слушатель after_flush ловит ORM-изменения Admins (add_admin, «рп админ»,
+«рп снять»), after_commit применяет их, after_rollback — выбрасывает.
+В режиме воркеров изменения после коммита рассылаются остальным процессам
+(peers); правки в обход бота подтягивает полная перезагрузка
+(admin_levels_refresher в app/tasks.py).
+
+Пока словарь не загружен (ready=False), уровень читается через SQL, как раньше.
+Туда же он откатывается, если изменение пришло без значения уровня.
+"""
+import logging
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import peers
+from .models import Admins
+
+logger = logging.getLogger(__name__)
+
+# Ключ в session.info: user_id -> новый уровень (0 — больше не админ, None — неизвестен)
+_PENDING = "admin_levels_pending"
+
+
+class AdminLevels:
+    def __init__(self):
+        self.ready = False
+        self._levels: dict[int, int] = {}
+        self._replay: Optional[list[tuple[int, int]]] = None  # Изменения, пришедшие во время load()
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    async def load(self, session: AsyncSession) -> None:
+        self._replay = []
+        try:
+            rows = (await session.execute(select(Admins.user_id, Admins.adminlevel))).all()
+        finally:
+            replay, self._replay = self._replay, None
+        self._levels = {user_id: level for user_id, level in rows if level}
+        self.ready = True
+        # Коммиты, случившиеся пока шёл SELECT, в снимок могли не попасть
+        for user_id, level in replay:
+            self._set(user_id, level)
+        logger.info(f"🛡 Уровни админов загружены: {len(self._levels)}")
+
+    def _set(self, user_id: int, level: int) -> None:
+        if self._replay is not None:
+            self._replay.append((user_id, level))
+        if level:
+            self._levels[user_id] = level
+        else:
+            self._levels.pop(user_id, None)
+
+    async def get(self, session: AsyncSession, user_id: int) -> int:
+        """Уровень админа или 0."""
+        if self.ready:
+            return self._levels.get(user_id, 0)
+        level = await session.scalar(select(Admins.adminlevel).where(Admins.user_id == user_id))
+        return level or 0
+
+
+admin_levels = AdminLevels()
+
+
+# ==========================================
+# СЛУШАТЕЛИ СЕССИИ
+# ==========================================
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_admins(session: Session, flush_context) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Admins):
+            continue
+        # В слушателе нельзя ходить в БД: незагруженный уровень — None
+        level = 0 if obj in session.deleted else obj.__dict__.get("adminlevel")
+        session.info.setdefault(_PENDING, {})[obj.user_id] = level
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        _apply(pending)
+        peers.publish("admin_levels", pending)
+
+
+def _apply(pending: dict[int, Optional[int]]) -> None:
+    for user_id, level in pending.items():
+        if level is None:
+            # Уровень неизвестен — до следующей загрузки читаем через SQL
+            admin_levels.ready = False
+        else:
+            admin_levels._set(user_id, level)
+
+
+peers.subscribe("admin_levels", _apply)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
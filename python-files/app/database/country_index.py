@@ -0,0 +1,282 @@
+"""
+Индекс названий стран в памяти процесса.
+
+Держит нормализованные name / memename всех стран:
+- точный поиск (без учёта регистра и лишних пробелов) — проверки уникальности
+  при переименовании и get_country_by_name не ходят в БД;
+- поиск по префиксу — bisect по отсортированному списку ключей;
+- нечёткий поиск — триграммные постинги отбирают кандидатов,
+  thefuzz переранжирует только их (как и SQL-вариант на pg_trgm).
+
+Строится один раз на старте (load), дальше обновляется сам:
+слушатель after_flush запоминает созданные/переименованные/удалённые страны,
+after_commit применяет изменения, after_rollback — выбрасывает.
+Массовые изменения в обход ORM должны звать country_index.load() заново.
+В режиме воркеров применённые изменения рассылаются остальным процессам (peers).
+
+check_consistency() сверяет индекс с таблицей и при расхождении пересобирает его.
+Пока индекс не загружен (ready=False), функции из requests/countries.py
+работают через SQL — с тем же сравнением (normalized_sql), чтобы ответ
+не зависел от того, загружен ли индекс. Названия сохраняются через tidy().
+"""
+import logging
+import re
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from thefuzz import fuzz
+
+from . import peers
+from .models import MemeCountry
+
+logger = logging.getLogger(__name__)
+
+# Ключ в session.info: country_id -> (name, memename) или None (удалена)
+_PENDING = "country_index_pending"
+
+# Сколько кандидатов из триграмм отдаём на переранжирование thefuzz
+FUZZY_CANDIDATES = 10
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str | None) -> str:
+    """Нижний регистр, без крайних и повторных пробелов."""
+    return _SPACES.sub(" ", (text or "").strip().lower())
+
+
+def tidy(text: str | None) -> str:
+    """Название для сохранения: регистр как ввели, пробелы — как в normalize."""
+    return _SPACES.sub(" ", (text or "").strip())
+
+
+def normalized_sql(column):
+    """normalize() на стороне Postgres — SQL-пути (пока индекс не загружен) сравнивают так же."""
+    return func.btrim(func.regexp_replace(func.lower(column), r"\s+", " ", "g"))
+
+
+def token_sort(text: str) -> str:
+    """Слова по алфавиту: 'Великая Мемландия' == 'мемландия великая'."""
+    return " ".join(sorted(text.split()))
+
+
+def trigrams(text: str) -> set[str]:
+    """Триграммы по словам с паддингом, как в pg_trgm."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CountryNameIndex:
+    """Нормализованные названия и мем-имена стран с быстрым поиском."""
+
+    def __init__(self):
+        self.ready = False
+        self._entries: dict[int, tuple[str, str]] = {}   # id -> (name, memename) нормализованные
+        self._names: dict[str, int] = {}                 # name -> id
+        self._memenames: dict[str, int] = {}             # memename -> id
+        self._sorted_tokens: dict[str, set[int]] = {}    # token-sorted форма -> ids
+        self._postings: dict[str, set[int]] = {}         # триграмма -> ids
+        self._prefix_keys: list[tuple[str, int]] = []    # отсортированные (ключ, id)
+        self._prefix_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ==========================================
+    # ЗАГРУЗКА И ОБНОВЛЕНИЕ
+    # ==========================================
+    async def load(self, session: AsyncSession) -> None:
+        """Полная пересборка из таблицы meme_countries."""
+        result = await session.execute(
+            select(MemeCountry.country_id, MemeCountry.name, MemeCountry.memename)
+        )
+        self.clear()
+        for country_id, name, memename in result.all():
+            self.upsert(country_id, name, memename)
+        self.ready = True
+        logger.info(f"🗂 Индекс стран загружен: {len(self)} шт.")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._names.clear()
+        self._memenames.clear()
+        self._sorted_tokens.clear()
+        self._postings.clear()
+        self._prefix_keys.clear()
+        self._prefix_dirty = False
+
+    def upsert(self, country_id: int, name: str, memename: str | None) -> None:
+        self.remove(country_id)
+        entry = (normalize(name), normalize(memename))
+        self._entries[country_id] = entry
+
+        self._names[entry[0]] = country_id
+        if entry[1]:
+            self._memenames[entry[1]] = country_id
+        for key in filter(None, entry):
+            self._sorted_tokens.setdefault(token_sort(key), set()).add(country_id)
+            for gram in trigrams(key):
+                self._postings.setdefault(gram, set()).add(country_id)
+        self._prefix_dirty = True
+
+    def remove(self, country_id: int) -> None:
+        entry = self._entries.pop(country_id, None)
+        if entry is None:
+            return
+
+        if self._names.get(entry[0]) == country_id:
+            del self._names[entry[0]]
+        if self._memenames.get(entry[1]) == country_id:
+            del self._memenames[entry[1]]
+        for key in filter(None, entry):
+            _discard(self._sorted_tokens, token_sort(key), country_id)
+            for gram in trigrams(key):
+                _discard(self._postings, gram, country_id)
+        self._prefix_dirty = True
+
+    # ==========================================
+    # ПОИСК
+    # ==========================================
+    def get_by_name(self, name: str) -> Optional[int]:
+        return self._names.get(normalize(name))
+
+    def get_by_memename(self, memename: str) -> Optional[int]:
+        return self._memenames.get(normalize(memename))
+
+    def find_exact(self, query: str) -> Optional[int]:
+        """Точное совпадение по названию, мем-имени или их словам в любом порядке."""
+        key = normalize(query)
+        found = self._names.get(key) or self._memenames.get(key)
+        if found:
+            return found
+        ids = self._sorted_tokens.get(token_sort(key))
+        return next(iter(ids)) if ids and len(ids) == 1 else None
+
+    def find_prefix(self, prefix: str, limit: int = 10) -> list[int]:
+        """id стран, у которых название или мем-имя начинается с prefix."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if self._prefix_dirty:
+            self._prefix_keys = sorted(
+                (key, country_id)
+                for country_id, entry in self._entries.items()
+                for key in entry if key
+            )
+            self._prefix_dirty = False
+
+        found: list[int] = []
+        pos = bisect_left(self._prefix_keys, (prefix, 0))
+        while pos < len(self._prefix_keys) and len(found) < limit:
+            key, country_id = self._prefix_keys[pos]
+            if not key.startswith(prefix):
+                break
+            if country_id not in found:
+                found.append(country_id)
+            pos += 1
+        return found
+
+    def find_fuzzy(self, query: str, threshold: int) -> Optional[int]:
+        """Лучшая страна с token_sort_ratio >= threshold или None."""
+        query = normalize(query)
+        if len(query) < 2:
+            return None
+
+        exact = self.find_exact(query)
+        if exact:
+            return exact
+
+        shared = Counter()
+        for gram in trigrams(query):
+            shared.update(self._postings.get(gram, ()))
+
+        best_id, best_score = None, threshold - 1
+        for country_id, _ in shared.most_common(FUZZY_CANDIDATES):
+            name, memename = self._entries[country_id]
+            score = max(fuzz.token_sort_ratio(query, name), fuzz.token_sort_ratio(query, memename))
+            if score > best_score:
+                best_id, best_score = country_id, score
+        return best_id
+
+    # ==========================================
+    # СВЕРКА С БД
+    # ==========================================
+    async def check_consistency(self, session: AsyncSession) -> int:
+        """
+        Сравнивает индекс с таблицей. Возвращает число расхождений;
+        если они есть — пишет в лог и пересобирает индекс.
+        """
+        result = await session.execute(
+            select(MemeCountry.country_id, MemeCountry.name, MemeCountry.memename)
+        )
+        actual = {cid: (normalize(name), normalize(meme)) for cid, name, meme in result.all()}
+
+        mismatches = sum(
+            1 for cid in actual.keys() | self._entries.keys()
+            if actual.get(cid) != self._entries.get(cid)
+        )
+        if mismatches:
+            logger.warning(f"⚠️ Индекс стран разошёлся с БД ({mismatches} шт.), пересобираю.")
+            self.clear()
+            for cid, (name, memename) in actual.items():
+                self.upsert(cid, name, memename)
+            self.ready = True
+        return mismatches
+
+
+def _discard(postings: dict[str, set[int]], key: str, country_id: int) -> None:
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(country_id)
+        if not ids:
+            del postings[key]
+
+
+country_index = CountryNameIndex()
+
+
+# ==========================================
+# СЛУШАТЕЛИ СЕССИИ
+# ==========================================
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_countries(session: Session, flush_context) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, MemeCountry):
+            continue
+        pending = session.info.setdefault(_PENDING, {})
+        if obj in session.deleted:
+            pending[obj.country_id] = None
+        else:
+            pending[obj.country_id] = (obj.name, obj.memename)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        _apply(pending)
+        peers.publish("country_index", pending)
+
+
+def _apply(pending: dict[int, Optional[tuple[str, Optional[str]]]]) -> None:
+    for country_id, names in pending.items():
+        if names is None:
+            country_index.remove(country_id)
+        else:
+            country_index.upsert(country_id, *names)
+
+
+peers.subscribe("country_index", _apply)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
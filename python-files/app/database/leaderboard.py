@@ -0,0 +1,249 @@
+"""
+Лидерборды в памяти процесса: топ игроков, лудоманов и стран.
+
+Каждая таблица лидеров — отсортированный список (−очки, id) + словарь
+id -> очки. Страница топа — срез списка, «моё место» — bisect:
+O(log n) вместо сортировки всей таблицы на каждый запрос.
+
+Обновление:
+- на запись: ledger (_sync_user) и save_review сообщают новые значения,
+  ORM-изменения User / MemeCountry ловит слушатель after_flush; всё это
+  применяется после коммита, а при откате — выбрасывается;
+- массовые UPDATE в обход ORM (ежедневный бонус) помечают таблицу
+  устаревшей — её перечитает фоновая задача (leaderboard_refresher
+  в app/tasks.py) на ближайшем проходе;
+- в режиме воркеров применённое после коммита рассылается остальным
+  процессам (peers).
+
+Пока таблица не загружена (ready=False), функции из requests/ работают
+через SQL, как раньше.
+"""
+import logging
+from bisect import bisect_left, insort
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import Select, and_, event, func, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import peers
+from .models import User, MemeCountry
+
+logger = logging.getLogger(__name__)
+
+# Ключи в session.info
+_PENDING = "leaderboard_pending"   # (доска, id) -> очки или None (убрать)
+_STALE = "leaderboard_stale"       # доски, которые надо перечитать целиком
+
+
+class Board:
+    """Одна таблица лидеров: по убыванию очков, при равенстве — по id."""
+
+    def __init__(self, name: str, query: Select, positive_only: bool = False):
+        self.name = name
+        self.query = query                  # SELECT id, очки — для полной загрузки
+        self.positive_only = positive_only  # В топ попадают только очки > 0
+        self.ready = False
+        self.stale = False
+        self._scores: dict[int, float] = {}
+        self._keys: list[tuple[float, int]] = []
+        self._replay: Optional[list[tuple[int, float]]] = None  # Изменения, пришедшие во время load()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    async def load(self, session: AsyncSession) -> None:
+        self.stale = False
+        self._replay = []
+        try:
+            rows = (await session.execute(self.query)).all()
+        finally:
+            replay, self._replay = self._replay, None
+        scores = {row[0]: row[1] for row in rows if self._accepts(row[1])}
+        self._scores = scores
+        self._keys = sorted((-score, item_id) for item_id, score in scores.items())
+        self.ready = True
+        # Коммиты, случившиеся пока шёл SELECT, в снимок могли не попасть
+        for item_id, score in replay:
+            self.set(item_id, score)
+
+    def _accepts(self, score) -> bool:
+        return score is not None and (score > 0 or not self.positive_only)
+
+    def set(self, item_id: int, score) -> None:
+        """Новое значение очков (None — убрать из таблицы)."""
+        if self._replay is not None:
+            self._replay.append((item_id, score))
+        if not self.ready:
+            return
+        old = self._scores.get(item_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, item_id))]
+            del self._scores[item_id]
+        if self._accepts(score):
+            self._scores[item_id] = score
+            insort(self._keys, (-score, item_id))
+
+    def page(self, offset: int, limit: int) -> list[tuple[int, float]]:
+        """[(id, очки)] с места offset+1."""
+        return [(item_id, -neg) for neg, item_id in self._keys[offset:offset + limit]]
+
+    def rank(self, item_id: int) -> Optional[int]:
+        """Место (с 1) или None, если в таблице нет."""
+        score = self._scores.get(item_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, item_id)) + 1
+
+
+class Leaderboards:
+    def __init__(self):
+        self.boards = {
+            "points": Board("points", select(User.user_id, User.points)),
+            "casino": Board("casino", select(User.user_id, User.lost_in_casino), positive_only=True),
+            "influence": Board("influence", select(MemeCountry.country_id, MemeCountry.influence_points)),
+            "rating": Board("rating", select(MemeCountry.country_id, MemeCountry.avg_rating)),
+        }
+
+    def __getitem__(self, name: str) -> Board:
+        return self.boards[name]
+
+    def ready(self, name: str) -> bool:
+        return self.boards[name].ready
+
+    async def load(self, session: AsyncSession, names: Optional[Iterable[str]] = None) -> None:
+        """Полная загрузка (на старте) — всех досок или только перечисленных."""
+        for name in names or self.boards:
+            await self.boards[name].load(session)
+        logger.info("🏆 Лидерборды загружены: " + ", ".join(
+            f"{b.name}={len(b)}" for b in self.boards.values() if b.ready
+        ))
+
+    async def refresh_stale(self, session: AsyncSession) -> list[str]:
+        """Перечитывает устаревшие доски. Возвращает их имена."""
+        stale = [name for name, board in self.boards.items() if board.stale]
+        for name in stale:
+            await self.boards[name].load(session)
+        return stale
+
+    # ==========================================
+    # ЧТЕНИЕ (из памяти, а пока доска не загружена — через SQL)
+    # ==========================================
+    async def page(self, session: AsyncSession, name: str, offset: int, limit: int) -> list[tuple[int, float]]:
+        """[(id, очки)] с места offset+1."""
+        board = self.boards[name]
+        if board.ready:
+            return board.page(offset, limit)
+        item_id, score = board.query.selected_columns
+        stmt = board.query.order_by(score.desc(), item_id).offset(offset).limit(limit)
+        if board.positive_only:
+            stmt = stmt.where(score > 0)
+        return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+    async def rank(self, session: AsyncSession, name: str, item_id: int) -> Optional[tuple[int, int]]:
+        """(место, всего в таблице) или None, если id в таблицу не попал."""
+        board = self.boards[name]
+        if board.ready:
+            place = board.rank(item_id)
+            return (place, len(board)) if place is not None else None
+
+        id_column, score = board.query.selected_columns
+        value = await session.scalar(select(score).where(id_column == item_id))
+        if not board._accepts(value):
+            return None
+        ahead = select(func.count()).where(or_(score > value, and_(score == value, id_column < item_id)))
+        total = select(func.count()).select_from(id_column.table)
+        if board.positive_only:
+            total = total.where(score > 0)
+        return (await session.scalar(ahead)) + 1, await session.scalar(total)
+
+    # ==========================================
+    # ЗАПИСЬ (применяется после коммита сессии)
+    # ==========================================
+    def note(self, session: AsyncSession | Session, board: str, item_id: int, score) -> None:
+        session.info.setdefault(_PENDING, {})[(board, item_id)] = score
+
+    def note_user(self, session: AsyncSession | Session, user_id: int, **values) -> None:
+        """Значения из ledger: points=..., lost_in_casino=..."""
+        if "points" in values:
+            self.note(session, "points", user_id, values["points"])
+        if "lost_in_casino" in values:
+            self.note(session, "casino", user_id, values["lost_in_casino"])
+
+    def mark_stale(self, session: AsyncSession | Session, board: str) -> None:
+        """Для массовых UPDATE: доску перечитает фоновая задача."""
+        session.info.setdefault(_STALE, set()).add(board)
+
+    def _apply(self, pending: dict, stale: set) -> None:
+        for (name, item_id), score in pending.items():
+            self.boards[name].set(item_id, score)
+        for name in stale:
+            self.boards[name].stale = True
+
+
+leaderboards = Leaderboards()
+
+
+# ==========================================
+# СЛУШАТЕЛИ СЕССИИ
+# ==========================================
+# Атрибут модели -> доска
+_USER_FIELDS = {"points": "points", "lost_in_casino": "casino"}
+_COUNTRY_FIELDS = {"influence_points": "influence", "avg_rating": "rating"}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_scores(session: Session, flush_context) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, User):
+            item_id, fields = obj.user_id, _USER_FIELDS
+        elif isinstance(obj, MemeCountry):
+            item_id, fields = obj.country_id, _COUNTRY_FIELDS
+        else:
+            continue
+
+        if obj in session.deleted:
+            for board in fields.values():
+                leaderboards.note(session, board, item_id, None)
+            continue
+        # Только изменённые и уже загруженные значения: в слушателе нельзя ходить в БД
+        state = inspect(obj)
+        for field, board in fields.items():
+            if obj not in session.new and not state.attrs[field].history.has_changes():
+                continue
+            if field in state.dict:
+                leaderboards.note(session, board, item_id, state.dict[field])
+            else:
+                leaderboards.mark_stale(session, board)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    pending, stale = session.info.pop(_PENDING, {}), session.info.pop(_STALE, set())
+    if pending or stale:
+        leaderboards._apply(pending, stale)
+        peers.publish("leaderboards", (pending, stale))
+
+
+peers.subscribe("leaderboards", lambda changes: leaderboards._apply(*changes))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+    session.info.pop(_STALE, None)
+
+
+async def load_ranked(session: AsyncSession, model, ranked: list[tuple[int, float]], *options) -> list:
+    """Объекты model по id из page() — в том же порядке (один SELECT по первичному ключу)."""
+    if not ranked:
+        return []
+    pk = inspect(model).primary_key[0]
+    rows = (await session.scalars(
+        select(model).where(pk.in_([item_id for item_id, _ in ranked])).options(*options)
+    )).unique().all()
+    by_id = {getattr(row, pk.key): row for row in rows}
+    return [by_id[item_id] for item_id, _ in ranked if item_id in by_id]
@@ -6,13 +6,18 @@ from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 # Импортируем твой настроенный maker сессий
 from .session import async_session
+from .profiler import profiler
 
 logger = logging.getLogger(__name__)
 
 class SessionMiddleware(BaseMiddleware):
     """
-    Middleware, которое создает асинхронную сессию на каждый запрос 
+    Middleware, которое создает асинхронную сессию на каждый запрос
     и передает ее в хендлеры через аргумент 'session: AsyncSession'.
+
+    Сама по себе сессия соединение не берёт — оно достаётся из пула только
+    на первом запросе. Если хендлер в БД не ходил, коммит пропускаем,
+    так что чисто UI-апдейты обходятся без единого обращения к Postgres.
     """
     # session_pool по умолчанию берется из .session.py
     def __init__(self, session_pool: async_sessionmaker = async_session):
@@ -25,6 +30,10 @@ class SessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any]
     ) -> Any:
+        # 0. Профиль апдейта: сюда события engine складывают SQL-запросы
+        # Пока хендлер не найден, апдейт подписан типом события: <message>, <inline_query>...
+        profile = profiler.start(f"<{getattr(event, 'event_type', 'update')}>")
+
         # 1. Открываем новую сессию для обработки запроса
         async with self.session_pool() as session:
             # 2. Добавляем сессию в словарь 'data'. 
@@ -34,12 +43,15 @@ class SessionMiddleware(BaseMiddleware):
             try:
                 # 3. Вызываем сам хендлер (где происходит вся логика)
                 result = await handler(event, data)
-                await session.commit()  # Явно коммитим, если все прошло успешно
+                if session.in_transaction():
+                    await session.commit()  # Явно коммитим, если все прошло успешно
             except Exception as e:
                 # В случае ошибки в хендлере - откатываем все изменения в базе
                 logger.error("🚫 Ошибка в хендлере, откат транзакции: %s", e)
                 await session.rollback()
                 raise e # Передаем исключение выше, чтобы бот знал об ошибке
+            finally:
+                profiler.finish(profile)
             
             
             return result
\ No newline at end of file
@@ -6,6 +6,7 @@ from sqlalchemy import (
     Integer, String, BigInteger, ForeignKey, Boolean, 
     DateTime, Float, func, UniqueConstraint, CheckConstraint, text, Text, Index
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from .session import engine 
 from sqlalchemy import BigInteger, String, DateTime, Boolean, ForeignKey, Integer, Float, UniqueConstraint, CheckConstraint, Index, func
 # --- БАЗОВЫЙ КЛАСС ---
@@ -109,8 +110,9 @@ class MemeCountry(Base):
     country_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     # СТАТИСТИКА И РЕЙТИНГ
     influence_points: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Очки влияния страны
-    avg_rating: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)  # Средний рейтинг страны
+    avg_rating: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)  # Средний рейтинг страны (= rating_sum / total_reviews)
     total_reviews: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Количество отзывов
+    rating_sum: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)  # Сумма оценок (для пересчёта среднего без AVG)
 
     # ЭКОНОМИКА И НАЛОГИ
     tax_rate: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)  # Налоговая ставка (0.0-0.5)
@@ -128,6 +130,16 @@ class MemeCountry(Base):
     citizens: Mapped[List["User"]] = relationship("User", back_populates="country", foreign_keys="User.country_id")  # Граждане страны
     reviews: Mapped[List["CountryReview"]] = relationship("CountryReview", back_populates="country")  # Отзывы о стране
 
+    # Триграммные GIN-индексы для нечёткого поиска (/join по названию), нужен pg_trgm
+    __table_args__ = (
+        Index("ix_meme_countries_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_meme_countries_memename_trgm", "memename", postgresql_using="gin", postgresql_ops={"memename": "gin_trgm_ops"}),
+        # Keyset-пагинация списка стран (/top): порядок индекса = порядок сортировки
+        Index("ix_meme_countries_influence_id", "influence_points", "country_id"),
+        Index("ix_meme_countries_rating_name", text("avg_rating DESC"), "name"),
+        Index("ix_meme_countries_created_id", "created_at", "country_id"),
+    )
+
 
 # ==================================================
 # 3. Остальные модели
@@ -214,6 +226,52 @@ class ReservedCountryNames(Base):
     added_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
 
 
+# ==================================================
+# Журнал запусков фоновых задач
+# ==================================================
+class TaskRun(Base):
+    """Запуск периодической задачи: ('daily_bonus', '2026-01-31') выполняется ровно один раз."""
+    __tablename__ = "task_runs"
+
+    task: Mapped[str] = mapped_column(String(64), primary_key=True)
+    run_key: Mapped[str] = mapped_column(String(64), primary_key=True)  # Обычно дата запуска
+    cursor: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)  # До какого id уже обработано
+    started_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class ScheduledJob(Base):
+    """Состояние задачи планировщика (app/scheduler.py): когда запускать и как прошёл прошлый раз."""
+    __tablename__ = "scheduled_jobs"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)  # UTC
+    last_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_duration: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # Секунды
+    last_error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # Аренда: задача сейчас выполняется
+
+
+class MediaFile(Base):
+    """file_id загруженного в Telegram файла (app/media.py) по хэшу содержимого."""
+    __tablename__ = "media_files"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    file_name: Mapped[str] = mapped_column(String(255), nullable=False)  # Для отладки: какой это был файл
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class FSMRecord(Base):
+    """Состояние FSM (создание/редактирование страны) — app/fsm_storage.py, переживает перезапуск."""
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # fsm:<bot>:<chat>:<user>:...
+    state: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    data: Mapped[dict] = mapped_column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)  # По нему — истечение брошенных сценариев
+
+
 # ==================================================
 # Доопределение обратных связей
 # ==================================================
@@ -242,5 +300,26 @@ CountryBlacklist.admin: Mapped["User"] = relationship(
 # 6) Функция для создания всех таблиц (если их нет)
 async def async_main():
     async with engine.begin() as conn:
+        # pg_trgm нужен триграммным индексам стран — ставим до create_all
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         # run_sync оборачивает синхронный create_all в асинхронный контекст
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all не трогает уже существующие таблицы — индексы докатываем отдельно
+        for index in MemeCountry.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
+        # rating_sum появился позже таблицы: докатываем колонку и один раз
+        # заполняем сумму/количество/среднее по уже существующим отзывам
+        has_rating_sum = await conn.scalar(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'meme_countries' AND column_name = 'rating_sum'"
+        ))
+        if not has_rating_sum:
+            await conn.execute(text("ALTER TABLE meme_countries ADD COLUMN rating_sum BIGINT NOT NULL DEFAULT 0"))
+            await conn.execute(text(
+                "UPDATE meme_countries AS c "
+                "SET rating_sum = r.rating_sum, total_reviews = r.total_reviews, "
+                "    avg_rating = r.rating_sum::float / r.total_reviews "
+                "FROM (SELECT country_id, SUM(rating) AS rating_sum, COUNT(*) AS total_reviews "
+                "      FROM country_reviews GROUP BY country_id) AS r "
+                "WHERE c.country_id = r.country_id"
+            ))
@@ -0,0 +1,52 @@
+"""
+Изменения кэшей в памяти для других процессов (режим воркеров, app/workers.py).
+
+Кэши процесса (user_cache, country_index, admin_levels, leaderboards,
+render_cache) обновляются своими слушателями after_commit — но только в том
+процессе, где был коммит. В режиме воркеров слушатель после применения
+у себя вызывает publish(тема, что применено): сообщение уходит в очереди
+остальных воркеров, и там его применяет обработчик темы (subscribe) —
+тем же кодом, что и после локального коммита.
+
+В одном процессе (WORKERS=0) publish ничего не делает. Доставка занимает
+миллисекунды; изменения, пришедшие пока воркер перезапускался, покрывает
+полная загрузка кэшей на его старте.
+"""
+import logging
+from typing import Any, Callable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict[str, Callable[[Any], None]] = {}
+_inboxes: Sequence = ()          # Очереди multiprocessing всех воркеров (по индексу)
+_index: Optional[int] = None     # Индекс этого воркера — себе не отправляем
+
+
+def subscribe(topic: str, handler: Callable[[Any], None]) -> None:
+    """Обработчик изменений темы, пришедших из другого процесса."""
+    _handlers[topic] = handler
+
+
+def connect(index: int, inboxes: Sequence) -> None:
+    """Воркер index начинает рассылать изменения остальным."""
+    global _index, _inboxes
+    _index, _inboxes = index, inboxes
+
+
+def publish(topic: str, payload: Any) -> None:
+    """Вызывается из after_commit: неблокирующая отправка (очереди без ограничения размера)."""
+    for index, inbox in enumerate(_inboxes):
+        if index == _index:
+            continue
+        try:
+            inbox.put_nowait((topic, payload))
+        except Exception as e:
+            logger.error(f"Не удалось отправить изменения {topic} воркеру {index}: {e}")
+
+
+def apply(topic: str, payload: Any) -> None:
+    handler = _handlers.get(topic)
+    if handler is None:
+        logger.warning(f"⚠️ Нет обработчика изменений {topic}")
+        return
+    handler(payload)
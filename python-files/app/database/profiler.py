@@ -0,0 +1,244 @@
+"""
+Профайлер апдейтов: сколько SQL-запросов, времени в БД и строк
+приходится на каждый хендлер.
+
+- SessionMiddleware открывает UpdateProfile на апдейт (contextvar — он
+  доходит и до событий engine, которые SQLAlchemy вызывает в greenlet'е);
+- события before/after_cursor_execute на engine докидывают в текущий
+  профиль запрос, его время и rowcount;
+- HandlerNameMiddleware (inner) подписывает профиль именем хендлера;
+- по завершении профиль сливается в гистограммы по хендлеру, а слишком
+  медленные/болтливые апдейты пишутся в лог.
+
+Гистограммы смотрят админы командой /dbstats и Prometheus на /metrics.
+"""
+import bisect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import PROFILER_SLOW_HANDLER_MS, PROFILER_MAX_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (последняя корзина — всё, что больше)
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50)
+
+UNHANDLED = "<unhandled>"
+
+
+class UpdateProfile:
+    """Счётчики одного апдейта."""
+    __slots__ = ("handler", "started", "queries", "db_time", "rows", "token")
+
+    def __init__(self, handler: str = UNHANDLED):
+        self.handler = handler
+        self.token = None
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+
+_current: ContextVar[Optional[UpdateProfile]] = ContextVar("update_profile", default=None)
+
+
+def current_profile() -> Optional[UpdateProfile]:
+    return _current.get()
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами + сумма (формат Prometheus)."""
+    __slots__ = ("bounds", "counts", "total", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попал q-квантиль (грубо, но дёшево)."""
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class HandlerStats:
+    """Накопленная статистика одного хендлера."""
+    __slots__ = ("duration_ms", "queries", "db_time", "rows", "slow")
+
+    def __init__(self):
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = 0.0
+        self.rows = 0
+        self.slow = 0
+
+
+class Profiler:
+    def __init__(self, slow_handler_ms: float, max_queries: int):
+        self.slow_handler_ms = slow_handler_ms
+        self.max_queries = max_queries
+        self.handlers: Dict[str, HandlerStats] = {}
+        self._installed = False
+        # Запросы вне апдейтов: старт, фоновые задачи
+        self.background_queries = 0
+        self.background_db_time = 0.0
+
+    # ==========================================
+    # СОБЫТИЯ ENGINE
+    # ==========================================
+    def install(self, engine: AsyncEngine) -> None:
+        if self._installed:
+            return
+        self._installed = True
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(context, "_profiler_started", time.perf_counter())
+        profile = _current.get()
+        if profile is None:
+            self.background_queries += 1
+            self.background_db_time += elapsed
+            return
+        profile.queries += 1
+        profile.db_time += elapsed
+        profile.rows += max(cursor.rowcount or 0, 0)
+
+    # ==========================================
+    # ЖИЗНЕННЫЙ ЦИКЛ АПДЕЙТА
+    # ==========================================
+    def start(self, handler: str = UNHANDLED) -> Optional[UpdateProfile]:
+        """
+        Новый профиль для текущего апдейта; handler — имя, пока хендлер не найден.
+        None — профиль уже открыт снаружи (вложенный SessionMiddleware на роутере),
+        тогда запросы идут в него.
+        """
+        if _current.get() is not None:
+            return None
+        profile = UpdateProfile(handler)
+        profile.token = _current.set(profile)
+        return profile
+
+    def finish(self, profile: Optional[UpdateProfile]) -> None:
+        if profile is None:
+            return
+        _current.reset(profile.token)
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        stats = self.handlers.get(profile.handler)
+        if stats is None:
+            stats = self.handlers[profile.handler] = HandlerStats()
+        stats.duration_ms.observe(duration_ms)
+        stats.queries.observe(profile.queries)
+        stats.db_time += profile.db_time
+        stats.rows += profile.rows
+
+        too_slow = self.slow_handler_ms > 0 and duration_ms > self.slow_handler_ms
+        too_chatty = self.max_queries > 0 and profile.queries > self.max_queries
+        if too_slow or too_chatty:
+            stats.slow += 1
+            logger.warning(
+                f"🐢 {profile.handler}: {duration_ms:.0f} мс, {profile.queries} SQL "
+                f"({profile.db_time * 1000:.0f} мс в БД, {profile.rows} строк)"
+            )
+
+    def reset(self) -> None:
+        self.handlers.clear()
+        self.background_queries = 0
+        self.background_db_time = 0.0
+
+    # ==========================================
+    # ОТЧЁТЫ
+    # ==========================================
+    def top(self, limit: int = 10, key: str = "db_time") -> list[tuple[str, HandlerStats]]:
+        sort_keys = {
+            "db_time": lambda s: s.db_time,
+            "queries": lambda s: s.queries.sum / max(s.queries.total, 1),
+            "duration": lambda s: s.duration_ms.quantile(0.99),
+            "count": lambda s: s.duration_ms.total,
+        }
+        return sorted(self.handlers.items(), key=lambda item: sort_keys[key](item[1]), reverse=True)[:limit]
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def histogram(name: str, help_text: str, attr: str, bounds: tuple) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for handler, stats in self.handlers.items():
+                h: Histogram = getattr(stats, attr)
+                cumulative = 0
+                for bound, count in zip(bounds, h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{handler="{handler}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{handler="{handler}",le="+Inf"}} {h.total}')
+                lines.append(f'{name}_sum{{handler="{handler}"}} {h.sum}')
+                lines.append(f'{name}_count{{handler="{handler}"}} {h.total}')
+
+        def counter(name: str, help_text: str, attr: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for handler, stats in self.handlers.items():
+                lines.append(f'{name}{{handler="{handler}"}} {getattr(stats, attr)}')
+
+        histogram("rpbot_handler_duration_ms", "Время обработки апдейта", "duration_ms", DURATION_BUCKETS_MS)
+        histogram("rpbot_handler_queries", "SQL-запросов на апдейт", "queries", QUERY_BUCKETS)
+        counter("rpbot_handler_db_seconds_total", "Время в БД", "db_time")
+        counter("rpbot_handler_rows_total", "Строк вернула/затронула БД", "rows")
+        counter("rpbot_handler_slow_total", "Апдейтов сверх порогов", "slow")
+        lines.append("# TYPE rpbot_background_queries_total counter")
+        lines.append(f"rpbot_background_queries_total {self.background_queries}")
+        lines.append("# TYPE rpbot_background_db_seconds_total counter")
+        lines.append(f"rpbot_background_db_seconds_total {self.background_db_time}")
+        return "\n".join(lines) + "\n"
+
+
+profiler = Profiler(PROFILER_SLOW_HANDLER_MS, PROFILER_MAX_QUERIES)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return UNHANDLED
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner-мидлварь: подписывает профиль апдейта именем сработавшего хендлера."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        profile = _current.get()
+        if profile is not None:
+            profile.handler = handler_name(data)
+        return await handler(event, data)
@@ -0,0 +1,136 @@
+"""
+Кэш готовых сообщений (текст + клавиатура): карточка страны (/country),
+/globalstats, страницы /countrylist и /top.
+
+Ключ — (вид, id, версия). Версия карточки — своя у каждой страны,
+версия списков — общая на все страны. Их поднимают мутации страны
+(requests/countries.py, save_review) через mark_country_changed():
+сразу и ещё раз после коммита/отката, как в user_cache — иначе
+параллельный апдейт мог бы закэшировать незакоммиченные данные под
+новой версией. Записи старых версий никто не спросит, их вытеснит LRU.
+
+В режиме воркеров версии, поднятые коммитом, поднимаются и в остальных
+процессах (peers). То, что меняется не через мутации страны (очки граждан
+в карточке, имена правителей), устаревает не дольше RENDER_CACHE_TTL секунд.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import peers
+from config import RENDER_CACHE_TTL, RENDER_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Ключ в session.info: страны, изменённые в этой транзакции
+_CHANGED = "render_cache_changed_countries"
+
+
+class RenderCache:
+    """TTL/LRU: (вид, id, версия) -> (время записи, значение)."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._country_versions: dict[int, int] = {}
+        self._list_version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    # ==========================================
+    # ВЕРСИИ
+    # ==========================================
+    def country_version(self, country_id: int) -> tuple[int, int]:
+        """Карточка страны: своя версия + версия списков (в карточке есть место в топе)."""
+        return self._country_versions.get(country_id, 0), self._list_version
+
+    def list_version(self) -> int:
+        return self._list_version
+
+    def bump(self, *country_ids: int) -> None:
+        for country_id in country_ids:
+            self._country_versions[country_id] = self._country_versions.get(country_id, 0) + 1
+        self._list_version += 1
+
+    # ==========================================
+    # ЗАПИСИ
+    # ==========================================
+    def get(self, view: str, entity_id: Hashable, version: Hashable) -> Optional[Any]:
+        key = (view, entity_id, version)
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._items[key]
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, view: str, entity_id: Hashable, version: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        key = (view, entity_id, version)
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+render_cache = RenderCache(ttl=RENDER_CACHE_TTL, maxsize=RENDER_CACHE_SIZE)
+
+
+def mark_country_changed(session: AsyncSession | Session, *country_ids: int) -> None:
+    """
+    Поднимает версии стран (и списков) сейчас и ещё раз после коммита сессии.
+    None среди id пропускается (например, «старой страны» не было).
+    """
+    country_ids = tuple(c for c in country_ids if c is not None)
+    session.info.setdefault(_CHANGED, set()).update(country_ids)
+    render_cache.bump(*country_ids)
+
+
+# ==========================================
+# СЛУШАТЕЛИ СЕССИИ
+# ==========================================
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+    changed = _bump_changed(session)
+    if changed is not None:
+        peers.publish("render_cache", tuple(changed))
+
+
+@event.listens_for(Session, "after_rollback")
+def _bump_after_rollback(session: Session) -> None:
+    _bump_changed(session)
+
+
+def _bump_changed(session: Session) -> Optional[set[int]]:
+    changed = session.info.pop(_CHANGED, None)
+    if changed is not None:
+        render_cache.bump(*changed)
+    return changed
+
+
+peers.subscribe("render_cache", lambda country_ids: render_cache.bump(*country_ids))
@@ -42,6 +42,45 @@ from .countries import (
     
 )
 
+# Баланс: списания, начисления, переводы (ledger)
+from .ledger import (
+    BetResult,
+    CountryBonus,
+    debit,
+    credit,
+    transfer,
+    settle_bet,
+    credit_many,
+    levy_tax,
+    credit_country_bonus
+)
+
+# Журнал запусков фоновых задач и планировщик (task_runs, scheduled_jobs)
+from .task_runs import (
+    lock_task_run,
+    advance_task_run,
+    finish_task_run,
+    ensure_scheduled_job,
+    get_scheduled_jobs,
+    claim_scheduled_job,
+    complete_scheduled_job
+)
+
+# file_id загруженных файлов (media_files)
+from .media import (
+    get_media_file_ids,
+    save_media_file_id,
+    forget_media_file_id
+)
+
+# Состояния FSM (fsm_states)
+from .fsm import (
+    FSMRow,
+    get_fsm_record,
+    save_fsm_records,
+    delete_expired_fsm_records
+)
+
 # Админы и наказания (admins)
 from .admins import (
     add_admin,
@@ -51,7 +90,8 @@ from .admins import (
     remove_punishment,
     is_punished,
     get_active_punishments,
-    get_all_active_punishments_by_type
+    get_all_active_punishments_by_type,
+    expire_punishments
 )
 
 # Отзывы и рейтинги (reviews)
@@ -59,8 +99,11 @@ from .reviews import (
     REVIEW_COOLDOWN_DAYS,
     check_review_cooldown,
     save_review,
+    CountryPage,
+    approx_country_count,
     get_countries_for_list,
     get_top_users,
+    get_leaderboard_rank,
     get_history
 )
 
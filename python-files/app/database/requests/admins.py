@@ -11,6 +11,9 @@ from typing import Optional
 from ..models import User, History, Admins, MemeCountry, CountryReview, CountryBlacklist, Punishment
 from config import OWNER_ID
 from app.utils.html_helpers import escape_html
+from .ledger import credit
+from ..user_cache import mark_all_dirty
+from ..admin_levels import admin_levels
 
 logger = logging.getLogger(__name__)
 
@@ -65,13 +68,10 @@ async def give_points(
     Проверяет права админа, обновляет баланс, пишет в историю.
     Возвращает строку с результатом (для ответа в чате).
     """
-    # 1. Проверка прав админа
-    result = await session.execute(
-        select(Admins.adminlevel).where(Admins.user_id == admin_id)
-    )
-    admin_level = result.scalar()
+    # 1. Проверка прав админа (уровни — из памяти, см. admin_levels)
+    admin_level = await admin_levels.get(session, admin_id)
 
-    if not admin_level or admin_level < 1:
+    if admin_level < 1:
         return "🚫 У вас нет прав на начисление очков."
 
     # 2. Получаем цель
@@ -81,30 +81,16 @@ async def give_points(
 
     # 3. Проверка иерархии (владелец может всё)
     if admin_id != OWNER_ID:
-        target_admin_level = await session.scalar(
-            select(Admins.adminlevel).where(Admins.user_id == target_id)
-        ) or 0
+        target_admin_level = await admin_levels.get(session, target_id)
 
         if target_admin_level >= admin_level:
             return "🚫 Вы не можете начислять очки админу равного или выше вашего уровня."
 
-    # 4. Начисление очков
+    # 4. Начисление очков + запись в историю (один запрос)
     old_balance = target_user.points or 0
-    target_user.points = old_balance + points
-    session.add(target_user)
-
-    # 5. Запись в историю
-    event_type = "POINTS_CHANGE"  # Определяем тип события
-    session.add(History(
-        admin_id=admin_id,
-        target_id=target_id,
-        event_type=event_type,
-        points=points,
-        reason=reason,
-        timestamp=datetime.now()
-    ))
+    await credit(session, target_id, points, event_type="POINTS_CHANGE", reason=reason, admin_id=admin_id)
 
-    # 6. Формируем ответ
+    # 5. Формируем ответ
     display_name = target_user.userfullname or f"@{target_user.username or 'без_ника'}"
     icon = "📈" if points > 0 else "📉" if points < 0 else "⚖️"
 
@@ -117,13 +103,9 @@ async def give_points(
 async def get_current_user_admin_level(session: AsyncSession, user_id: int) -> int:
     """
     Возвращает уровень админа пользователя.
-    Если админа нет — возвращает 0.
+    Если админа нет — возвращает 0. Без запроса к БД, пока загружен admin_levels.
     """
-    result = await session.execute(
-        select(Admins.adminlevel).where(Admins.user_id == user_id)
-    )
-    level = result.scalar()
-    return level or 0
+    return await admin_levels.get(session, user_id)
 
 # ==========================================
 # НАКАЗАНИЯ (PUNISHMENTS)
@@ -230,4 +212,23 @@ async def get_all_active_punishments_by_type(
         .order_by(Punishment.timestamp.desc())
     )
     result = await session.execute(stmt)
-    return result.all()
\ No newline at end of file
+    return result.all()
+
+async def expire_punishments(session: AsyncSession, now: datetime) -> int:
+    """
+    Снимает наказания, у которых истёк срок (expires_at <= now, naive UTC).
+    Возвращает, сколько снято.
+    """
+    result = await session.execute(
+        update(Punishment)
+        .where(
+            Punishment.is_active == True,
+            Punishment.expires_at.is_not(None),
+            Punishment.expires_at <= now
+        )
+        .values(is_active=False)
+    )
+    if result.rowcount:
+        # Наказания могли лежать в закэшированных профилях
+        mark_all_dirty(session)
+    return result.rowcount
@@ -6,18 +6,27 @@ import aiofiles
 import logging
 from aiogram import Bot
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, desc, func, and_, delete, cast, Integer
+from sqlalchemy import select, update, desc, func, and_, or_, delete, cast, Integer
 from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional, Tuple
 from thefuzz import fuzz
 
 from ..models import User, History, Admins, MemeCountry, CountryReview, CountryBlacklist, Punishment
+from ..country_index import country_index, normalize, normalized_sql, tidy
+from ..leaderboard import leaderboards, load_ranked
+from ..render_cache import render_cache, mark_country_changed
+from .ledger import credit, debit, levy_tax
+from .reviews import CountryPage, get_countries_for_list
 from config import FUZZY_MATCH_THRESHOLD, OWNER_ID
 from app.utils.html_helpers import escape_html, hbold
 
 logger = logging.getLogger(__name__)
+
+# Сколько кандидатов отдаёт триграммный поиск на переранжирование thefuzz
+FUZZY_CANDIDATES_LIMIT = 10
 from .utils import (
     has_active_country_ban,
     check_creation_allowed,
@@ -38,17 +47,18 @@ async def create_meme_country(
     new_country = MemeCountry(
         ruler_id=ruler_id,
         chat_id=chat_id,
-        name=name, 
+        name=tidy(name),
         ideology=ideology,
         description=description,
         avatar_url=avatar_url,
         map_url=map_url,
-        memename=memename
+        memename=tidy(memename)
         
         # Остальные поля (influence_points, avg_rating) должны иметь значения по умолчанию в модели
     )
     
     session.add(new_country)
+    mark_country_changed(session)  # id ещё нет — хватит версии списков
     return new_country
 
 
@@ -70,13 +80,14 @@ async def assign_ruler(session: AsyncSession, user_id: int, country_id: int) ->
         if hasattr(country.ruler, 'is_ruler'):
             country.ruler.is_ruler = False
         country.ruler.position = "Бывший правитель"
+    mark_country_changed(session, country_id, user.country_id)
     user.country_id = country_id    # ✅ Используем ID, а не объектную связь user.country = country
     
     if hasattr(user, 'is_ruler'):
         user.is_ruler = True
         
     user.position = "Правитель"       # Должность в стране
-    user.points += 10  # Бонусные очки за коронацию
+    await credit(session, user_id, 10, event_type="RULER_BONUS", reason=f"Коронация: {country.name}")  # Бонусные очки за коронацию
     # 4. Установка кулдауна
     # Это было пропущено в вашей функции, но должно быть сделано здесь.
     user.last_country_creation = datetime.now() 
@@ -86,9 +97,15 @@ async def assign_ruler(session: AsyncSession, user_id: int, country_id: int) ->
 
 async def get_country_by_name(session: AsyncSession, name: str) -> MemeCountry | None:
     """Находит страну по названию с подгруженным правителем."""
-    stmt = select(MemeCountry).options(selectinload(MemeCountry.ruler)).where(
-        func.lower(MemeCountry.name) == func.lower(name)
-    )
+    stmt = select(MemeCountry).options(selectinload(MemeCountry.ruler))
+    if country_index.ready:
+        # Индекс в памяти: по PK вместо lower(name), который не попадает в unique-индекс
+        country_id = country_index.get_by_name(name)
+        if country_id is None:
+            return None
+        stmt = stmt.where(MemeCountry.country_id == country_id)
+    else:
+        stmt = stmt.where(normalized_sql(MemeCountry.name) == normalize(name))
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
@@ -225,13 +242,23 @@ async def donate_to_country_treasury(session: AsyncSession, user_id: int, amount
     if not user.country:
         return False, "Вы не состоите ни в одной стране."
 
-    if user.points < amount:
-        return False, f"Недостаточно очков. Ваш баланс: {user.points}"
-
-    # Проводим транзакцию
+    # Проводим транзакцию: списание с проверкой баланса — одним запросом
     try:
-        user.points -= amount
-        user.country.treasury = (user.country.treasury or 0) + amount
+        balance = await debit(
+            session, user_id, amount,
+            event_type="DONATE", reason=f"Пожертвование в казну: {user.country.name}"
+        )
+        if balance is None:
+            return False, f"Недостаточно очков. Ваш баланс: {user.points}"
+
+        treasury = await session.scalar(
+            update(MemeCountry)
+            .where(MemeCountry.country_id == user.country_id)
+            .values(treasury=MemeCountry.treasury + amount)
+            .returning(MemeCountry.treasury)
+        )
+        set_committed_value(user.country, "treasury", treasury)
+        mark_country_changed(session, user.country_id)
         # commit сделает миддлварь или хендлер
         return True, f"Успешно! Казна {user.country.name} пополнена на {amount} очков."
     except Exception as e:
@@ -281,6 +308,7 @@ async def join_country(
         welcome_text = f"✅ Добро пожаловать в <b>{target_country.name}</b>!"
 
     # 5. Обновляем пользователя
+    mark_country_changed(session, target_country.country_id, user.country_id)
     user.country_id = target_country.country_id
     user.position = "Гражданин"
 
@@ -295,33 +323,54 @@ async def join_country(
     return True, welcome_text
 
 async def find_country_by_fuzzy_name(session: AsyncSession, query: str) -> Optional[MemeCountry]:
-    """Находит страну по названию или мем-имени."""
+    """
+    Находит страну по названию или мем-имени.
+    Сначала — индекс в памяти (country_index). Пока он не загружен,
+    Postgres отдаёт топ кандидатов по триграммной похожести, а thefuzz
+    переранжирует только его с порогом FUZZY_MATCH_THRESHOLD.
+
+    Фильтра % нет намеренно: он режет по pg_trgm.similarity_threshold (0.3),
+    который с порогом thefuzz не связан — короткое название с опечаткой
+    отсеялось бы раньше, чем его оценит thefuzz. Как и в country_index,
+    кандидаты — просто лучшие FUZZY_CANDIDATES_LIMIT по похожести.
+    """
     query = query.strip().lower()
     if len(query) < 2:
         return None
 
-    # Быстрый селект только нужных полей
+    # Индекс в памяти отвечает без запроса к БД
+    if country_index.ready:
+        country_id = country_index.find_fuzzy(query, FUZZY_MATCH_THRESHOLD)
+        return await session.get(MemeCountry, country_id) if country_id else None
+
+    similarity = func.greatest(
+        func.similarity(MemeCountry.name, query),
+        func.similarity(MemeCountry.memename, query)
+    )
     result = await session.execute(
         select(MemeCountry.country_id, MemeCountry.name, MemeCountry.memename)
+        .order_by(similarity.desc(), MemeCountry.country_id)
+        .limit(FUZZY_CANDIDATES_LIMIT)
     )
-    countries = result.all()
+    candidates = result.all()
 
-    if not countries:
+    if not candidates:
         return None
 
-    best_match = None
-    best_score = 75  # Твой порог из конфига
+    best_id = None
+    best_score = FUZZY_MATCH_THRESHOLD - 1  # Порог из конфига (включительно)
 
-    for country_id, name, memename in countries:
+    for country_id, name, memename in candidates:
         score1 = fuzz.token_sort_ratio(query, name.lower())
         score2 = fuzz.token_sort_ratio(query, (memename or "").lower())
         score = max(score1, score2)
 
         if score > best_score:
             best_score = score
-            best_match = await session.get(MemeCountry, country_id)
-            
-    return best_match
+            best_id = country_id
+
+    # Грузим страну один раз — только победителя
+    return await session.get(MemeCountry, best_id) if best_id else None
 # ==========================================
 #ВЫХОД ИЗ СТРАНЫ (LEAVE COUNTRY / LEAVE)
 # ==========================================
@@ -353,6 +402,7 @@ async def leave_country(session: AsyncSession, user_id: int) -> tuple[bool, str,
     country_name = user.country.name if user.country else "Неизвестная страна"
 
     # Обнуление полей
+    mark_country_changed(session, user.country_id)
     user.country_id = None
     user.position = "Путешественник"
 
@@ -383,6 +433,7 @@ async def transfer_ruler(session: AsyncSession, old_ruler_id: int, new_ruler_id:
     if new_ruler_id < 0:  # BOTS have negative ID
         return False, "🚫 Нельзя назначать бота правителем."
 
+    mark_country_changed(session, country_id, new_ruler.country_id)
     if new_ruler.country_id != country_id:
         new_ruler.country_id = country_id  # Авто-вступление
         new_ruler.position = "Гражданин"
@@ -396,7 +447,7 @@ async def transfer_ruler(session: AsyncSession, old_ruler_id: int, new_ruler_id:
 
     new_ruler.is_ruler = True
     new_ruler.position = "Правитель"
-    new_ruler.points += 10
+    await credit(session, new_ruler_id, 10, event_type="RULER_BONUS", reason=f"Передача власти: {country.name}")
 
     return True, f"Власть успешно передана! Новый правитель: {new_ruler.userfullname or 'Без имени'}."
 
@@ -426,6 +477,7 @@ async def delete_country(session: AsyncSession, ruler_id: int, country_id: int)
     await session.execute(delete(CountryReview).where(CountryReview.country_id == country_id))# Удалить отзывы
     await session.execute(delete(CountryBlacklist).where(CountryBlacklist.country_id == country_id))# Удалить blacklist
     await session.delete(country)                                                                   # Удалить страну
+    mark_country_changed(session, country_id)
 
     await session.flush()
     return True, f"Страна '{country.name}' успешно удалена. Империя пала!"
@@ -473,6 +525,7 @@ async def kick_user(session: AsyncSession, ruler_id: int, target_id: int) -> tup
     target.country_id = None
     target.position = "Путешественник"
     target.is_ruler = False  # На всякий
+    mark_country_changed(session, country_id)
     
     return True, f"Пользователь {target.userfullname or 'Без имени'} выгнан."
 
@@ -481,21 +534,18 @@ async def collect_taxes(session: AsyncSession, country_id: int) -> tuple[bool, s
     if not country or not country.tax_rate:
         return False, "Налог не установлен."
     
-    # Считаем сумму налогов прямо в БД, чтобы не тащить всех юзеров в Python
-    tax_sum = await session.scalar(
-        select(func.sum(cast(User.points * country.tax_rate, Integer)))
-        .where(User.country_id == country_id, User.user_id != country.ruler_id)
-    ) or 0
+    # Считаем и списываем налог прямо в БД одним запросом (вместе с историей),
+    # чтобы не тащить всех юзеров в Python
+    tax_sum = await levy_tax(
+        session, country_id, country.tax_rate,
+        exclude_user_id=country.ruler_id,
+        reason=f"Налог страны {country.name} ({country.tax_rate:.0%})"
+    )
 
     if tax_sum > 0:
-        # Массовое списание у граждан
-        await session.execute(
-            update(User)
-            .where(User.country_id == country_id, User.user_id != country.ruler_id)
-            .values(points=User.points - cast(User.points * country.tax_rate, Integer))
-        )
         # Начисление стране
         country.influence_points += tax_sum
+        mark_country_changed(session, country_id)
         return True, f"Налоги собраны: +{tax_sum} влияния."
     
     return False, "Нечего собирать."
@@ -513,37 +563,47 @@ async def set_tax_rate(session: AsyncSession, ruler_id: int, rate: float) -> tup
         return False, "Вы не правитель."
 
     country.tax_rate = rate
+    mark_country_changed(session, country.country_id)
     return True, f"Налог установлен на {rate*100:.0f}%."
 
-async def get_all_countries(session: AsyncSession, page: int = 1, limit: int = 5) -> str:
-    """Возвращает список стран с пагинацией и именами правителей."""
-    offset = (page - 1) * limit
-    countries = await session.scalars(
-        select(MemeCountry)
-        .options(selectinload(MemeCountry.ruler))  # Подгружаем правителей сразу
-        .order_by(desc(MemeCountry.influence_points))
-        .offset(offset)
-        .limit(limit)
+async def get_all_countries(
+    session: AsyncSession,
+    page: int = 1,
+    limit: int = 5,
+    cursor: Optional[str] = None,
+) -> tuple[str, CountryPage]:
+    """
+    Список стран по влиянию с именами правителей.
+    Листается курсором (keyset); page без курсора — прямой переход на страницу.
+    """
+    offset = 0 if cursor else (page - 1) * limit
+    result = await get_countries_for_list(
+        session, "influence", cursor, limit, offset,
+        options=(selectinload(MemeCountry.ruler),)  # Подгружаем правителей сразу
     )
-    result = [f"📖 <b>СПИСОК СТРАН (стр. {page})</b>:"]
-    for idx, c in enumerate(countries, start=offset+1):
+    lines = [f"📖 <b>СПИСОК СТРАН (стр. {page})</b>:"]
+    for idx, c in enumerate(result.countries, start=(page - 1) * limit + 1):
         ruler_name = c.ruler.userfullname if c.ruler else "Нет правителя"
-        result.append(f"{idx}. {escape_html(c.name)} — Влияние: {c.influence_points} (Правитель: {escape_html(ruler_name)})")
-    return "\n".join(result)
+        lines.append(f"{idx}. {escape_html(c.name)} — Влияние: {c.influence_points} (Правитель: {escape_html(ruler_name)})")
+    return "\n".join(lines), result
 
 async def get_global_stats(session: AsyncSession, limit: int = 10) -> str:
-    """Топ стран по влиянию с именами правителей."""
-    countries = await session.scalars(
-        select(MemeCountry)
-        .options(selectinload(MemeCountry.ruler))
-        .order_by(desc(MemeCountry.influence_points))
-        .limit(limit)
-    )
+    """Топ стран по влиянию с именами правителей (лидерборд в памяти, холодный — SQL)."""
+    # Версию берём до чтения: изменение во время сборки не закэшируется под новой
+    version = render_cache.list_version()
+    cached = render_cache.get("globalstats", limit, version)
+    if cached is not None:
+        return cached
+
+    ranked = await leaderboards.page(session, "influence", 0, limit)
+    countries = await load_ranked(session, MemeCountry, ranked, selectinload(MemeCountry.ruler))
     result = ["🏆 <b>ТОП СТРАН ПО ВЛИЯНИЮ</b>:"]
     for idx, c in enumerate(countries, 1):
         ruler_name = c.ruler.userfullname if c.ruler else "Нет правителя"
         result.append(f"{idx}. {escape_html(c.name)} — {c.influence_points} (Правитель: {escape_html(ruler_name)})")
-    return "\n".join(result)
+    text = "\n".join(result)
+    render_cache.put("globalstats", limit, version, text)
+    return text
 
 async def get_country_by_ruler_id(session: AsyncSession, ruler_id: int) -> MemeCountry | None:
     """Получает страну по ID правителя"""
@@ -560,6 +620,7 @@ async def edit_country_flag_local(session: AsyncSession, ruler_id: int, file_id:
         return False, "Вы не правитель."
     
     country.flag_file_id = file_id
+    mark_country_changed(session, country.country_id)
     return True, "Флаг обновлён!"
 
 async def get_country_flag(session: AsyncSession, country_id: int) -> Optional[str]:
@@ -570,6 +631,8 @@ async def get_country_flag(session: AsyncSession, country_id: int) -> Optional[s
 
 async def edit_country_name(session: AsyncSession, ruler_id: int, new_name: str) -> tuple[bool, str]:
     """Изменяет название страны"""
+    # Повторные пробелы схлопываем: «Мем  ландия» и «Мем ландия» — одно название
+    new_name = tidy(new_name)
     if len(new_name) > 100:
         return False, "Название слишком длинное (максимум 100 символов)."
     
@@ -581,17 +644,21 @@ async def edit_country_name(session: AsyncSession, ruler_id: int, new_name: str)
         return False, "Вы не правитель."
     
     # Проверка на уникальность названия
-    existing = await session.scalar(
-        select(MemeCountry).where(
-            func.lower(MemeCountry.name) == func.lower(new_name),
-            MemeCountry.country_id != country.country_id
+    if country_index.ready:
+        existing = country_index.get_by_name(new_name) not in (None, country.country_id)
+    else:
+        existing = await session.scalar(
+            select(MemeCountry).where(
+                normalized_sql(MemeCountry.name) == normalize(new_name),
+                MemeCountry.country_id != country.country_id
+            )
         )
-    )
     
     if existing:
         return False, f"Страна с названием '{new_name}' уже существует."
     
     country.name = new_name
+    mark_country_changed(session, country.country_id)
     return True, f"Название страны успешно изменено на '{new_name}'."
 
 async def edit_country_ideology(session: AsyncSession, ruler_id: int, new_ideology: str) -> tuple[bool, str]:
@@ -607,6 +674,7 @@ async def edit_country_ideology(session: AsyncSession, ruler_id: int, new_ideolo
         return False, "Вы не правитель."
     
     country.ideology = new_ideology
+    mark_country_changed(session, country.country_id)
     return True, f"Идеология страны успешно изменена на '{new_ideology}'."
 
 async def edit_country_description(session: AsyncSession, ruler_id: int, new_description: str) -> tuple[bool, str]:
@@ -622,6 +690,7 @@ async def edit_country_description(session: AsyncSession, ruler_id: int, new_des
         return False, "Вы не правитель."
     
     country.description = new_description
+    mark_country_changed(session, country.country_id)
     return True, "Описание страны успешно изменено."
 
 async def edit_country_map_url(session: AsyncSession, ruler_id: int, new_map_url: str) -> tuple[bool, str]:
@@ -636,10 +705,12 @@ async def edit_country_map_url(session: AsyncSession, ruler_id: int, new_map_url
         return False, "Вы не правитель."
     
     country.map_url = final_map_url
+    mark_country_changed(session, country.country_id)
     return True, "Ссылка на карту успешно изменена."
 
 async def edit_country_memename(session: AsyncSession, ruler_id: int, new_memename: str) -> tuple[bool, str]:
     """Изменяет мемное имя страны"""
+    new_memename = tidy(new_memename)
     if len(new_memename) > 100:
         return False, "Мемное имя слишком длинное (максимум 100 символов)."
     
@@ -651,17 +722,21 @@ async def edit_country_memename(session: AsyncSession, ruler_id: int, new_memena
         return False, "Вы не правитель."
     
     # Проверка на уникальность мемного имени
-    existing = await session.scalar(
-        select(MemeCountry).where(
-            func.lower(MemeCountry.memename) == func.lower(new_memename),
-            MemeCountry.country_id != country.country_id
+    if country_index.ready:
+        existing = country_index.get_by_memename(new_memename) not in (None, country.country_id)
+    else:
+        existing = await session.scalar(
+            select(MemeCountry).where(
+                normalized_sql(MemeCountry.memename) == normalize(new_memename),
+                MemeCountry.country_id != country.country_id
+            )
         )
-    )
     
     if existing:
         return False, f"Мемное имя '{new_memename}' уже используется другой страной."
     
     country.memename = new_memename
+    mark_country_changed(session, country.country_id)
     return True, f"Мемное имя страны успешно изменено на '{new_memename}'."
 
 
@@ -675,6 +750,7 @@ async def edit_country_url(session: AsyncSession, ruler_id: int, new_url: str) -
         return False, "Вы не правитель."
 
     country.country_url = new_url
+    mark_country_changed(session, country.country_id)
     return True, f"Ссылка страны успешно изменена на '{new_url}'."
 
 
@@ -716,6 +792,7 @@ async def edit_country_flag(session: AsyncSession, ruler_id: int, file_id: str,
         country.flag_file_id = file_id
         # Сохраняем путь к локальному файлу
         country.avatar_url = f"assets/flags/{filename}"
+        mark_country_changed(session, country.country_id)
         return True, f"Флаг успешно сохранен: {filename}"
     else:
         return False, "Не удалось скачать флаг из Telegram"
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Состояния FSM в БД (fsm_states) — хранилище app/fsm_storage.py.
+Пустая запись (нет ни состояния, ни данных) не хранится: сохранение удаляет строку.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Iterable, NamedTuple, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import FSMRecord
+
+logger = logging.getLogger(__name__)
+
+
+class FSMRow(NamedTuple):
+    key: str
+    state: Optional[str]
+    data: dict[str, Any]
+    updated_at: datetime
+
+
+async def get_fsm_record(session: AsyncSession, key: str, not_before: datetime) -> Optional[FSMRow]:
+    """Запись по ключу, если она обновлялась не раньше not_before (старые — брошенные сценарии)."""
+    row = (await session.execute(
+        select(FSMRecord.key, FSMRecord.state, FSMRecord.data, FSMRecord.updated_at)
+        .where(FSMRecord.key == key, FSMRecord.updated_at >= not_before)
+    )).first()
+    return FSMRow(*row) if row else None
+
+
+async def save_fsm_records(session: AsyncSession, rows: Iterable[FSMRow]) -> None:
+    """Пачка изменений: непустые — одним upsert, пустые — одним DELETE."""
+    upserts, empty = [], []
+    for row in rows:
+        if row.state is None and not row.data:
+            empty.append(row.key)
+        else:
+            upserts.append(row._asdict())
+
+    if empty:
+        await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(empty)))
+    if upserts:
+        stmt = insert(FSMRecord).values(upserts)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[FSMRecord.key],
+            set_={"state": stmt.excluded.state, "data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        ))
+
+
+async def delete_expired_fsm_records(session: AsyncSession, before: datetime) -> int:
+    """Удаляет сценарии, брошенные до before. Возвращает число удалённых."""
+    result = await session.execute(delete(FSMRecord).where(FSMRecord.updated_at < before))
+    return result.rowcount or 0
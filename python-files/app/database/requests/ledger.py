@@ -0,0 +1,359 @@
+"""
+Баланс пользователей (RP-очки): списания, начисления, переводы.
+
+Каждая операция — ОДИН SQL-запрос: условный UPDATE ... RETURNING
+и INSERT в history в одном CTE. Никаких «прочитали points в Python,
+проверили, записали обратно» — гонка за баланс исключена самой БД
+(points >= :amount проверяется в том же UPDATE).
+
+После запроса объект User в сессии (если он там есть) получает новое
+значение как «закоммиченное», а кэш профилей сбрасывается.
+"""
+import logging
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import Integer, String, cast, exists, func, insert, literal, select, true, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from ..models import User, History, MemeCountry
+from ..user_cache import mark_dirty, mark_all_dirty
+from ..leaderboard import leaderboards
+
+logger = logging.getLogger(__name__)
+
+
+class BetResult(NamedTuple):
+    points: int
+    lost_in_casino: int
+
+
+class CountryBonus(NamedTuple):
+    country_id: int
+    name: str
+    chat_id: int
+    bonus: int       # RP каждому гражданину
+    citizens: int    # Скольким начислено
+    total: int       # Сколько всего RP начислено
+
+
+# ==========================================
+# ВСПОМОГАТЕЛЬНОЕ
+# ==========================================
+def _history_rows(source, *, points, event_type: str, reason: str, admin_id: Optional[int]):
+    """SELECT строк для history из CTE с колонкой user_id."""
+    return select(
+        literal(admin_id, type_=History.admin_id.type),
+        source.c.user_id,
+        literal(event_type, type_=History.event_type.type),
+        points,
+        literal(reason, type_=History.reason.type),
+    )
+
+
+def _insert_history(rows):
+    return insert(History).from_select(
+        ["admin_id", "target_id", "event_type", "points", "reason"], rows
+    ).cte("history_rows")
+
+
+def _sync_user(session: AsyncSession, user_id: int, **values) -> None:
+    """Обновляет User в identity map без лишнего SELECT, сбрасывает кэш профиля, двигает лидерборды."""
+    user = session.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        for key, value in values.items():
+            set_committed_value(user, key, value)
+    mark_dirty(session, user_id)
+    leaderboards.note_user(session, user_id, **values)
+
+
+async def _change_balance(
+    session: AsyncSession,
+    user_id: int,
+    delta: int,
+    *,
+    event_type: str,
+    reason: str,
+    admin_id: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    history_points: Optional[int] = None,
+    lost_in_casino: int = 0,
+) -> Optional[BetResult]:
+    conditions = [User.user_id == user_id]
+    if min_balance is not None:
+        conditions.append(User.points >= min_balance)
+
+    values = {User.points: User.points + delta}
+    if lost_in_casino:
+        values[User.lost_in_casino] = User.lost_in_casino + lost_in_casino
+
+    changed = (
+        update(User)
+        .where(*conditions)
+        .values(values)
+        .returning(User.user_id, User.points, User.lost_in_casino)
+        .cte("changed")
+    )
+    history = _insert_history(_history_rows(
+        changed,
+        points=literal(delta if history_points is None else history_points, type_=Integer),
+        event_type=event_type, reason=reason, admin_id=admin_id,
+    ))
+    row = (await session.execute(
+        select(changed.c.points, changed.c.lost_in_casino).add_cte(history)
+    )).first()
+
+    if row is None:
+        return None
+    _sync_user(session, user_id, points=row.points, lost_in_casino=row.lost_in_casino)
+    return BetResult(row.points, row.lost_in_casino)
+
+
+# ==========================================
+# ОСНОВНЫЕ ОПЕРАЦИИ
+# ==========================================
+async def debit(
+    session: AsyncSession,
+    user_id: int,
+    amount: int,
+    event_type: str,
+    reason: str,
+    admin_id: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Списывает amount, только если хватает очков.
+    Возвращает новый баланс или None (мало очков / нет пользователя).
+    """
+    result = await _change_balance(
+        session, user_id, -amount, min_balance=amount,
+        event_type=event_type, reason=reason, admin_id=admin_id,
+    )
+    return result.points if result else None
+
+
+async def credit(
+    session: AsyncSession,
+    user_id: int,
+    amount: int,
+    event_type: str,
+    reason: str,
+    admin_id: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Начисляет amount без проверки баланса (отрицательный amount — админский штраф).
+    Возвращает новый баланс или None, если пользователя нет.
+    """
+    result = await _change_balance(
+        session, user_id, amount,
+        event_type=event_type, reason=reason, admin_id=admin_id,
+    )
+    return result.points if result else None
+
+
+async def transfer(
+    session: AsyncSession,
+    from_id: int,
+    to_id: int,
+    amount: int,
+    event_type: str = "TRANSFER",
+    reason: str = "Перевод очков",
+) -> Optional[tuple[int, int]]:
+    """
+    Переводит amount от from_id к to_id одним запросом.
+    Возвращает (баланс отправителя, баланс получателя) или None,
+    если у отправителя мало очков или получателя нет.
+    """
+    receiver = select(User.user_id).where(User.user_id == to_id)
+    debited = (
+        update(User)
+        .where(User.user_id == from_id, User.points >= amount, exists(receiver))
+        .values(points=User.points - amount)
+        .returning(User.user_id, User.points)
+        .cte("debited")
+    )
+    credited = (
+        update(User)
+        .where(User.user_id == to_id, exists(select(debited.c.user_id)))
+        .values(points=User.points + amount)
+        .returning(User.user_id, User.points)
+        .cte("credited")
+    )
+    history = _insert_history(union_all(
+        _history_rows(debited, points=literal(-amount, type_=Integer),
+                      event_type=event_type, reason=reason, admin_id=from_id),
+        _history_rows(credited, points=literal(amount, type_=Integer),
+                      event_type=event_type, reason=reason, admin_id=from_id),
+    ))
+    row = (await session.execute(
+        select(debited.c.points.label("sender"), credited.c.points.label("receiver"))
+        .select_from(debited.join(credited, true()))
+        .add_cte(history)
+    )).first()
+
+    if row is None:
+        return None
+    _sync_user(session, from_id, points=row.sender)
+    _sync_user(session, to_id, points=row.receiver)
+    return row.sender, row.receiver
+
+
+async def settle_bet(
+    session: AsyncSession,
+    user_id: int,
+    bet: int,
+    payout: int,
+    event_type: str,
+    reason: str,
+) -> Optional[BetResult]:
+    """
+    Рассчитывает ставку казино одним запросом: списывает bet, начисляет payout,
+    при проигрыше увеличивает lost_in_casino. None — если очков на ставку не хватает.
+    """
+    return await _change_balance(
+        session, user_id, payout - bet, min_balance=bet,
+        history_points=payout if payout > 0 else -bet,
+        lost_in_casino=0 if payout > 0 else bet,
+        event_type=event_type, reason=reason, admin_id=user_id,
+    )
+
+
+# ==========================================
+# МАССОВЫЕ ОПЕРАЦИИ
+# ==========================================
+async def credit_many(
+    session: AsyncSession,
+    user_ids: Iterable[int],
+    amount: int,
+    event_type: str,
+    reason: str,
+    admin_id: Optional[int] = None,
+) -> int:
+    """Начисляет amount каждому из user_ids. Возвращает число затронутых пользователей."""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return 0
+
+    changed = (
+        update(User)
+        .where(User.user_id.in_(user_ids))
+        .values(points=User.points + amount)
+        .returning(User.user_id, User.points)
+        .cte("changed")
+    )
+    history = _insert_history(_history_rows(
+        changed, points=literal(amount, type_=Integer),
+        event_type=event_type, reason=reason, admin_id=admin_id,
+    ))
+    rows = (await session.execute(
+        select(changed.c.user_id, changed.c.points).add_cte(history)
+    )).all()
+
+    for row in rows:
+        _sync_user(session, row.user_id, points=row.points)
+    return len(rows)
+
+
+async def levy_tax(
+    session: AsyncSession,
+    country_id: int,
+    rate: float,
+    exclude_user_id: int,
+    reason: str,
+) -> int:
+    """
+    Списывает с граждан страны долю rate от их очков (кроме exclude_user_id — правителя).
+    Сумма налога считается по тем же строкам, что и списание. Возвращает собранное.
+    """
+    taxed = (
+        select(User.user_id, cast(User.points * rate, Integer).label("tax"))
+        .where(User.country_id == country_id, User.user_id != exclude_user_id)
+        .with_for_update()
+        .cte("taxed")
+    )
+    changed = (
+        update(User)
+        .where(User.user_id == taxed.c.user_id, taxed.c.tax > 0)
+        .values(points=User.points - taxed.c.tax)
+        .returning(User.user_id, User.points, taxed.c.tax)
+        .cte("changed")
+    )
+    history = _insert_history(_history_rows(
+        changed, points=-changed.c.tax,
+        event_type="TAX", reason=reason, admin_id=None,
+    ))
+    rows = (await session.execute(
+        select(changed.c.user_id, changed.c.points, changed.c.tax).add_cte(history)
+    )).all()
+
+    for row in rows:
+        _sync_user(session, row.user_id, points=row.points)
+    return sum(row.tax for row in rows)
+
+
+async def credit_country_bonus(
+    session: AsyncSession,
+    country_from: int,
+    country_to: int,
+    ratio: int,
+) -> list[CountryBonus]:
+    """
+    Ежедневный бонус гражданам стран с country_id в [country_from, country_to]:
+    influence_points // ratio каждому. Одним запросом — UPDATE users ... FROM
+    и INSERT ... SELECT в history, без загрузки пользователей в память.
+    Возвращает итоги по странам, где кому-то что-то начислено.
+    """
+    bonus_amount = MemeCountry.influence_points // ratio
+    bonus = (
+        select(
+            MemeCountry.country_id,
+            MemeCountry.name,
+            MemeCountry.chat_id,
+            bonus_amount.label("bonus"),
+            func.format(
+                "Пассивный бонус страны '%s' (Влияние: %s, Бонус: %s RP).",
+                MemeCountry.name, MemeCountry.influence_points, bonus_amount,
+            ).label("reason"),
+        )
+        .where(
+            MemeCountry.country_id.between(country_from, country_to),
+            MemeCountry.influence_points >= ratio,
+        )
+        .cte("bonus")
+    )
+    changed = (
+        update(User)
+        .where(User.country_id == bonus.c.country_id)
+        .values(points=User.points + bonus.c.bonus)
+        .returning(User.user_id, bonus.c.country_id, bonus.c.bonus, bonus.c.reason)
+        .cte("changed")
+    )
+    history = insert(History).from_select(
+        ["admin_id", "target_id", "event_type", "points", "reason"],
+        select(
+            literal(None, type_=History.admin_id.type),
+            changed.c.user_id,
+            literal("daily_bonus", type_=String),
+            changed.c.bonus,
+            changed.c.reason,
+        ),
+    ).cte("history_rows")
+
+    citizens = func.count().label("citizens")
+    rows = (await session.execute(
+        select(
+            bonus.c.country_id, bonus.c.name, bonus.c.chat_id, bonus.c.bonus,
+            citizens, func.sum(changed.c.bonus).label("total"),
+        )
+        .join_from(bonus, changed, changed.c.country_id == bonus.c.country_id)
+        .group_by(bonus.c.country_id, bonus.c.name, bonus.c.chat_id, bonus.c.bonus)
+        .order_by(bonus.c.country_id)
+        .add_cte(history)
+    )).all()
+
+    # Строки пользователей в сессию не грузили — просто сбрасываем кэш профилей,
+    # а топ по очкам перечитает фоновая задача
+    if rows:
+        mark_all_dirty(session)
+        leaderboards.mark_stale(session, "points")
+    return [CountryBonus(*row) for row in rows]
@@ -0,0 +1,43 @@
+"""
+file_id файлов, уже загруженных в Telegram (media_files), — см. app/media.py.
+Ключ — sha256 содержимого: изменили файл — у него новый хэш и новая загрузка.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import MediaFile
+
+logger = logging.getLogger(__name__)
+
+
+async def get_media_file_ids(session: AsyncSession, hashes: Iterable[str]) -> dict[str, str]:
+    """хэш -> file_id для тех хэшей, что уже загружались."""
+    hashes = list(hashes)
+    if not hashes:
+        return {}
+    rows = await session.execute(
+        select(MediaFile.content_hash, MediaFile.file_id).where(MediaFile.content_hash.in_(hashes))
+    )
+    return {content_hash: file_id for content_hash, file_id in rows.all()}
+
+
+async def save_media_file_id(session: AsyncSession, content_hash: str, file_id: str, file_name: str) -> None:
+    stmt = insert(MediaFile).values(
+        content_hash=content_hash, file_id=file_id, file_name=file_name, uploaded_at=datetime.utcnow()
+    )
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[MediaFile.content_hash],
+        set_={"file_id": stmt.excluded.file_id, "file_name": stmt.excluded.file_name, "uploaded_at": stmt.excluded.uploaded_at},
+    ))
+
+
+async def forget_media_file_id(session: AsyncSession, content_hash: str, file_id: str) -> None:
+    """Удаляет file_id, который Telegram отверг (только если его ещё не заменили новым)."""
+    await session.execute(
+        delete(MediaFile).where(MediaFile.content_hash == content_hash, MediaFile.file_id == file_id)
+    )
@@ -2,13 +2,20 @@
 Функции для работы с отзывами и рейтингами.
 """
 import logging
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import asc, select, update, desc, func, and_, delete
+from sqlalchemy import asc, select, update, desc, func, and_, or_, delete, cast, Float
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, List
+from typing import NamedTuple, Optional, Tuple, List
 
 from ..models import User, History, MemeCountry, CountryReview
+from ..country_index import country_index
+from ..leaderboard import leaderboards, load_ranked
+from ..render_cache import mark_country_changed
 # Убедись, что импорты соответствуют твоей структуре
 
 logger = logging.getLogger(__name__)
@@ -43,108 +50,220 @@ async def check_review_cooldown(session: AsyncSession, user_id: int, country_id:
 
 async def save_review(session: AsyncSession, user_id: int, country_id: int, rating: int) -> tuple[bool, str]:
     """
-    Сохраняет отзыв и обновляет рейтинг страны.
+    Сохраняет отзыв и обновляет рейтинг страны — одним запросом, без AVG/COUNT.
+
+    У страны хранятся rating_sum и total_reviews. Новый отзыв добавляет
+    к ним (rating, 1), повторный — (rating - старая оценка, 0); avg_rating
+    считается из суммы и количества. Стоимость не зависит от числа отзывов.
     """
-    try:
-        # 1. Удаляем старый
-        await session.execute(
-            delete(CountryReview).where(
-                and_(CountryReview.user_id == user_id, CountryReview.country_id == country_id)
-            )
-        )
-        
-        # 2. Вставляем новый
-        session.add(CountryReview(
-            user_id=user_id, 
-            country_id=country_id, 
-            rating=rating,
-            created_at=datetime.utcnow() # Используй utcnow для стабильности
-        ))
-        
-        await session.flush()
-        
-        # 3. Пересчитываем среднее
-        stats = await session.execute(
-            select(func.avg(CountryReview.rating), func.count(CountryReview.review_id))
-            .where(CountryReview.country_id == country_id)
+    # Старая оценка этого пользователя (если была) — до upsert'а
+    old_review = (
+        select(CountryReview.rating)
+        .where(CountryReview.user_id == user_id, CountryReview.country_id == country_id)
+        .cte("old_review")
+    )
+    upsert_stmt = insert(CountryReview).values(
+        user_id=user_id,
+        country_id=country_id,
+        rating=rating,
+        created_at=datetime.utcnow()  # Используй utcnow для стабильности
+    )
+    upserted = (
+        upsert_stmt.on_conflict_do_update(
+            index_elements=[CountryReview.user_id, CountryReview.country_id],
+            set_={"rating": upsert_stmt.excluded.rating, "created_at": upsert_stmt.excluded.created_at},
         )
-        avg, count = stats.one()
-        
-        # 4. Обновляем страну
-        await session.execute(
+        .returning(CountryReview.review_id)
+        .cte("upserted")
+    )
+
+    old_rating = select(old_review.c.rating).scalar_subquery()
+    new_sum = MemeCountry.rating_sum + rating - func.coalesce(old_rating, 0)
+    new_count = MemeCountry.total_reviews + 1 - select(func.count()).select_from(old_review).scalar_subquery()
+
+    try:
+        row = (await session.execute(
             update(MemeCountry)
             .where(MemeCountry.country_id == country_id)
             .values(
-                avg_rating=float(avg) if avg else 0.0, 
-                total_reviews=int(count)
+                rating_sum=new_sum,
+                total_reviews=new_count,
+                avg_rating=cast(new_sum, Float) / cast(new_count, Float),
             )
-        )
-
-        # ВОТ ЭТОГО НЕ ХВАТАЛО:
-        return True, "✅ Ваш отзыв успешно сохранен!"
-
+            .returning(MemeCountry.rating_sum, MemeCountry.total_reviews, MemeCountry.avg_rating)
+            .add_cte(upserted)
+        )).first()
     except Exception as e:
         logger.error(f"Error in save_review: {e}")
         return False, "❌ Ошибка при сохранении отзыва."
 
+    if row is None:
+        return False, "❌ Страна не найдена."
+
+    # Объект страны в сессии (user.country) — сразу с новым рейтингом
+    country = session.identity_map.get(identity_key(MemeCountry, country_id))
+    if country is not None:
+        set_committed_value(country, "rating_sum", row.rating_sum)
+        set_committed_value(country, "total_reviews", row.total_reviews)
+        set_committed_value(country, "avg_rating", row.avg_rating)
+    leaderboards.note(session, "rating", country_id, row.avg_rating)
+    mark_country_changed(session, country_id)
+
+    return True, "✅ Ваш отзыв успешно сохранен!"
+
+# ==========================================
+# СПИСОК СТРАН (KEYSET-ПАГИНАЦИЯ)
+# ==========================================
+# Сортировка -> ((колонка, по убыванию?), (колонка для ничьих, по убыванию?)).
+# Под каждую есть составной индекс в MemeCountry.__table_args__.
+COUNTRY_SORTS = {
+    "influence": ((MemeCountry.influence_points, True), (MemeCountry.country_id, True)),
+    "rating": ((MemeCountry.avg_rating, True), (MemeCountry.name, False)),
+    "newest": ((MemeCountry.created_at, True), (MemeCountry.country_id, True)),
+}
+
+# Сколько секунд держать COUNT(*) стран, если индекс названий ещё не загружен
+COUNTRY_COUNT_TTL = 60
+_country_count_cache = {"value": 0, "expires": 0.0}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class CountryPage(NamedTuple):
+    countries: List[MemeCountry]
+    total: int                   # Приблизительное число стран (для «стр. N/M»)
+    prev_cursor: Optional[str]   # Токен для «⬅️», None — это первая страница
+    next_cursor: Optional[str]   # Токен для «➡️», None — дальше ничего нет
+
+
+def _encode_cursor(sort_by: str, direction: str, country: MemeCountry) -> str:
+    """
+    Курсор в callback_data: <n|p><значение ключа>_<country_id>.
+    n — страница после этой страны, p — перед ней. Влезает в лимит 64 байта.
+    """
+    (column, _), _ = COUNTRY_SORTS[sort_by]
+    value = getattr(country, column.key)
+    if sort_by == "newest":
+        value = (value - _EPOCH) // timedelta(microseconds=1)
+    elif sort_by == "rating":
+        value = repr(float(value))  # repr — точное представление float, сравнение по = не промахнётся
+    return f"{direction}{value}_{country.country_id}"
+
+
+def _decode_cursor(sort_by: str, token: str) -> Optional[tuple[bool, object, int]]:
+    """(назад?, значение ключа, country_id) или None, если токен битый."""
+    try:
+        direction, (raw_value, _, raw_id) = token[0], token[1:].rpartition("_")
+        if direction not in ("n", "p"):
+            return None
+        if sort_by == "newest":
+            value = _EPOCH + timedelta(microseconds=int(raw_value))
+        elif sort_by == "rating":
+            value = float(raw_value)
+        else:
+            value = int(raw_value)
+        return direction == "p", value, int(raw_id)
+    except (ValueError, IndexError):
+        return None
+
+
+def _beyond(column, value, descending: bool):
+    return column < value if descending else column > value
+
+
+async def approx_country_count(session: AsyncSession) -> int:
+    """
+    Число стран без COUNT(*) на каждую страницу: из индекса названий в памяти,
+    а пока он не загружен — из кэша на COUNTRY_COUNT_TTL секунд.
+    """
+    if country_index.ready:
+        return len(country_index)
+    now = time.monotonic()
+    if now >= _country_count_cache["expires"]:
+        _country_count_cache["value"] = await session.scalar(select(func.count()).select_from(MemeCountry)) or 0
+        _country_count_cache["expires"] = now + COUNTRY_COUNT_TTL
+    return _country_count_cache["value"]
+
+
 async def get_countries_for_list(
     session: AsyncSession,
-    page: int,
+    sort_by: str = "influence",
+    cursor: Optional[str] = None,
     limit: int = 5,
-    sort_by: str = "influence"
-) -> Tuple[List[MemeCountry], int]:
+    offset: int = 0,
+    options: tuple = (),
+) -> CountryPage:
     """
-    Получает список стран с безопасной пагинацией и валидацией.
+    Страница списка стран. Без cursor — первая, иначе — соседняя с курсором
+    (keyset: WHERE (ключ, id) после последней показанной страны, по индексу,
+    без OFFSET). offset — только для прямого перехода на страницу N (/countrylist N),
+    options — опции загрузки (selectinload связей).
     """
-    # 1. Защита от кривых входных данных (Security/Validation)
-    page = max(1, page)
-    limit = min(100, max(1, limit)) # Ограничиваем сверху, чтобы не положить базу
-    offset = (page - 1) * limit
-
-    # 2. Маппинг сортировки
-    # Используем dict.get() — это правильно, защищает от SQL-инъекций через sort_by
-    sort_options = {
-        "influence": desc(MemeCountry.influence_points),
-        "rating": desc(MemeCountry.avg_rating),
-        "newest": desc(MemeCountry.created_at),
-        "members": desc(MemeCountry.total_reviews)
-    }
-    
-    order_criterion = sort_options.get(sort_by, sort_options["influence"])
+    # Неизвестная сортировка (старые кнопки, подделанный callback) — по влиянию
+    if sort_by not in COUNTRY_SORTS:
+        sort_by = "influence"
+    limit = min(100, max(1, limit))  # Ограничиваем сверху, чтобы не положить базу
+    (column, descending), (tie, tie_descending) = COUNTRY_SORTS[sort_by]
 
-    # 3. Основной запрос
-    stmt = (
-        select(MemeCountry)
-        .order_by(order_criterion, asc(MemeCountry.name))
-        .offset(offset)
-        .limit(limit)
-    )
+    seek = _decode_cursor(sort_by, cursor) if cursor else None
+    backward = seek is not None and seek[0]
+    # Назад — читаем в обратном порядке от курсора и разворачиваем результат
+    descending, tie_descending = descending != backward, tie_descending != backward
 
-    # 4. Выполнение (используем scalars() для чистого списка объектов)
-    res = await session.execute(stmt)
-    countries = res.scalars().all()
+    stmt = select(MemeCountry).options(*options)
+    if seek is not None:
+        _, value, country_id = seek
+        # Для ничьих по имени значение берём у самой страны-курсора (имя в callback не влезет)
+        tie_value = country_id if tie is MemeCountry.country_id else (
+            select(tie).where(MemeCountry.country_id == country_id).scalar_subquery()
+        )
+        stmt = stmt.where(
+            # Первое условие — граница для индекса, второе — точный порядок с ничьими
+            column <= value if descending else column >= value,
+            or_(_beyond(column, value, descending), and_(column == value, _beyond(tie, tie_value, tie_descending))),
+        )
+    stmt = stmt.order_by(
+        column.desc() if descending else column.asc(),
+        tie.desc() if tie_descending else tie.asc(),
+    ).limit(limit + 1)  # +1 — узнать, есть ли ещё страница, без COUNT
+    if offset > 0:
+        stmt = stmt.offset(offset)
+
+    countries = list((await session.scalars(stmt)).all())
+    has_more = len(countries) > limit
+    countries = countries[:limit]
+    if backward:
+        countries.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = seek is not None or offset > 0, has_more
+
+    return CountryPage(
+        countries=countries,
+        total=await approx_country_count(session),
+        prev_cursor=_encode_cursor(sort_by, "p", countries[0]) if countries and has_prev else None,
+        next_cursor=_encode_cursor(sort_by, "n", countries[-1]) if countries and has_next else None,
+    )
 
-    # 5. Подсчет общего количества (лучше делать это через Scalar)
-    total_stmt = select(func.count()).select_from(MemeCountry)
-    total = await session.scalar(total_stmt) or 0
 
-    return list(countries), total
 # ==========================================
 # СТАТИСТИКА И ИСТОРИЯ (Заглушки для импорта)
 # ==========================================
 
-async def get_top_users(session: AsyncSession, limit: int = 10):
+async def get_top_users(session: AsyncSession, limit: int = 10, offset: int = 0):
     """
-    Топ пользователей по очкам.
+    Топ пользователей по очкам (из лидерборда в памяти, пока он холодный — SQL).
     """
-    stmt = (
-        select(User)
-        .order_by(desc(User.points))
-        .limit(limit)
-        .options(joinedload(User.country))
-    )
-    result = await session.execute(stmt)
-    return result.scalars().all()
+    ranked = await leaderboards.page(session, "points", offset, limit)
+    return await load_ranked(session, User, ranked, joinedload(User.country))
+
+
+async def get_leaderboard_rank(session: AsyncSession, board: str, item_id: int) -> Optional[tuple[int, int]]:
+    """
+    Место в лидерборде: board — points / casino (user_id), influence / rating (country_id).
+    Возвращает (место, всего) или None.
+    """
+    return await leaderboards.rank(session, board, item_id)
 
 async def get_history(session: AsyncSession, target_id: int, limit: int = 20):
     """
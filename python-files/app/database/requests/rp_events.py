@@ -1,7 +1,9 @@
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from app.database.models import RPEvent, RPParticipant, User
 from app.database.requests.admins import get_current_user_admin_level
+from app.database.requests.ledger import credit_many
 async def create_rp_event(session: AsyncSession, admin_id: int, chat_id: int, title: str, description: str = None, reward_points: int = 10) -> tuple[bool, str, int]:
     """Создает новый РП-ивент"""
     # Проверяем, есть ли активный ивент у этого администратора
@@ -135,23 +137,43 @@ async def end_rp_event(session: AsyncSession, event_id: int, admin_id: int, rewa
     event.status = 'finished'
     event.finished_at = func.now()
     
-    participants_with_users = await session.execute(
-        select(RPParticipant, User)
-        .join(User, RPParticipant.user_id == User.user_id)
-        .where(RPParticipant.event_id == event_id)
+    participants_list = (await session.scalars(
+        select(RPParticipant.user_id).where(RPParticipant.event_id == event_id)
+    )).all()
+    
+    # Начисляем очки всем участникам (кроме создателя ивента) — один запрос вместе с историей
+    await credit_many(
+        session,
+        [user_id for user_id in participants_list if user_id != admin_id],
+        reward_points,
+        event_type="RP_EVENT_REWARD",
+        reason=f"Награда за РП-ивент #{event_id}",
+        admin_id=admin_id
     )
-    participants_list = participants_with_users.all()
-    
-    # Начисляем очки всем участникам (кроме создателя ивента)
-    for participant, user in participants_list:
-        if user.user_id != admin_id:  # Не начисляем очки создателю ивента
-            user.points += reward_points
-            # Логируем начисление очков (опционально)
-            print(f"Начислено {reward_points} RP-очков пользователю {user.user_id}")
     
     return True, f"Ивент завершен! {len(participants_list)} участникам начислено {reward_points} очков!"
 
 
+async def close_stale_rp_events(session: AsyncSession, max_age: timedelta) -> list[RPEvent]:
+    """
+    Автозакрытие: завершает активные ивенты старше max_age с обычной
+    наградой участникам (от имени создателя). Возвращает закрытые.
+
+    created_at пишет сервер (now() в его часовом поясе), поэтому и
+    «сейчас» берём у сервера — LOCALTIMESTAMP, а не часы бота.
+    """
+    stale = (await session.scalars(
+        select(RPEvent)
+        .where(RPEvent.status == 'active', RPEvent.created_at < func.localtimestamp() - max_age)
+        .order_by(RPEvent.event_id)
+        .with_for_update(skip_locked=True)
+    )).all()
+
+    for event in stale:
+        await end_rp_event(session, event.event_id, event.admin_id)
+    return list(stale)
+
+
 async def get_chat_rp_events(session: AsyncSession, chat_id: int) -> list[RPEvent]:
     """Получает историю RP-ивентов в чате"""
     result = await session.execute(
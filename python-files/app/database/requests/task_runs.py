@@ -0,0 +1,117 @@
+"""
+Журнал запусков фоновых задач (task_runs) и состояние планировщика (scheduled_jobs).
+
+Строка (task, run_key) — «этот запуск уже был». Задача, которая идёт
+кусками, держит в cursor последний обработанный id и двигает его в той же
+транзакции, что и сами изменения: упала посередине — следующий запуск
+продолжит с места обрыва, ничего не повторив.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import TaskRun, ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+
+async def lock_task_run(session: AsyncSession, task: str, run_key: str) -> Optional[int]:
+    """
+    Создаёт (если нужно) и блокирует до конца транзакции строку запуска.
+    Возвращает cursor или None, если запуск уже завершён.
+    Параллельный воркер на этом же запуске ждёт блокировку, а не дублирует работу.
+    """
+    await session.execute(
+        insert(TaskRun)
+        .values(task=task, run_key=run_key, cursor=0)
+        .on_conflict_do_nothing(index_elements=[TaskRun.task, TaskRun.run_key])
+    )
+    row = (await session.execute(
+        select(TaskRun.cursor, TaskRun.finished_at)
+        .where(TaskRun.task == task, TaskRun.run_key == run_key)
+        .with_for_update()
+    )).one()
+    return None if row.finished_at is not None else row.cursor
+
+
+async def advance_task_run(session: AsyncSession, task: str, run_key: str, cursor: int) -> None:
+    await session.execute(
+        update(TaskRun)
+        .where(TaskRun.task == task, TaskRun.run_key == run_key)
+        .values(cursor=cursor)
+    )
+
+
+async def finish_task_run(session: AsyncSession, task: str, run_key: str) -> None:
+    await session.execute(
+        update(TaskRun)
+        .where(TaskRun.task == task, TaskRun.run_key == run_key)
+        .values(finished_at=datetime.utcnow())
+    )
+
+
+# ==========================================
+# ПЛАНИРОВЩИК (scheduled_jobs)
+# ==========================================
+async def ensure_scheduled_job(session: AsyncSession, name: str, next_run_at: datetime) -> datetime:
+    """Регистрирует задачу, если её ещё нет. Возвращает сохранённый next_run_at."""
+    await session.execute(
+        insert(ScheduledJob)
+        .values(name=name, next_run_at=next_run_at)
+        .on_conflict_do_nothing(index_elements=[ScheduledJob.name])
+    )
+    return await session.scalar(select(ScheduledJob.next_run_at).where(ScheduledJob.name == name))
+
+
+async def get_scheduled_jobs(session: AsyncSession) -> list[ScheduledJob]:
+    return list((await session.scalars(select(ScheduledJob))).all())
+
+
+async def claim_scheduled_job(
+    session: AsyncSession,
+    name: str,
+    now: datetime,
+    locked_until: datetime,
+) -> Optional[datetime]:
+    """
+    Забирает подошедшую задачу в работу (аренда до locked_until).
+    Возвращает её плановое время или None — не пора либо уже выполняется
+    (в том числе другим процессом).
+    """
+    return await session.scalar(
+        update(ScheduledJob)
+        .where(
+            ScheduledJob.name == name,
+            ScheduledJob.next_run_at <= now,
+            or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+        )
+        .values(locked_until=locked_until)
+        .returning(ScheduledJob.next_run_at)
+    )
+
+
+async def complete_scheduled_job(
+    session: AsyncSession,
+    name: str,
+    next_run_at: datetime,
+    started_at: datetime,
+    duration: float,
+    error: Optional[str] = None,
+    locked_until: Optional[datetime] = None,
+) -> None:
+    """Итог запуска. locked_until — не забирать задачу раньше (повтор того же запуска после ошибки)."""
+    await session.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.name == name)
+        .values(
+            next_run_at=next_run_at,
+            last_run_at=started_at,
+            last_duration=duration,
+            last_error=error[:512] if error else None,
+            locked_until=locked_until,
+        )
+    )
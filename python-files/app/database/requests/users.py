@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from ..models import User, History, Admins, MemeCountry, CountryReview, CountryBlacklist
+from ..leaderboard import leaderboards, load_ranked
 from config import OWNER_ID
 from app.utils.html_helpers import escape_html
 
@@ -22,6 +23,7 @@ async def get_or_create_user(
 ) -> User:
     """
     Получает пользователя со всеми связями. Если нет — создает.
+    flush делаем только когда юзер новый или сменил ник/имя в телеге.
     """
     # Используем selectinload, чтобы связи были доступны сразу в памяти
     stmt = (
@@ -36,13 +38,16 @@ async def get_or_create_user(
     
     result = await session.execute(stmt)
     user = result.scalar_one_or_none()
+    changed = False
 
     if user:
         # Обновление данных (если изменились в телеге)
         if user.username != username:
             user.username = username
+            changed = True
         if user.userfullname != userfullname:
             user.userfullname = userfullname
+            changed = True
     else:
         # Создание нового профиля
         user = User(
@@ -54,10 +59,12 @@ async def get_or_create_user(
             adminlevel=0
         )
         session.add(user)
-    
+        changed = True
+
     # flush поднимет ID и зафиксирует изменения в текущей транзакции
-    await session.flush()
-    
+    if changed:
+        await session.flush()
+
     return user
 
 async def get_full_user_profile(session: AsyncSession, user_id: int) -> User | None:
@@ -104,20 +111,14 @@ async def reset_user_cooldown(session: AsyncSession, user_id: int):
 # ==========================================
 # 🎰 ТОП ЛУДОМАНОВ (Проёбанные баблишки в казике)
 # ==========================================
-async def get_top_ludomans(session: AsyncSession) -> list[User]:
+async def get_top_ludomans(session: AsyncSession, limit: int = 10) -> list[User]:
     """
-    Получает топ 10 пользователей, которые больше всего проебали в казино
+    Получает топ пользователей, которые больше всего проебали в казино
+    (из лидерборда в памяти, пока он холодный — SQL)
     """
     try:
-        stmt = (
-            select(User)
-            .where(User.lost_in_casino > 0)  # Только те, кто что-то проебал
-            .order_by(User.lost_in_casino.desc())
-            .limit(10)
-        )
-        result = await session.execute(stmt)
-        top_users = result.scalars().all()
-        return list(top_users)
+        ranked = await leaderboards.page(session, "casino", 0, limit)  # Только те, кто что-то проебал
+        return await load_ranked(session, User, ranked)
     except Exception as e:
         logger.error(f"Error in get_top_ludomans: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,193 @@
+"""
+Кэш пользователей в памяти процесса (TTL + LRU).
+
+UserMiddleware берёт отсюда готовый профиль и вливает его в сессию через
+session.merge(..., load=False) — без единого запроса к Postgres.
+
+Инвалидация:
+- любые ORM-изменения User / Punishment / CountryBlacklist / Admins
+  ловятся слушателем after_flush (give_points, join_country, перевод очков,
+  казино и т.д.) — ничего вызывать руками не нужно;
+- изменения MemeCountry сбрасывают кэш целиком (в кэше лежат user.country);
+- массовые UPDATE в обход ORM (налоги, бонусы) должны сами вызвать
+  mark_dirty() / mark_all_dirty().
+
+После коммита сброс повторяется: иначе параллельный апдейт мог успеть
+положить в кэш ещё незакоммиченные (старые) данные.
+
+В режиме воркеров сброс после коммита рассылается остальным процессам
+(peers). Профиль, прочитанный до того, как туда дошёл чужой сброс,
+в кэш не кладётся (remember(..., loaded_since)).
+"""
+import logging
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import peers
+from .models import User, MemeCountry, Punishment, CountryBlacklist, Admins
+from config import USER_CACHE_TTL, USER_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Ключи в session.info
+_DIRTY_IDS = "user_cache_dirty_ids"
+_DIRTY_ALL = "user_cache_dirty_all"
+
+# Связи, которые должны быть подгружены, чтобы merge(load=False) был безопасен
+_REQUIRED_RELATIONS = ("country", "ruled_country_list", "punishments")
+
+# Сколько секунд помнить чужие сбросы: дольше хендлер с профилем не работает
+_REMOTE_MEMORY = 300
+
+
+class UserCache:
+    """Простой TTL/LRU кэш: user_id -> (время записи, объект User)."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: OrderedDict[int, tuple[float, User]] = OrderedDict()
+        # Сбросы из других процессов: user_id -> когда пришёл (и когда пришёл сброс всего кэша)
+        self._remote: OrderedDict[int, float] = OrderedDict()
+        self._remote_clear_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, user_id: int) -> Optional[User]:
+        item = self._items.get(user_id)
+        if item is None:
+            self.misses += 1
+            return None
+
+        stored_at, user = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._items[user_id]
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(user_id)
+        self.hits += 1
+        return user
+
+    def put(self, user: User) -> None:
+        if not self.enabled:
+            return
+        self._items[user.user_id] = (time.monotonic(), user)
+        self._items.move_to_end(user.user_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        for user_id in user_ids:
+            self._items.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def invalidate_remote(self, user_ids: Optional[Iterable[int]]) -> None:
+        """Сброс после коммита в другом процессе; None — весь кэш."""
+        now = time.monotonic()
+        if user_ids is None:
+            self.clear()
+            self._remote_clear_at = now
+        else:
+            for user_id in user_ids:
+                self._items.pop(user_id, None)
+                self._remote.pop(user_id, None)
+                self._remote[user_id] = now
+        while self._remote and now - next(iter(self._remote.values())) > _REMOTE_MEMORY:
+            self._remote.popitem(last=False)
+
+    def changed_elsewhere(self, user_id: int, since: float) -> bool:
+        return max(self._remote_clear_at, self._remote.get(user_id, float("-inf"))) >= since
+
+    def remember(self, session: AsyncSession, user: User, loaded_since: Optional[float] = None) -> None:
+        """
+        Кладёт пользователя в кэш, только если объект «чистый»:
+        не менялся в этой сессии, все нужные связи подгружены и, если
+        известно, с какого момента (time.monotonic()) он читался, — другой
+        процесс за это время его не менял.
+        """
+        if not self.enabled:
+            return
+        if loaded_since is not None and self.changed_elsewhere(user.user_id, loaded_since):
+            return
+
+        info = session.info
+        if info.get(_DIRTY_ALL) or user.user_id in info.get(_DIRTY_IDS, ()):
+            return
+
+        state = inspect(user)
+        if not state.persistent or state.modified or state.expired_attributes:
+            return
+        if state.unloaded.intersection(_REQUIRED_RELATIONS):
+            return
+
+        self.put(user)
+
+
+user_cache = UserCache(ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE)
+peers.subscribe("user_cache", user_cache.invalidate_remote)
+
+
+def mark_dirty(session: AsyncSession | Session, *user_ids: int) -> None:
+    """Сбрасывает пользователей сейчас и ещё раз после коммита сессии."""
+    session.info.setdefault(_DIRTY_IDS, set()).update(user_ids)
+    user_cache.invalidate(*user_ids)
+
+
+def mark_all_dirty(session: AsyncSession | Session) -> None:
+    """Для массовых UPDATE, где неизвестно, чьи строки поменялись."""
+    session.info[_DIRTY_ALL] = True
+    user_cache.clear()
+
+
+# ==========================================
+# СЛУШАТЕЛИ СЕССИИ
+# ==========================================
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_users(session: Session, flush_context) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, User):
+            mark_dirty(session, obj.user_id)
+        elif isinstance(obj, (Punishment, CountryBlacklist, Admins)):
+            mark_dirty(session, obj.user_id)
+        elif isinstance(obj, MemeCountry):
+            mark_all_dirty(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    dirty_all, dirty_ids = _flush_dirty(session)
+    # Остальным процессам — только закоммиченное
+    if dirty_all:
+        peers.publish("user_cache", None)
+    elif dirty_ids:
+        peers.publish("user_cache", tuple(dirty_ids))
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_after_rollback(session: Session) -> None:
+    _flush_dirty(session)
+
+
+def _flush_dirty(session: Session) -> tuple[bool, set[int]]:
+    dirty_all = session.info.pop(_DIRTY_ALL, False)
+    dirty_ids = session.info.pop(_DIRTY_IDS, set())
+    if dirty_all:
+        user_cache.clear()
+    user_cache.invalidate(*dirty_ids)
+    return dirty_all, dirty_ids
@@ -1,19 +1,73 @@
 import logging
-from typing import Callable, Dict, Any, Awaitable, Union
+import time
+from typing import Callable, Dict, Any, Awaitable, Union, Optional
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, CallbackQuery, User as TgUser
 from sqlalchemy.ext.asyncio import AsyncSession
 
-# Импортируем только то, что нужно. 
+# Импортируем только то, что нужно.
 # Мы импортируем функцию получения юзера, которая НЕ вызывает циклов.
 from app.database.requests.users import get_or_create_user
+from app.database.user_cache import user_cache
+from app.database.models import User
 
 logger = logging.getLogger(__name__)
 
+
+class LazyUser:
+    """
+    Ленивый профиль для хендлеров без флага "user".
+    В БД не ходим, пока хендлер сам не попросит:
+
+        profile = await user
+
+    После await атрибуты проксируются на настоящий User (user.points и т.д.).
+    """
+    __slots__ = ("_loader", "_user", "_loaded")
+
+    def __init__(self, loader: Callable[[], Awaitable[Optional[User]]]):
+        self._loader = loader
+        self._user: Optional[User] = None
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def value(self) -> Optional[User]:
+        return self._user
+
+    async def resolve(self) -> Optional[User]:
+        if not self._loaded:
+            self._user = await self._loader()
+            self._loaded = True
+        return self._user
+
+    def __await__(self):
+        return self.resolve().__await__()
+
+    def __getattr__(self, name: str) -> Any:
+        if not self._loaded:
+            raise RuntimeError(
+                f"LazyUser.{name}: профиль ещё не загружен. "
+                "Сделай `await user` или повесь на хендлер flags={'user': True}."
+            )
+        return getattr(self._user, name)
+
+
 class UserMiddleware(BaseMiddleware):
     """
     Чистый Middleware для работы с пользователем.
     Работает в едином цикле транзакции, без принудительных коммитов.
+
+    Профиль грузится сразу для хендлеров с flags={"user": True}.
+    Остальные получают LazyUser, но регистрация остаётся: если отправителя
+    нет в user_cache или он сменил ник/имя, профиль всё равно читается
+    (get_or_create_user создаёт новичка и обновляет ник) — иначе поиск
+    по @username не нашёл бы тех, кто только пишет в чат. Известный и
+    не переименованный юзер из кэша обходится без запросов к БД.
     """
     async def __call__(
         self,
@@ -21,7 +75,7 @@ class UserMiddleware(BaseMiddleware):
         event: Union[Message, CallbackQuery],
         data: Dict[str, Any]
     ) -> Any:
-        
+
         # 1. Сессия должна быть проброшена из SessionMiddleware выше
         session: AsyncSession = data.get("session")
         if not session:
@@ -33,22 +87,60 @@ class UserMiddleware(BaseMiddleware):
         if not tg_user or tg_user.is_bot:
             return await handler(event, data)
 
+        # До любого чтения профиля: чужой сброс после этого момента — профиль в кэш не кладём
+        started = time.monotonic()
+
+        # 3. Хендлер явно попросил профиль или юзер новый/переименовался — грузим сразу
+        # (заодно регистрация и обновление ника), иначе отдаём ленивую обёртку.
+        # Теперь в любом хендлере можно просто добавить аргумент 'user: User'
+        lazy_user = LazyUser(lambda: self.load_user(session, tg_user))
+        if get_flag(data, "user"):
+            data["user"] = await lazy_user.resolve()
+        else:
+            if not self.is_known(tg_user):
+                # Хендлер получит уже загруженную обёртку: `await user` не пойдёт в БД второй раз
+                await lazy_user.resolve()
+            data["user"] = lazy_user
+
+        result = await handler(event, data)
+
+        # 4. Хендлер отработал — запоминаем профиль, если он не менялся
+        if lazy_user.value is not None:
+            user_cache.remember(session, lazy_user.value, loaded_since=started)
+
+        return result
+
+    @staticmethod
+    def is_known(tg_user: TgUser) -> bool:
+        """Юзер в кэше и с тем же ником/именем — регистрировать и обновлять нечего."""
+        cached = user_cache.get(tg_user.id)
+        return (
+            cached is not None
+            and cached.username == (tg_user.username or "")
+            and cached.userfullname == (tg_user.full_name or "")
+        )
+
+    @staticmethod
+    async def load_user(session: AsyncSession, tg_user: TgUser) -> Optional[User]:
+        username = tg_user.username or ""
+        userfullname = tg_user.full_name or ""
+
         try:
-            user = await get_or_create_user(
+            # Кэш: если ник/имя не поменялись — вливаем готовый объект в сессию без SELECT
+            cached = user_cache.get(tg_user.id)
+            if cached is not None and cached.username == username and cached.userfullname == userfullname:
+                return await session.merge(cached, load=False)
+
+            return await get_or_create_user(
                 session=session,
                 user_id=tg_user.id,
-                username=tg_user.username or "",
-                userfullname=tg_user.full_name or ""
+                username=username,
+                userfullname=userfullname
             )
 
-            # 4. Кладем объект в data под коротким именем 'user'
-            # Теперь в любом хендлере можно просто добавить аргумент 'user: User'
-            data["user"] = user
-
         except Exception as e:
             logger.error(f"Ошибка в UserMiddleware для юзера {tg_user.id}: {e}")
+            user_cache.invalidate(tg_user.id)
             # В случае ошибки БД лучше не ломать бота, а пропустить запрос дальше,
             # хендлеры сами разберутся, если 'user' будет None.
-            data["user"] = None
-
-        return await handler(event, data)
\ No newline at end of file
+            return None
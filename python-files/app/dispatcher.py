@@ -0,0 +1,188 @@
+"""
+Сборка Dispatcher со всеми мидлварями и роутерами.
+
+Вынесено из RPBot3.0.py, чтобы бот, вебхук, воркеры (app/workers.py) и
+бенчмарки (benchmarks/) работали на одной и той же конфигурации. Роутеры —
+модульные синглтоны, поэтому create_dispatcher() можно вызвать один раз на процесс.
+"""
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+
+from app.handlers import router, finish_reveals
+from app.countrycreate import country_create_router
+from app.admin_router import admin_router
+from app.gameplay_router import gameplay_router
+from app.rp_events_router import router as rp_events_router
+from app.update_scheduler import UpdateScheduler
+from app.text_commands import TextCommandMiddleware
+from app.database.middleware import SessionMiddleware
+from app.database.user_middleware import UserMiddleware
+from app.database.models import async_main
+from app.database.session import async_session, engine, pool_capacity, check_pool
+from app.database.profiler import profiler, HandlerNameMiddleware
+from app.database.country_index import country_index
+from app.database.leaderboard import leaderboards
+from app.database.admin_levels import admin_levels
+from app.broadcast import Broadcaster
+from app.fsm_storage import DatabaseStorage
+from app.media import MediaRegistry, SLOTS_PATH
+from app.metrics import start_metrics_server
+from app.tasks import country_index_watchdog, leaderboard_refresher, admin_levels_refresher, create_scheduler
+from config import (
+    UPDATE_MAX_CONCURRENCY,
+    UPDATE_QUEUE_PER_KEY,
+    BROADCAST_GLOBAL_RATE,
+    COUNTRY_INDEX_CHECK_MINUTES,
+    ADMIN_LEVELS_RELOAD_MINUTES,
+    LEADERBOARD_REFRESH_SECONDS,
+    LEADERBOARD_FULL_RELOAD_MINUTES,
+    METRICS_LISTEN_HOST,
+    METRICS_LISTEN_PORT,
+    MEDIA_UPLOAD_CHAT_ID,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def create_dispatcher(**kwargs) -> Dispatcher:
+    dp = Dispatcher(**kwargs)
+
+    # ============================================================
+    #MIDDLEWARE (ПОРЯДОК ВАЖЕН)
+    # ============================================================
+    # 0. Планировщик: апдейты одного юзера в чате — по очереди, разных — параллельно.
+    # Стоит ДО SessionMiddleware, чтобы ждущие апдейты не держали соединения пула.
+    update_scheduler = UpdateScheduler(
+        max_concurrency=UPDATE_MAX_CONCURRENCY or pool_capacity(),
+        max_queue_per_key=UPDATE_QUEUE_PER_KEY,
+    )
+    dp.update.outer_middleware(update_scheduler)
+    dp["update_scheduler"] = update_scheduler
+    # 1. Сначала SessionMiddleware.
+    dp.update.outer_middleware(SessionMiddleware())
+    # 2. Затем UserMiddleware.
+    # Он работает внутри сессии. Регистрируем на message и callback_query.
+    user_middleware = UserMiddleware()
+    dp.message.middleware(user_middleware)
+    dp.callback_query.middleware(user_middleware)
+    # 3. Подпись профиля апдейта именем хендлера (SQL-статистика по хендлерам)
+    profiler.install(engine)
+    handler_name_middleware = HandlerNameMiddleware()
+    dp.message.middleware(handler_name_middleware)
+    dp.callback_query.middleware(handler_name_middleware)
+    # 4. Текст «рп ...» разбирается один раз на все фильтры TextCommand (префиксное дерево)
+    dp.message.outer_middleware(TextCommandMiddleware())
+
+    # ============================================================
+    dp.include_router(admin_router)
+    dp.include_router(country_create_router)
+    dp.include_router(gameplay_router)
+    dp.include_router(rp_events_router)
+    dp.include_router(router)
+
+    return dp
+
+
+async def init_database() -> None:
+    """Самопроверка пула, таблицы/индексы. В режиме воркеров — один раз, в супервизоре."""
+    await check_pool()
+    await async_main()
+    logger.info("✅ Database initialized and ready.")
+
+
+async def load_memory_state() -> None:
+    """Индексы, лидерборды и уровни админов в память процесса."""
+    # Индекс названий стран в памяти: /join и проверки уникальности без запросов
+    async with async_session() as session:
+        await country_index.load(session)
+        # Топы игроков и стран: страницы и «моё место» без сортировки таблиц
+        await leaderboards.load(session)
+        # Уровни админов: IsRPAdmin и проверки прав — поиск в словаре
+        await admin_levels.load(session)
+
+
+async def prepare_database() -> None:
+    """Таблицы/индексы + загрузка индексов, лидербордов и админов в память. Вызывается на старте."""
+    await init_database()
+    await load_memory_state()
+
+
+# ============================================================
+# ФОНОВЫЕ СЛУЖБЫ (dp.startup / dp.shutdown)
+# ============================================================
+def setup_services(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    init_db: bool = True,
+    primary: bool = True,
+    metrics: bool = True,
+    processes: int = 1,
+) -> None:
+    """
+    Рассылки, задачи по расписанию, GIF казино, обновление данных в памяти
+    и /metrics — всё, что бот поднимает на старте и гасит при остановке.
+
+    Режим воркеров (app/workers.py) запускает это в каждом воркере: таблицы
+    уже создал супервизор (init_db=False), задачи по расписанию и прогрев
+    GIF — только в первом (primary), /metrics отдаёт супервизор, а общий
+    лимит рассылок Telegram делится на число процессов (processes).
+    Данные в памяти каждый воркер загружает сам, а изменения после коммитов
+    получает от остальных через app/database/peers.py.
+    """
+    # Очередь рассылок: хендлеры и фоновые задачи получают её как broadcaster
+    broadcaster = Broadcaster(bot, global_rate=BROADCAST_GLOBAL_RATE / processes)
+    dp["broadcaster"] = broadcaster
+    # Бонусы, налоги, снятие наказаний, автозакрытие ивентов — по расписанию из БД
+    scheduler = create_scheduler(broadcaster, async_session) if primary else None
+    dp["job_scheduler"] = scheduler
+    # GIF казино: загружаются в Telegram один раз, дальше — по file_id из БД
+    slot_media = MediaRegistry(SLOTS_PATH, async_session, prefix="slot", suffix=".gif")
+    dp["slot_media"] = slot_media
+
+    # Ссылки на фоновые задачи, чтобы их не собрал GC
+    background_tasks: set[asyncio.Task] = set()
+
+    async def on_startup() -> None:
+        if init_db:
+            await prepare_database()
+        else:
+            await load_memory_state()
+        if isinstance(dp.storage, DatabaseStorage):
+            dp.storage.start()
+        await slot_media.load()
+        if primary and MEDIA_UPLOAD_CHAT_ID:
+            await slot_media.warm_up(bot, MEDIA_UPLOAD_CHAT_ID)
+        await broadcaster.start()
+        if scheduler is not None:
+            await scheduler.start()
+        if COUNTRY_INDEX_CHECK_MINUTES > 0:
+            background_tasks.add(asyncio.create_task(
+                country_index_watchdog(async_session, COUNTRY_INDEX_CHECK_MINUTES)
+            ))
+        if ADMIN_LEVELS_RELOAD_MINUTES > 0:
+            background_tasks.add(asyncio.create_task(
+                admin_levels_refresher(async_session, ADMIN_LEVELS_RELOAD_MINUTES)
+            ))
+        if LEADERBOARD_REFRESH_SECONDS > 0:
+            background_tasks.add(asyncio.create_task(
+                leaderboard_refresher(async_session, LEADERBOARD_REFRESH_SECONDS, LEADERBOARD_FULL_RELOAD_MINUTES)
+            ))
+        # Локальный /metrics (профайлер хендлеров + очередь апдейтов)
+        if metrics:
+            dp["metrics_runner"] = await start_metrics_server(dp, METRICS_LISTEN_HOST, METRICS_LISTEN_PORT)
+
+    async def on_shutdown() -> None:
+        for task in background_tasks:
+            task.cancel()
+        await finish_reveals()
+        if scheduler is not None:
+            await scheduler.stop()
+        await broadcaster.stop()
+        if dp.get("metrics_runner") is not None:
+            await dp["metrics_runner"].cleanup()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
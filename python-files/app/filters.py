@@ -2,10 +2,12 @@ from aiogram.filters import BaseFilter
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.admin_levels import admin_levels
+
 class IsRPAdmin(BaseFilter):
     async def __call__(self, message: Message, session: AsyncSession) -> bool:
-        from app.database.requests import get_current_user_admin_level  # или твоя функция
-        level = await get_current_user_admin_level(session, message.from_user.id)
+        # Уровни админов — в памяти процесса: фильтр не ходит в БД (SQL — только до загрузки)
+        level = await admin_levels.get(session, message.from_user.id)
         return level > 0
 
 class IsCountryRuler(BaseFilter):
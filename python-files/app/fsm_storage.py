@@ -0,0 +1,199 @@
+"""
+Хранилище FSM в Postgres: шаги «создать страну» и «редактировать страну»
+(CountryCreateStates, CountryEditStates) переживают перезапуск и деплой.
+
+- чтение через кэш процесса: первое обращение к ключу — SELECT, дальше
+  из памяти. «У юзера нет состояния» кэшируется тоже: FSMContextMiddleware
+  спрашивает состояние на каждый апдейт, без этого каждое сообщение
+  ходило бы в БД;
+- запись пачками: set_state/set_data меняют кэш и помечают ключ, фоновая
+  задача раз в FSM_FLUSH_SECONDS пишет все изменения одним upsert
+  (0 — писать сразу, в том же вызове). При остановке — последний сброс;
+- сценарий, который не трогали FSM_TTL_HOURS, считается брошенным:
+  читается пустым, из БД его удаляет задача планировщика fsm_expiry.
+
+Несколько процессов делят состояние через БД, но кэш у каждого свой:
+апдейты одного чата должны обрабатываться одним процессом, иначе другой
+может прочитать устаревшее состояние.
+"""
+import asyncio
+import copy
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests.fsm import FSMRow, get_fsm_record, save_fsm_records
+from config import FSM_STORAGE, FSM_TTL_HOURS, FSM_FLUSH_SECONDS, FSM_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: dict[str, Any] = field(default_factory=dict)
+    updated_at: Optional[datetime] = None     # None — записи нет (или она истекла)
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        ttl_seconds: float,
+        flush_seconds: float,
+        cache_size: int,
+        key_builder: Optional[KeyBuilder] = None,
+    ):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.flush_seconds = flush_seconds
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._dirty: set[str] = set()           # Изменены, но ещё не записаны (из кэша не вытесняются)
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def start(self) -> None:
+        """Фоновая запись пачками (dp.startup). При flush_seconds <= 0 не нужна — пишем сразу."""
+        if self.flush_seconds > 0 and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    # ==========================================
+    # КЭШ
+    # ==========================================
+    def _expired(self, entry: _Entry) -> bool:
+        return (
+            self.ttl_seconds > 0
+            and entry.updated_at is not None
+            and (datetime.utcnow() - entry.updated_at).total_seconds() > self.ttl_seconds
+        )
+
+    async def _load(self, key: str) -> Optional[FSMRow]:
+        not_before = datetime.utcnow() - timedelta(seconds=self.ttl_seconds) if self.ttl_seconds > 0 else datetime.min
+        self.loads += 1
+        async with self.session_factory() as session:
+            return await get_fsm_record(session, key, not_before)
+
+    async def _entry(self, key: StorageKey) -> tuple[str, _Entry]:
+        k = self.key_builder.build(key)
+        entry = self._entries.get(k)
+        if entry is None:
+            row = await self._load(k)
+            # Пока шёл SELECT, ключ мог записать параллельный хендлер — его версия новее
+            entry = self._entries.get(k)
+            if entry is None:
+                entry = _Entry(row.state, row.data, row.updated_at) if row else _Entry()
+                self._entries[k] = entry
+                self._evict()
+        else:
+            self._entries.move_to_end(k)
+
+        if self._expired(entry):
+            # Строку в БД удалит fsm_expiry, а SELECT её уже не вернёт
+            entry.state, entry.data, entry.updated_at = None, {}, None
+        return k, entry
+
+    def _evict(self) -> None:
+        excess = len(self._entries) - self.cache_size
+        if excess <= 0:
+            return
+        victims = []
+        for k in self._entries:
+            if k not in self._dirty:
+                victims.append(k)
+                if len(victims) == excess:
+                    break
+        for k in victims:
+            del self._entries[k]
+
+    async def _touch(self, k: str, entry: _Entry) -> None:
+        entry.updated_at = datetime.utcnow()
+        self._dirty.add(k)
+        if self.flush_seconds <= 0:
+            await self.flush()
+
+    # ==========================================
+    # ИНТЕРФЕЙС BaseStorage
+    # ==========================================
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        await self._touch(k, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        _, entry = await self._entry(key)
+        return entry.state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        # Через JSON: данные уходят в jsonb, несериализуемое значение — ошибка сразу в хендлере, а не при записи
+        data = json.loads(json.dumps(data))
+        k, entry = await self._entry(key)
+        entry.data = data
+        await self._touch(k, entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, entry = await self._entry(key)
+        return copy.deepcopy(entry.data)
+
+    async def close(self) -> None:
+        """Остановка фоновой записи и последний сброс (Dispatcher вызывает на shutdown)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    # ==========================================
+    # ЗАПИСЬ В БД
+    # ==========================================
+    async def flush(self) -> bool:
+        """Пишет все накопленные изменения одной транзакцией. False — не получилось, повторим позже."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return True
+            keys, self._dirty = self._dirty, set()
+            # set_data заменяет словарь целиком, так что снимок по ссылке не поменяется под ногами
+            rows = [FSMRow(k, e.state, e.data, e.updated_at) for k in keys if (e := self._entries.get(k)) and e.updated_at]
+            try:
+                async with self.session_factory() as session:
+                    await save_fsm_records(session, rows)
+                    await session.commit()
+            except Exception as e:
+                self._dirty |= keys
+                logger.error(f"Не удалось записать состояния FSM ({len(rows)}): {e}", exc_info=True)
+                return False
+            self.flushes += 1
+            return True
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+def create_fsm_storage(session_factory: async_sessionmaker) -> BaseStorage:
+    """Хранилище FSM по FSM_STORAGE из конфига."""
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    if FSM_STORAGE != "database":
+        logger.warning(f"⚠️ Неизвестное FSM_STORAGE={FSM_STORAGE!r} — используем database.")
+    return DatabaseStorage(session_factory, FSM_TTL_HOURS * 3600, FSM_FLUSH_SECONDS, FSM_CACHE_SIZE)
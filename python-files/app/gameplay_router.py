@@ -15,24 +15,51 @@ from app.database.requests import (
     save_review
 )
 from app.keyboard import countries_top_keyboard, rating_keyboard
+from app.database.render_cache import render_cache
 gameplay_router = Router()
 
 async def show_countries_page(
     event: types.Message | types.CallbackQuery,
     session: AsyncSession,
-    page: int,
-    sort_by: str = "influence"
+    sort_by: str = "influence",
+    page: int = 1,
+    cursor: str | None = None,
 ):
-    limit = 5
-    countries, total_count = await get_countries_for_list(session, page, limit, sort_by)
+    rendered = await _render_countries_page(session, sort_by, page, cursor)
 
-    if not countries and page == 1:
-        msg = "🌍 Стран пока нет."
+    if rendered is None:
+        msg = "🌍 Стран пока нет." if cursor is None else "Эта страница не существует."
         if isinstance(event, types.CallbackQuery):
             return await event.answer(msg, show_alert=True)
         return await event.answer(msg)
 
-    total_pages = math.ceil(total_count / limit)
+    text, markup = rendered
+    try:
+        if isinstance(event, types.CallbackQuery):
+            await event.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+            await event.answer()
+        else:
+            await event.answer(text, reply_markup=markup, parse_mode="HTML")
+    except TelegramBadRequest:
+        if isinstance(event, types.CallbackQuery):
+            await event.answer()
+
+async def _render_countries_page(session: AsyncSession, sort_by: str, page: int, cursor: str | None):
+    """(текст, клавиатура) страницы /top или None, если стран нет. Готовые страницы — из render_cache."""
+    # Версию берём до чтения из БД — изменение во время сборки не закэшируется под новой
+    version = render_cache.list_version()
+    cached = render_cache.get("top", (sort_by, page, cursor), version)
+    if cached is not None:
+        return cached
+
+    limit = 5
+    result = await get_countries_for_list(session, sort_by, cursor, limit)
+    countries = result.countries
+    if not countries:
+        return None
+
+    # Число стран приблизительное (кэш) — страниц не меньше, чем уже пролистано
+    total_pages = max(page, math.ceil(result.total / limit))
 
     sort_names = {"influence": "Влиянию", "rating": "Рейтингу", "newest": "Новизне"}
     current_sort_name = sort_names.get(sort_by, "Влиянию")
@@ -55,43 +82,29 @@ async def show_countries_page(
 
     text += "✈️ <i>Выберите номер для вступления или смените фильтр:</i>"
 
-    markup = countries_top_keyboard(countries, page, total_pages, sort_by)
+    markup = countries_top_keyboard(countries, page, sort_by, result.prev_cursor, result.next_cursor)
 
-    try:
-        if isinstance(event, types.CallbackQuery):
-            await event.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
-            # Показываем сообщение, если стран нет
-            if total_count == 0:
-                await event.answer("⚠️ Стран пока нет.", show_alert=True)
-        else:
-            await event.answer(text, reply_markup=markup, parse_mode="HTML")
-    except TelegramBadRequest:
-        if isinstance(event, types.CallbackQuery):
-            await event.answer()
+    render_cache.put("top", (sort_by, page, cursor), version, (text, markup))
+    return text, markup
 
 @gameplay_router.message(Command("top"))
 async def cmd_top(message: types.Message, session: AsyncSession):
-    await show_countries_page(message, session, 1, "influence")
+    await show_countries_page(message, session, "influence")
 
 @gameplay_router.callback_query(F.data.startswith("top_page:"))
 async def on_page(call: types.CallbackQuery, session: AsyncSession):
-    # Разбираем новый формат: top_page:PAGE:SORT
+    # Формат: top_page:SORT:PAGE[:CURSOR] — курсор из соседней страницы, без OFFSET и COUNT
     parts = call.data.split(":")
-    page = int(parts[1])
-    sort_by = parts[2] if len(parts) > 2 else "influence"
-
-    countries, total_count = await get_countries_for_list(session, page, 5, sort_by)
-    total_pages = math.ceil(total_count / 5)
-
-    # Проверяем, что страница существует
-    if page <= 0 or page > total_pages:
-        await call.answer("Эта страница не существует.", show_alert=True)
-        return
+    if len(parts) < 3 or parts[1].isdigit():
+        # Кнопки старых сообщений (top_page:PAGE:SORT) — открываем первую страницу
+        sort_by = parts[2] if len(parts) > 2 else "influence"
+        return await show_countries_page(call, session, sort_by)
 
-    await show_countries_page(call, session, page, sort_by)
-    await call.answer()
+    sort_by, page = parts[1], int(parts[2]) if parts[2].isdigit() else 1
+    cursor = parts[3] if len(parts) > 3 and parts[3] else None
+    await show_countries_page(call, session, sort_by, page, cursor)
 
-@gameplay_router.callback_query(F.data.startswith("join:"))
+@gameplay_router.callback_query(F.data.startswith("join:"), flags={"user": True})
 async def on_join(call: types.CallbackQuery, session: AsyncSession, user):
     """
     Вступление: теперь максимально чисто.
@@ -108,7 +121,7 @@ async def on_join(call: types.CallbackQuery, session: AsyncSession, user):
     else:
         await call.answer(msg, show_alert=True)
 
-@gameplay_router.message(Command("rate"))
+@gameplay_router.message(Command("rate"), flags={"user": True})
 async def cmd_rate(message: types.Message, session: AsyncSession, user):
     """
     Оценка: используем данные из объекта user, подгруженного мидлварью.
@@ -130,7 +143,7 @@ async def cmd_rate(message: types.Message, session: AsyncSession, user):
         parse_mode="HTML"
     )
 
-@gameplay_router.callback_query(F.data.startswith("vote:"))
+@gameplay_router.callback_query(F.data.startswith("vote:"), flags={"user": True})
 async def on_vote(call: types.CallbackQuery, session: AsyncSession, user):
     """
     Голосование: user.user_id вместо call.from_user.id для единообразия.
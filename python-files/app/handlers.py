@@ -12,19 +12,23 @@ logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, F, Router, types
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.filters.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest
 
 # Импортируем только функции-обёртки для работы с БД
-from app.database.requests import get_or_create_user, get_top_users, add_admin, get_user_by_username, get_full_user_profile, get_top_ludomans
+from app.database.requests import get_or_create_user, get_top_users, add_admin, get_user_by_username, get_full_user_profile, get_top_ludomans, get_leaderboard_rank
 from sqlalchemy.future import select
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import User, Admins, History
 from app.database.session import async_session
+from app.database.user_middleware import LazyUser
+from app.media import MediaRegistry
+from app.text_commands import TextCommand, CommandArgs
+from app.slots import casino_1x3, slots_3x3
 from app.utils.html_helpers import escape_html
 from datetime import datetime
 
@@ -49,14 +53,7 @@ test: str = "ТЕСТ ПРОЙДЕН"
 
 # -----------------------------------------------------------------
 #ИМПОРТ КОНСТАНТЫ
-from config import (
-    SLOT_SYMBOLS, 
-    SYMBOL_WEIGHTS, 
-    SYMBOL_MULTIPLIERS,
-    SLOT3X3_SYMBOLS,
-    SLOT3X3_WEIGHTS,
-    SLOT3X3_MULTIPLIERS,
-)
+from config import CASINO_REVEAL_DELAY
 # -----------------------------------------------------------------
 
 # Вспомогательная функция для безопасного вывода HTML
@@ -113,18 +110,19 @@ pattern = re.compile(
 
 
 # передача очков
-@router.message(F.text.lower().startswith("рп передать"))
+@router.message(TextCommand("рп передать"), flags={"user": True})
 async def transfer_points(
     message: Message, 
     session: AsyncSession,
-    user: User  # ✅ User из middleware
+    user: User,  # ✅ User из middleware
+    text_command: CommandArgs  # Аргументы после «рп передать» (разобраны один раз, см. text_commands)
 ):
-    args = message.text.strip().split()
-    if len(args) < 3:
+    args = text_command.args
+    if len(args) < 1:
         await message.reply("❗ Формат: рп передать <сумма> <@юзер или ID>")
         return
 
-    amount_str = args[2]
+    amount_str = args[0]
     if not amount_str.isdigit():
         await message.reply("❗ Сумма должна быть числом.")
         return
@@ -139,8 +137,8 @@ async def transfer_points(
     # Получатель из реплая
     if message.reply_to_message:
         receiver_id = message.reply_to_message.from_user.id
-    elif len(args) >= 4:
-        receiver_arg = args[3]
+    elif len(args) >= 2:
+        receiver_arg = args[1]
 
         # Если @username
         if receiver_arg.startswith("@"):
@@ -167,36 +165,61 @@ async def transfer_points(
         await message.reply("❌ Нельзя переводить очки самому себе.")
         return
 
-    if user.points < amount:
+    # перевод: проверка баланса, списание, зачисление и история — одним запросом
+    balances = await rq.transfer(
+        session, user.user_id, receiver.user_id, amount,
+        reason=f"Перевод очков: {user.user_id} → {receiver.user_id}"
+    )
+    if balances is None:
         await message.reply("🚫 Недостаточно очков.")
         return
 
-    # перевод
-    user.points -= amount
-    receiver.points += amount
-
     await message.reply(
         f"💸 {amount} очков успешно переведено!\n"
         f"👤 Отправитель: {user.username or user.user_id}\n"
         f"👤 Получатель: {receiver.username or receiver.user_id}\n"
-        f"💰 Ваш баланс: {user.points}"
+        f"💰 Ваш баланс: {balances[0]}"
     )
 # --- КАЗИНО (1x3) ---
+# GIF из assets/slots отправляет реестр slot_media (app/media.py) — по file_id, без загрузки с диска
+
+# Отложенные ответы казино (ссылки, чтобы их не собрал GC; дожидаемся на остановке)
+_reveals: set[asyncio.Task] = set()
+
+async def _reveal_later(message: Message, slot_media: MediaRegistry, caption_text: str) -> None:
+    """Пауза «барабаны крутятся» и ответ — вне хендлера: слот UpdateScheduler уже свободен."""
+    try:
+        await asyncio.sleep(CASINO_REVEAL_DELAY)
+        await slot_media.reply_animation(message, caption_text, parse_mode='HTML')
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Не удалось отправить результат казино: {e}", exc_info=True)
 
-#Путь к GIF должен быть константой модуля.
-# Используем os.path.abspath(__file__) для надежного определения пути
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SLOTS_PATH = os.path.join(BASE_DIR, "assets", "slots")
+async def finish_reveals() -> None:
+    """Дожидается отложенных ответов казино (dp.shutdown): ставки уже списаны, результат должен дойти."""
+    if _reveals:
+        await asyncio.gather(*_reveals, return_exceptions=True)
 
-@router.message(F.text.lower().startswith("рп казино"))
-async def casino(message: Message, session: AsyncSession):
+async def settle_spin(session: AsyncSession, user_id: int, bet: int, payout: int, event_type: str, reason: str):
+    """
+    Расчёт спина в короткой транзакции: ставка, выигрыш и история пишутся
+    одним запросом и сразу коммитятся — соединение возвращается в пул.
+    Пауза и отправка ответа (сеть Telegram) идут уже без открытой транзакции.
+    """
+    settled = await rq.settle_bet(session, user_id, bet, payout, event_type=event_type, reason=reason)
+    if session.in_transaction():
+        await session.commit()
+    return settled
+
+@router.message(TextCommand("рп казино"))
+async def casino(message: Message, session: AsyncSession, slot_media: MediaRegistry, text_command: CommandArgs):
     # --- Блок Валидации Входящих Данных ---
-    args = message.text.strip().split()
-    if len(args) < 3:
+    bet_str = text_command.get(0)
+    if bet_str is None:
         await message.reply("❗ Формат: <code>рп казино &lt;ставка&gt;</code>", parse_mode='HTML')
         return
 
-    bet_str = args[2] 
     if not bet_str.isdigit() or int(bet_str) <= 0:
         await message.reply("❗ Ставка должна быть положительным числом.", parse_mode='HTML')
         return
@@ -204,63 +227,36 @@ async def casino(message: Message, session: AsyncSession):
     bet = int(bet_str)
     user_id = message.from_user.id
 
-    user = await get_or_create_user(
-        session=session, 
-        user_id=user_id, 
-        username=message.from_user.username, 
-        userfullname=message.from_user.full_name
-    )
-
     # --- Блок Бизнес-Логики ---
-    if user.points < bet:
-        await message.reply("🚫 У вас недостаточно очков для этой ставки.", parse_mode='HTML') 
-        return
+    # Исход не зависит от баланса, поэтому сначала крутим, а потом
+    # одним запросом проверяем баланс, списываем ставку и начисляем выигрыш.
 
-    # Списываем сразу (объект в памяти обновлен, сессия это запомнила)
-    user.points -= bet
-    
-    # Визуальный эффект (можно оставить, но лучше не злоупотреблять sleep в async)
-    await asyncio.sleep(1.0) 
-
-    # Крутим слоты
-    slot1 = random.choices(SLOT_SYMBOLS, weights=SYMBOL_WEIGHTS, k=1)[0]
-    slot2 = random.choices(SLOT_SYMBOLS, weights=SYMBOL_WEIGHTS, k=1)[0]
-    slot3 = random.choices(SLOT_SYMBOLS, weights=SYMBOL_WEIGHTS, k=1)[0]
-
-    # Расчет (твоя логика без изменений)
-    winnings = 0
-    final_multiplier = 0.0
-    winning_symbol = None
-    win_message = "❌ Увы, вы проиграли."
-
-    if slot1 == slot2 == slot3:
-        winning_symbol = slot1
-        final_multiplier = SYMBOL_MULTIPLIERS[winning_symbol] * 3.0
+    # Крутим слоты (исход берётся из таблицы выплат движка)
+    spin = casino_1x3.spin()
+    slot1, slot2, slot3 = spin.symbols
+    winning_symbol = spin.winning_symbol
+    final_multiplier = spin.multiplier
+    winnings = spin.payout(bet)
+
+    if spin.jackpot:
         win_message = "✨ Джекпот! Три одинаковых символа:"
-    elif slot1 == slot2 or slot2 == slot3 or slot1 == slot3:
-        if slot1 == slot2: winning_symbol = slot1
-        elif slot2 == slot3: winning_symbol = slot2
-        elif slot1 == slot3: winning_symbol = slot1
-        final_multiplier = SYMBOL_MULTIPLIERS[winning_symbol]
+    elif winning_symbol is not None:
         win_message = "🎉 Поздравляем! Два одинаковых символа:"
-        
-    if final_multiplier > 0:
-        winnings = int(bet * final_multiplier)
-        user.points += winnings # SQLAlchemy следит за этим изменением
-
-    # --- Запись в историю ---
-    history = History(
-        admin_id=user_id, # Тут админ и таргет совпадают, это ок
-        target_id=user_id,
+    else:
+        win_message = "❌ Увы, вы проиграли."
+
+    # --- Расчёт ставки + запись в историю (один запрос, транзакция сразу закрыта) ---
+    settled = await settle_spin(
+        session, user_id, bet, winnings,
         event_type="CASINO_GAME",
-        points=winnings if winnings > 0 else -bet, 
-        reason="Казино: Слоты",
-        timestamp=datetime.now()
+        reason="Казино: Слоты"
     )
-    session.add(history)
+    if settled is None:
+        await message.reply("🚫 У вас недостаточно очков для этой ставки.", parse_mode='HTML')
+        return
 
     # 9. Формирование финального сообщения
-    safe_points = escape_html(f"{user.points}")
+    safe_points = escape_html(f"{settled.points}")
     safe_bet = escape_html(f"{bet}")
     safe_multiplier = escape_html(f"{final_multiplier:.1f}x") 
     safe_winnings = escape_html(f"{winnings}")
@@ -272,11 +268,10 @@ async def casino(message: Message, session: AsyncSession):
             f"🏆 Вы выиграли <b>{safe_winnings}</b> очков!"
         )
     else:
-    # Добавляем проигранные деньги к счету "Проёбанных баблишек"
-        user.lost_in_casino += bet
+    # Проигранное уже добавлено к счету "Проёбанных баблишек" в settle_bet
         result_text = (
             f"{win_message}\n"
-            f"💸 Проёбано в казино: <b>{user.lost_in_casino}</b> очков"
+            f"💸 Проёбано в казино: <b>{settled.lost_in_casino}</b> очков"
         )
     caption_text = (
         f"🎰 | {slot1} | {slot2} | {slot3} |\n\n{result_text}\n\n"
@@ -284,70 +279,30 @@ async def casino(message: Message, session: AsyncSession):
         f"Проверьте через 'рп профиль'."
     )
         
-    # 10. Выбор и отправка GIF (логика не меняется, просто больше нет msg.edit_text)
-    
-    slot_gifs = []
-    try:
-        slot_gifs = [f for f in os.listdir(SLOTS_PATH) if f.endswith(".gif") and f.startswith("slot")]
-    except FileNotFoundError:
-        pass
-
-    chosen_gif = random.choice(slot_gifs) if slot_gifs else None
-
-    if chosen_gif:
-        gif_path = os.path.join(SLOTS_PATH, chosen_gif)
-        animation_file = FSInputFile(gif_path)
-        await message.reply_animation(animation_file, caption=caption_text, parse_mode='HTML')
+    # 10. Отправка со случайной GIF (по file_id из реестра).
+    # Визуальный эффект — пауза перед ответом: ставка уже рассчитана, поэтому
+    # хендлер завершается сразу и не держит ни соединение с БД, ни слот UpdateScheduler
+    if CASINO_REVEAL_DELAY > 0:
+        task = asyncio.create_task(_reveal_later(message, slot_media, caption_text))
+        _reveals.add(task)
+        task.add_done_callback(_reveals.discard)
     else:
-        await message.reply(caption_text, parse_mode='HTML')
+        await slot_media.reply_animation(message, caption_text, parse_mode='HTML')
 
 
 # --- СЛОТЫ 3x3 ---
-def spin_slots():
-    """Крутит слоты 3x3 с использованием весов символов."""
-    # Используем SYMBOL_WEIGHTS для каждого символа (k=9 - 9 слотов)
-    all_symbols = random.choices(SLOT_SYMBOLS, weights=SYMBOL_WEIGHTS, k=9)
-    # Делим на 3 ряда
-    slots = [all_symbols[i:i + 3] for i in range(0, 9, 3)]
-    return slots
+# Барабаны, линии и выплаты — в движке app/slots.py
 
 def format_slots(slots):
     """Форматирует слоты для вывода в сообщении."""
     return "\n".join(" | ".join(row) for row in slots)
 
-def get_winning_lines(slots):
-    """
-    Возвращает список всех выигрышных линий, где три символа совпадают.
-    """
-    winning_lines = []
-    n = 3 
-
-    # --- Горизонтали, Вертикали, Диагонали ---
-    
-    # Горизонтали
-    for i in range(n):
-        if slots[i][0] == slots[i][1] == slots[i][2]:
-            winning_lines.append((slots[i][0], f"Горизонталь {i+1}", 1.0))
-
-    # Вертикали
-    for j in range(n):
-        if slots[0][j] == slots[1][j] == slots[2][j]:
-            winning_lines.append((slots[0][j], f"Вертикаль {j+1}", 1.0))
-
-    # Диагонали
-    if slots[0][0] == slots[1][1] == slots[2][2]:
-        winning_lines.append((slots[0][0], "Главная диагональ", 1.0))
-    if slots[0][2] == slots[1][1] == slots[2][0]:
-        winning_lines.append((slots[0][2], "Побочная диагональ", 1.0))
-
-    return winning_lines
-
 # ==========================================
 # 🎰 ХЕНДЛЕР: РП СЛОТЫ (3x3)
 # ==========================================
-@router.message(F.text.lower().startswith("рп слоты"))
+@router.message(TextCommand("рп слоты"))
 @router.message(Command("slot"))
-async def slot_machine(message: Message, session: AsyncSession):
+async def slot_machine(message: Message, session: AsyncSession, slot_media: MediaRegistry):
     # --- 1. Валидация ---
     args = message.text.strip().split()
     if len(args) < 2:
@@ -362,77 +317,47 @@ async def slot_machine(message: Message, session: AsyncSession):
     bet = int(bet_str)
     user_id = message.from_user.id
 
-    # --- 2. Получение юзера ---
-    user = await get_or_create_user(
-        session=session,
-        user_id=user_id,
-        username=message.from_user.username,
-        userfullname=message.from_user.full_name
-    )
-
-    # --- 3. Проверка баланса ---
-    if user.points < bet:
-        await message.reply("🚫 У вас недостаточно очков для этой ставки.", parse_mode='HTML')
-        return
-
-    # --- 4. Старт игры ---
-    if hasattr(user, 'last_slot_time'):
-        user.last_slot_time = datetime.now()
-
-    user.points -= bet 
-    await asyncio.sleep(0.01) # Микро-задержка для ощущения процесса
-
-    slots = [
-        random.choices(SLOT3X3_SYMBOLS, weights=SLOT3X3_WEIGHTS, k=3) 
-        for _ in range(3)
-    ]
-    
-    # Глобальный множитель удачи (можно вынести в конфиг, если хочешь)
-    global_multiplier = round(random.uniform(0.8, 1.2), 2)
-    
-    # Проверяем линии (предполагаем, что эта функция умеет работать с матрицей 3x3)
-    winning_lines = get_winning_lines(slots)
+    # --- 2. Старт игры ---
+    # Баланс проверяется и списывается позже, вместе с выигрышем, одним запросом
+    # Поле, глобальный множитель удачи и выигрышные линии — из движка
+    spin = slots_3x3.spin()
+    slots = spin.grid
+    global_multiplier = spin.luck
 
     total_winnings = 0
     lines_text = ""
     
-    if winning_lines:
-        for symbol, line_name, line_mult in winning_lines:
-            # Если символа нет в конфиге (баг), вернем 0
-            symbol_val = SLOT3X3_MULTIPLIERS.get(symbol, 0)
-            
-            # Считаем выигрыш
-            line_win = int(bet * symbol_val * global_multiplier)
+    for line in spin.lines:
+        symbol_val = line.symbol_multiplier
+        line_win = spin.line_payout(bet, line)
+
+        lines_text += (f"🏆 {escape_html(line.name)} ({escape_html(line.symbol)}): "
+                       f"{bet} ×{symbol_val:.1f} ×{global_multiplier} = {line_win}\n")
 
-            lines_text += (f"🏆 {escape_html(line_name)} ({escape_html(symbol)}): "
-                           f"{bet} ×{symbol_val:.1f} ×{global_multiplier} = {line_win}\n")
+        total_winnings += line_win
 
-            total_winnings += line_win
+    # --- 3. Проверка баланса + списание + выигрыш + история (один запрос, транзакция сразу закрыта) ---
+    settled = await settle_spin(
+        session, user_id, bet, total_winnings,
+        event_type="SLOT_GAME",
+        reason="Казино: Слоты 3x3"
+    )
+    if settled is None:
+        await message.reply("🚫 У вас недостаточно очков для этой ставки.", parse_mode='HTML')
+        return
 
-        user.points += total_winnings
+    if total_winnings > 0:
         result_text = (
             "🎉 <b>Выигрышные линии:</b>\n"
             f"{lines_text}\n"
             f"💵 <b>Общий выигрыш:</b> <b>{total_winnings}</b> очков!"
         )
     else:
-        user.lost_in_casino += bet
-        result_text = f"❌ Увы, вы проиграли <b>{bet}</b> очков.\n💸 Проёбано в казино: <b>{user.lost_in_casino}</b>"
+        result_text = f"❌ Увы, вы проиграли <b>{bet}</b> очков.\n💸 Проёбано в казино: <b>{settled.lost_in_casino}</b>"
 
-    # --- 6. Запись истории ---
-    history = History(
-        admin_id=user_id,
-        target_id=user.user_id,
-        event_type="SLOT_GAME",
-        points=(total_winnings if total_winnings > 0 else -bet),
-        reason="Казино: Слоты 3x3",
-        timestamp=datetime.now()
-    )
-    session.add(history)
-
-    # --- 7. Подготовка ответа (View) ---
+    # --- 4. Подготовка ответа (View) ---
     safe_field = escape_html(format_slots(slots)) # format_slots должна уметь красиво рисовать 3x3
-    safe_balance = escape_html(str(user.points))
+    safe_balance = escape_html(str(settled.points))
 
     html_output = (
         f"🎰 <b>Результат:</b>\n"
@@ -441,24 +366,8 @@ async def slot_machine(message: Message, session: AsyncSession):
         f"💰 Баланс: <b>{safe_balance}</b> очков."
     )
     
-    # --- 8. Выбор и отправка GIF ---
-    slot_gifs = []
-    chosen_gif = None
-    try:
-        if os.path.exists(SLOTS_PATH):
-            all_gifs = [f for f in os.listdir(SLOTS_PATH) if f.endswith(".gif")]
-            slot_gifs = [f for f in all_gifs if f.startswith("slot")] 
-            if slot_gifs:
-                chosen_gif = random.choice(slot_gifs)
-    except Exception as e:
-        logger.warning(f"GIF Error: {e}")
-    
-    if chosen_gif:
-        gif_path = os.path.join(SLOTS_PATH, chosen_gif)
-        animation_file = FSInputFile(gif_path)
-        await message.reply_animation(animation_file, caption=html_output, parse_mode='HTML')
-    else:
-        await message.reply(html_output, parse_mode='HTML')
+    # --- 5. Отправка со случайной GIF (по file_id из реестра) ---
+    await slot_media.reply_animation(message, html_output, parse_mode='HTML')
 
 #Проверка что бот работает - - - - - - - - - - - - -
 @router.message(Command("ping"))
@@ -483,6 +392,10 @@ async def top_ludomans(message: Message, session: AsyncSession):
         for i, user in enumerate(top_users, 1):
             username = user.username if user.username else user.userfullname
             text += f"{i}. <b>{username}</b> — <b>{user.lost_in_casino}</b> проёбанных очков\n"
+
+        rank = await get_leaderboard_rank(session, "casino", message.from_user.id)
+        if rank:
+            text += f"\n🎰 Твоё место: <b>{rank[0]}</b> из {rank[1]}"
         
         await message.reply(text, parse_mode='HTML')
         
@@ -492,7 +405,7 @@ async def top_ludomans(message: Message, session: AsyncSession):
 
 # ОСНОВНЫЕ ХЕНДЛЕРЫ - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 @router.message(F.text)
-async def randomizer1(message: Message, session: AsyncSession, user: User):  # ✅ Добавлен user
+async def randomizer1(message: Message, session: AsyncSession, user: LazyUser):  # ✅ Ленивый user — грузим только для профиля
     global rand, rand1_100
     text = message.text.strip().lower()
     rand = random.randint(1, 10)
@@ -526,7 +439,8 @@ async def randomizer1(message: Message, session: AsyncSession, user: User):  # 
     # 2. Обрабатываем кейсы, связанные с БД (требующие транзакции)
     
     if text == 'рп профиль':
-        # user уже подгружен миддлварью
+        # Это единственная ветка, которой нужен профиль — тут и идём в БД (или кэш)
+        user = await user
         if not user:
             await message.reply("⛔ Произошла ошибка при загрузке вашего профиля.")
             return
@@ -555,19 +469,25 @@ async def randomizer1(message: Message, session: AsyncSession, user: User):  # 
         )
         return
 
-    elif text == 'рп топ':
-        top_users = await get_top_users(session=session, limit=10)
+    elif text == 'рп топ' or (text.startswith('рп топ ') and text[7:].strip().isdigit()):
+        # «рп топ 3» — третья десятка
+        page = max(1, int(text[7:].strip() or 1))
+        top_users = await get_top_users(session=session, limit=10, offset=(page - 1) * 10)
         
         if not top_users:
-            await message.answer("Топ рпшеров пуст.")
+            await message.answer("Топ рпшеров пуст." if page == 1 else "Тут уже никого нет.")
             return
 
-        response_lines = ["🏆 **Топ РП игроков:**\n---"]
-        for i, u in enumerate(top_users, start=1):
+        response_lines = ["🏆 **Топ РП игроков:**" + (f" (стр. {page})" if page > 1 else "") + "\n---"]
+        for i, u in enumerate(top_users, start=(page - 1) * 10 + 1):
             display_name = u.userfullname or (u.username or f"ID {u.user_id}")
             country_name = f" ({u.country.name})" if u.country else ""
             response_lines.append(f"**{i}.** {display_name}{country_name} — **{u.points}** баллов")
 
+        rank = await get_leaderboard_rank(session, "points", message.from_user.id)
+        if rank:
+            response_lines.append(f"---\nТвоё место: **{rank[0]}** из {rank[1]}")
+
         response_text = "\n".join(response_lines)
         await message.answer(response_text, parse_mode='Markdown')
         return
@@ -619,7 +539,7 @@ async def defrpcommandsbutton(callback: CallbackQuery):
 кубик - кидает кубик
 женщина,мужчина - угар комманды
 РП профиль - ваш профиль в меном мире:
-рп топ - топ РП игроков
+рп топ [страница] - топ РП игроков и ваше место
 рп админы - список администраторов
 ''',
         parse_mode='HTML',
@@ -74,53 +74,6 @@ def country_edit_confirm():
         ]
     ])
 
-def countries_top_keyboard(countries, page: int, total_pages: int, sort_by: str = "influence"):
-    builder = InlineKeyboardBuilder()
-
-    # 1. РЯД СОРТИРОВКИ
-    sort_labels = {
-        "influence": "🔥 Топ",
-        "rating": "⭐ Рейтинг",
-        "newest": "✨ Новые"
-    }
-    sort_btns = []
-    for s_key, s_label in sort_labels.items():
-        label = f"[{s_label}]" if s_key == sort_by else s_label
-        sort_btns.append(InlineKeyboardButton(
-            text=label,
-            callback_data=f"top_page:1:{s_key}"
-        ))
-    builder.row(*sort_btns)
-
-    # 2. КНОПКИ ВСТУПЛЕНИЯ
-    join_btns = []
-    for i, country in enumerate(countries, start=1):
-        join_btns.append(InlineKeyboardButton(
-            text=str(i),
-            callback_data=f"join:{country.country_id}"
-        ))
-    builder.row(*join_btns)
-
-    # 3. НАВИГАЦИЯ
-    nav_btns = []
-    if page > 1:
-        nav_btns.append(InlineKeyboardButton(
-            text="⬅️",
-            callback_data=f"top_page:{page-1}:{sort_by}"
-        ))
-
-    nav_btns.append(InlineKeyboardButton(text=f"• {page} •", callback_data="ignore"))
-
-    if page < total_pages:
-        nav_btns.append(InlineKeyboardButton(
-            text="➡️",
-            callback_data=f"top_page:{page+1}:{sort_by}"
-        ))
-
-    builder.row(*nav_btns)
-
-    return builder.as_markup()
-
 def rating_keyboard(country_id: int):
     builder = InlineKeyboardBuilder()
     for i in range(1, 6):
@@ -129,7 +82,13 @@ def rating_keyboard(country_id: int):
     return builder.as_markup()
 
 
-def countries_top_keyboard(countries, page: int, total_pages: int, sort_by: str = "influence"):
+def countries_top_keyboard(
+    countries,
+    page: int,
+    sort_by: str = "influence",
+    prev_cursor: str | None = None,
+    next_cursor: str | None = None,
+):
     builder = InlineKeyboardBuilder()
 
     # 1. РЯД СОРТИРОВКИ
@@ -144,7 +103,7 @@ def countries_top_keyboard(countries, page: int, total_pages: int, sort_by: str
         label = f"[{s_label}]" if s_key == sort_by else s_label
         sort_btns.append(InlineKeyboardButton(
             text=label,
-            callback_data=f"top_page:1:{s_key}"
+            callback_data=f"top_page:{s_key}:1"
         ))
     builder.row(*sort_btns)
 
@@ -157,20 +116,20 @@ def countries_top_keyboard(countries, page: int, total_pages: int, sort_by: str
         ))
     builder.row(*join_btns)
 
-    # 3. НАВИГАЦИЯ
+    # 3. НАВИГАЦИЯ (курсоры соседних страниц — см. get_countries_for_list)
     nav_btns = []
-    if page > 1:
+    if prev_cursor:
         nav_btns.append(InlineKeyboardButton(
             text="⬅️",
-            callback_data=f"top_page:{page-1}:{sort_by}"
+            callback_data=f"top_page:{sort_by}:{page-1}:{prev_cursor}"
         ))
 
     nav_btns.append(InlineKeyboardButton(text=f"• {page} •", callback_data="none"))
 
-    if page < total_pages:
+    if next_cursor:
         nav_btns.append(InlineKeyboardButton(
             text="➡️",
-            callback_data=f"top_page:{page+1}:{sort_by}"
+            callback_data=f"top_page:{sort_by}:{page+1}:{next_cursor}"
         ))
 
     builder.row(*nav_btns)
@@ -178,6 +137,16 @@ def countries_top_keyboard(countries, page: int, total_pages: int, sort_by: str
     return builder.as_markup()
 
 
+def country_list_keyboard(page: int, prev_cursor: str | None, next_cursor: str | None):
+    """Листалка /countrylist (сортировка по влиянию)."""
+    builder = InlineKeyboardBuilder()
+    if prev_cursor:
+        builder.button(text="⬅️", callback_data=f"clist:{page-1}:{prev_cursor}")
+    if next_cursor:
+        builder.button(text="➡️", callback_data=f"clist:{page+1}:{next_cursor}")
+    return builder.as_markup()
+
+
 def event_admin_keyboard(event_id: int):
     """Клавиатура для администратора RP-ивента"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -0,0 +1,196 @@
+"""
+Реестр медиафайлов: GIF казино отправляются по file_id, а не загружаются
+с диска на каждый спин.
+
+- папка сканируется один раз на старте (load), у каждого файла считается
+  sha256 — ключ в таблице media_files;
+- файл загружается в Telegram один раз: при первой отправке (или заранее,
+  warm_up в служебный чат), полученный file_id сохраняется в БД и
+  переживает перезапуски;
+- изменился файл на диске (mtime/размер) — новый хэш, новая загрузка;
+- Telegram отверг file_id — он удаляется, файл загружается заново.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests.media import get_media_file_ids, save_media_file_id, forget_media_file_id
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLOTS_PATH = os.path.join(BASE_DIR, "assets", "slots")
+
+
+@dataclass
+class MediaAsset:
+    name: str
+    path: str
+    content_hash: str
+    stat_key: tuple[int, int]            # (mtime_ns, размер) — заметить, что файл поменяли
+    file_id: Optional[str] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)  # Загрузка — одна на файл
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _is_file_error(e: TelegramBadRequest) -> bool:
+    """«wrong file identifier», «FILE_REFERENCE_EXPIRED» и т.п. — а не ошибка в подписи."""
+    return "file" in str(e).lower()
+
+
+class MediaRegistry:
+    def __init__(self, directory: str, session_factory: async_sessionmaker, prefix: str = "", suffix: str = ""):
+        self.directory = directory
+        self.session_factory = session_factory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.assets: list[MediaAsset] = []
+        self.uploads = 0
+
+    # ==========================================
+    # ЗАГРУЗКА РЕЕСТРА (dp.startup)
+    # ==========================================
+    def _scan(self) -> list[MediaAsset]:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            logger.warning(f"⚠️ Папка {self.directory} не найдена — GIF отправляться не будут.")
+            return []
+
+        assets = []
+        for name in names:
+            if not (name.startswith(self.prefix) and name.endswith(self.suffix)):
+                continue
+            path = os.path.join(self.directory, name)
+            assets.append(MediaAsset(name, path, _file_hash(path), _stat_key(path)))
+        return assets
+
+    async def load(self) -> None:
+        """Сканирует папку (в потоке — хэши читают файлы целиком) и подтягивает file_id из БД."""
+        assets = await asyncio.to_thread(self._scan)
+        async with self.session_factory() as session:
+            file_ids = await get_media_file_ids(session, [a.content_hash for a in assets])
+        for asset in assets:
+            asset.file_id = file_ids.get(asset.content_hash)
+        self.assets = assets
+        logger.info(
+            f"🎞 Медиа {os.path.basename(self.directory)}: {len(assets)} файлов, "
+            f"уже загружены в Telegram: {sum(1 for a in assets if a.file_id)}"
+        )
+
+    async def warm_up(self, bot: Bot, chat_id: int) -> None:
+        """Заранее загружает файлы без file_id в служебный чат (сообщения сразу удаляются)."""
+        for asset in self.assets:
+            if asset.file_id:
+                continue
+            async with asset.lock:
+                try:
+                    sent = await bot.send_animation(chat_id, FSInputFile(asset.path), disable_notification=True)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось заранее загрузить {asset.name}: {e}")
+                    continue
+                await self._remember(asset, sent)
+                try:
+                    await bot.delete_message(chat_id, sent.message_id)
+                except Exception:
+                    pass
+
+    # ==========================================
+    # ОТПРАВКА
+    # ==========================================
+    async def _pick(self) -> Optional[MediaAsset]:
+        while self.assets:
+            asset = random.choice(self.assets)
+            try:
+                stat_key = _stat_key(asset.path)
+            except FileNotFoundError:
+                logger.warning(f"⚠️ Файл {asset.name} пропал с диска — убираем из реестра.")
+                self.assets = [a for a in self.assets if a is not asset]
+                continue
+            if stat_key != asset.stat_key:
+                await self._rehash(asset, stat_key)
+            return asset
+        return None
+
+    async def _rehash(self, asset: MediaAsset, stat_key: tuple[int, int]) -> None:
+        """Файл на диске поменяли: новый хэш, file_id — из БД (если такое содержимое уже было) или никакого."""
+        asset.stat_key = stat_key
+        content_hash = await asyncio.to_thread(_file_hash, asset.path)
+        if content_hash == asset.content_hash:
+            return
+        asset.content_hash = content_hash
+        async with self.session_factory() as session:
+            asset.file_id = (await get_media_file_ids(session, [content_hash])).get(content_hash)
+        logger.info(f"🎞 Файл {asset.name} изменился — {'нашёлся в БД' if asset.file_id else 'будет загружен заново'}.")
+
+    async def reply_animation(self, message: Message, caption: str, **kwargs) -> Message:
+        """Ответ со случайной GIF из реестра (без GIF — просто текстом)."""
+        asset = await self._pick()
+        if asset is None:
+            return await message.reply(caption, **kwargs)
+
+        file_id = asset.file_id
+        if file_id:
+            try:
+                return await message.reply_animation(file_id, caption=caption, **kwargs)
+            except TelegramBadRequest as e:
+                if not _is_file_error(e):
+                    raise
+                logger.warning(f"⚠️ Telegram отверг file_id для {asset.name} ({e}) — загружаем заново.")
+                await self._forget(asset, file_id)
+
+        async with asset.lock:
+            # Пока ждали блокировку, файл мог загрузить параллельный хендлер
+            if asset.file_id and asset.file_id != file_id:
+                return await message.reply_animation(asset.file_id, caption=caption, **kwargs)
+            sent = await message.reply_animation(FSInputFile(asset.path), caption=caption, **kwargs)
+            await self._remember(asset, sent)
+            return sent
+
+    # ==========================================
+    # ХРАНЕНИЕ file_id
+    # ==========================================
+    async def _remember(self, asset: MediaAsset, sent: Message) -> None:
+        media = sent.animation or sent.document
+        if media is None:
+            return
+        self.uploads += 1
+        asset.file_id = media.file_id
+        try:
+            async with self.session_factory() as session:
+                await save_media_file_id(session, asset.content_hash, media.file_id, asset.name)
+                await session.commit()
+        except Exception as e:
+            # Не страшно: в этом процессе file_id уже есть, после перезапуска загрузим ещё раз
+            logger.error(f"Не удалось сохранить file_id для {asset.name}: {e}")
+
+    async def _forget(self, asset: MediaAsset, file_id: str) -> None:
+        if asset.file_id == file_id:
+            asset.file_id = None
+        try:
+            async with self.session_factory() as session:
+                await forget_media_file_id(session, asset.content_hash, file_id)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Не удалось удалить file_id для {asset.name}: {e}")
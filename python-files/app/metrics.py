@@ -0,0 +1,55 @@
+"""
+Локальный эндпоинт метрик в формате Prometheus (METRICS_LISTEN_PORT).
+
+Отдаёт гистограммы профайлера хендлеров, загрузку пула соединений,
+состояние планировщика апдейтов и очереди рассылок. Слушает по умолчанию
+только 127.0.0.1 — наружу не светим.
+"""
+import logging
+from typing import Optional
+
+from aiohttp import web
+from aiogram import Dispatcher
+
+from app.database.profiler import profiler
+from app.database.session import pool_status
+
+logger = logging.getLogger(__name__)
+
+
+def render_metrics(dp: Dispatcher) -> str:
+    lines = [profiler.render_prometheus()]
+    for name, value in pool_status().items():
+        lines.append(f"# TYPE rpbot_db_pool_{name} gauge")
+        lines.append(f"rpbot_db_pool_{name} {value}")
+    scheduler = dp.get("update_scheduler")
+    if scheduler is not None:
+        for name, value in scheduler.snapshot().items():
+            lines.append(f"# TYPE rpbot_scheduler_{name} gauge")
+            lines.append(f"rpbot_scheduler_{name} {value}")
+    broadcaster = dp.get("broadcaster")
+    if broadcaster is not None:
+        for name, value in broadcaster.snapshot().items():
+            lines.append(f"# TYPE rpbot_broadcast_{name} gauge")
+            lines.append(f"rpbot_broadcast_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def create_metrics_app(dp: Dispatcher) -> web.Application:
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_metrics(dp), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+async def start_metrics_server(dp: Dispatcher, host: str, port: int) -> Optional[web.AppRunner]:
+    """Поднимает /metrics на host:port. port=0 — выключено, возвращает None."""
+    if port <= 0:
+        return None
+    runner = web.AppRunner(create_metrics_app(dp), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -17,6 +17,7 @@ from app.database.models import RPEvent, User
 from app.keyboard import event_admin_keyboard, event_join_keyboard, event_participant_keyboard
 from app.database.middleware import SessionMiddleware
 from app.utils.html_helpers import hcode
+from app.broadcast import Broadcaster
 
 router = Router()
 router.message.middleware(SessionMiddleware())
@@ -112,7 +113,7 @@ async def cmd_create_rp_event(message: Message, session: AsyncSession):
         await message.answer(text)
 
 @router.callback_query(F.data.startswith("join_rp_"))
-async def cb_join_rp_event(query: CallbackQuery, session: AsyncSession):
+async def cb_join_rp_event(query: CallbackQuery, session: AsyncSession, broadcaster: Broadcaster):
     """Хендлер для присоединения к РП-ивенту"""
     event_id = int(query.data.split("_")[-1])
 
@@ -124,7 +125,9 @@ async def cb_join_rp_event(query: CallbackQuery, session: AsyncSession):
 
     await query.answer(text, show_alert=True)
     if success:
-        await query.message.answer(
+        # Объявления в чат — через очередь рассылок: при наплыве участников не словим flood control
+        broadcaster.send(
+            query.message.chat.id,
             f"👥 {query.from_user.full_name} присоединился к ивенту!",
             reply_markup=event_participant_keyboard(event_id)
         )
@@ -151,7 +154,7 @@ async def cb_list_participants(query: CallbackQuery, session: AsyncSession):
 
 
 @router.callback_query(F.data.startswith("leave_rp_"))
-async def cb_leave_rp_event(query: CallbackQuery, session: AsyncSession):
+async def cb_leave_rp_event(query: CallbackQuery, session: AsyncSession, broadcaster: Broadcaster):
     """Хендлер для выхода из РП-ивента"""
     event_id = int(query.data.split("_")[-1])
 
@@ -163,7 +166,7 @@ async def cb_leave_rp_event(query: CallbackQuery, session: AsyncSession):
 
     await query.answer(text, show_alert=True)
     if success:
-        await query.message.answer(f"🚪 {query.from_user.full_name} покинул ивент!")
+        broadcaster.send(query.message.chat.id, f"🚪 {query.from_user.full_name} покинул ивент!")
 
 
 @router.message(Command("kick_rp"))
@@ -218,7 +221,7 @@ async def cmd_kick_rp_participants(message: Message, session: AsyncSession):
     await message.answer(f"🦵 Кикнуто {kicked_count} участников из ивента!")
 
 @router.callback_query(F.data.startswith("end_rp_"))
-async def cb_end_rp_event(query: CallbackQuery, session: AsyncSession):
+async def cb_end_rp_event(query: CallbackQuery, session: AsyncSession, broadcaster: Broadcaster):
     """Хендлер для завершения РП-ивента"""
     event_id = int(query.data.split("_")[-1])
 
@@ -231,7 +234,7 @@ async def cb_end_rp_event(query: CallbackQuery, session: AsyncSession):
     await query.answer(text, show_alert=True)
     if success:
         await query.message.edit_reply_markup(reply_markup=None)
-        await query.message.answer("🎉 Ивент завершен! Очки начислены всем участникам!")
+        broadcaster.send(query.message.chat.id, "🎉 Ивент завершен! Очки начислены всем участникам!")
 
 
 @router.message(Command("rp_history"))
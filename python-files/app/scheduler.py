@@ -0,0 +1,423 @@
+"""
+Планировщик фоновых задач, переживающий перезапуски.
+
+Когда какую задачу запускать, хранится в Postgres (scheduled_jobs), а не
+в памяти процесса:
+- бот лежал в момент запуска — на старте задача выполнится сразу. Задача
+  с catch_up=True (ежедневные начисления) догоняет каждый пропущенный
+  запуск по очереди, с его плановым временем; остальные схлопывают
+  пропуски в один запуск и пишут в лог, сколько пропущено;
+- задачу забирают в работу условным UPDATE с арендой (locked_until), так что
+  при нескольких процессах её выполнит ровно один; упал посреди работы —
+  аренда истечёт и задачу перезапустят;
+- к следующему запуску добавляется случайный jitter, чтобы тяжёлые задачи
+  не стартовали все в 00:00:00;
+- время берётся из Clock, состояние — из JobStore: проверка
+  (python -m benchmarks.scheduler) гоняет планировщик на FakeClock
+  и MemoryJobStore без БД.
+
+Сами задачи должны быть идемпотентными (см. task_runs): при падении
+на середине задача будет выполнена повторно.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests.task_runs import (
+    ensure_scheduled_job,
+    get_scheduled_jobs,
+    claim_scheduled_job,
+    complete_scheduled_job,
+)
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[datetime], Awaitable[None]]
+
+
+# ==========================================
+# ЧАСЫ
+# ==========================================
+class Clock:
+    """Настоящее время (UTC) и настоящий sleep."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+class FakeClock(Clock):
+    """Часы для тестов: время стоит, пока его не подвинут advance()."""
+
+    def __init__(self, start: datetime):
+        self._now = start
+        self._sleepers: list[tuple[datetime, int, asyncio.Future]] = []
+        self._ids = itertools.count()
+
+    def now(self) -> datetime:
+        return self._now
+
+    async def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._now + timedelta(seconds=seconds), next(self._ids), future))
+        await future
+
+    async def advance(self, seconds: float) -> None:
+        """Двигает время и будит всех, чей sleep истёк; даёт им отработать."""
+        self._now += timedelta(seconds=seconds)
+        while self._sleepers and self._sleepers[0][0] <= self._now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+
+# ==========================================
+# РАСПИСАНИЯ
+# ==========================================
+class Daily:
+    """Каждый день в hour:minute по местному времени сервера (или tz)."""
+
+    def __init__(self, hour: int, minute: int = 0, tz: Optional[tzinfo] = None):
+        self.hour = hour
+        self.minute = minute
+        self.tz = tz or datetime.now().astimezone().tzinfo
+
+    @classmethod
+    def parse(cls, value: str, tz: Optional[tzinfo] = None) -> "Daily":
+        hour, minute = value.strip().split(":")
+        return cls(int(hour), int(minute), tz)
+
+    def next_after(self, moment: datetime) -> datetime:
+        local = moment.astimezone(self.tz)
+        target = local.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if target <= local:
+            target += timedelta(days=1)
+        return target.astimezone(timezone.utc)
+
+    def __repr__(self) -> str:
+        return f"daily {self.hour:02d}:{self.minute:02d}"
+
+
+class Every:
+    """Каждые seconds секунд."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+@dataclass
+class Job:
+    name: str
+    func: JobFunc           # Получает плановое время запуска (UTC)
+    schedule: Daily | Every
+    jitter: float = 0.0     # Секунд случайного сдвига вперёд
+    catch_up: bool = False  # Выполнить каждый пропущенный запуск, а не один за все
+
+
+# ==========================================
+# СОСТОЯНИЕ ЗАДАЧ
+# ==========================================
+def _to_db(moment: datetime) -> datetime:
+    """В БД время хранится naive UTC, как и везде в моделях."""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _from_db(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc)
+
+
+class JobStore:
+    """Где планировщик хранит next_run_at и аренду задач. Время — aware UTC."""
+
+    async def register(self, name: str, next_run_at: datetime) -> datetime:
+        """Регистрирует задачу, если её ещё нет. Возвращает сохранённый next_run_at."""
+        raise NotImplementedError
+
+    async def due_times(self) -> Dict[str, datetime]:
+        raise NotImplementedError
+
+    async def claim(self, name: str, now: datetime, locked_until: datetime) -> Optional[datetime]:
+        """Забирает подошедшую задачу в работу. Возвращает её плановое время или None."""
+        raise NotImplementedError
+
+    async def complete(
+        self,
+        name: str,
+        next_run_at: datetime,
+        started_at: datetime,
+        duration: float,
+        error: Optional[str],
+        locked_until: Optional[datetime] = None,
+    ) -> None:
+        """Итог запуска. locked_until — не забирать задачу раньше этого времени (повтор после ошибки)."""
+        raise NotImplementedError
+
+
+class DatabaseJobStore(JobStore):
+    """scheduled_jobs в Postgres: общее состояние для всех процессов бота."""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def register(self, name: str, next_run_at: datetime) -> datetime:
+        async with self.session_factory() as session:
+            stored = await ensure_scheduled_job(session, name, _to_db(next_run_at))
+            await session.commit()
+        return _from_db(stored)
+
+    async def due_times(self) -> Dict[str, datetime]:
+        async with self.session_factory() as session:
+            return {s.name: _from_db(s.next_run_at) for s in await get_scheduled_jobs(session)}
+
+    async def claim(self, name: str, now: datetime, locked_until: datetime) -> Optional[datetime]:
+        async with self.session_factory() as session:
+            scheduled_for = await claim_scheduled_job(session, name, _to_db(now), _to_db(locked_until))
+            # Коммитим сразу: аренда должна быть видна другим процессам до начала работы
+            await session.commit()
+        return None if scheduled_for is None else _from_db(scheduled_for)
+
+    async def complete(
+        self,
+        name: str,
+        next_run_at: datetime,
+        started_at: datetime,
+        duration: float,
+        error: Optional[str],
+        locked_until: Optional[datetime] = None,
+    ) -> None:
+        async with self.session_factory() as session:
+            await complete_scheduled_job(
+                session, name, _to_db(next_run_at), _to_db(started_at), duration, error,
+                locked_until=_to_db(locked_until) if locked_until else None,
+            )
+            await session.commit()
+
+
+class MemoryJobStore(JobStore):
+    """Состояние в памяти процесса — для проверок на FakeClock."""
+
+    def __init__(self):
+        self.next_run: Dict[str, datetime] = {}
+        self.locked_until: Dict[str, datetime] = {}
+        self.errors: Dict[str, Optional[str]] = {}
+
+    async def register(self, name: str, next_run_at: datetime) -> datetime:
+        return self.next_run.setdefault(name, next_run_at)
+
+    async def due_times(self) -> Dict[str, datetime]:
+        return dict(self.next_run)
+
+    async def claim(self, name: str, now: datetime, locked_until: datetime) -> Optional[datetime]:
+        due_at = self.next_run.get(name)
+        lock = self.locked_until.get(name)
+        if due_at is None or due_at > now or (lock is not None and lock >= now):
+            return None
+        self.locked_until[name] = locked_until
+        return due_at
+
+    async def complete(
+        self,
+        name: str,
+        next_run_at: datetime,
+        started_at: datetime,
+        duration: float,
+        error: Optional[str],
+        locked_until: Optional[datetime] = None,
+    ) -> None:
+        self.next_run[name] = next_run_at
+        if locked_until is None:
+            self.locked_until.pop(name, None)
+        else:
+            self.locked_until[name] = locked_until
+        self.errors[name] = error
+
+
+# ==========================================
+# ПЛАНИРОВЩИК
+# ==========================================
+class Scheduler:
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker],
+        clock: Optional[Clock] = None,
+        poll_interval: float = 60,
+        lease: float = 1800,
+        retry_delay: float = 300,
+        rng: Optional[random.Random] = None,
+        store: Optional[JobStore] = None,
+    ):
+        self.store = store or DatabaseJobStore(session_factory)
+        self.clock = clock or Clock()
+        self.poll_interval = poll_interval  # Как часто перечитывать БД (задачи могли сдвинуть другие процессы)
+        self.lease = lease                  # Сколько секунд задача считается выполняющейся
+        self.retry_delay = retry_delay      # Через сколько повторить упавшую задачу
+        self.rng = rng or random.Random()
+        self.jobs: Dict[str, Job] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()        # Задача завершилась — пересчитать расписание, не дожидаясь poll_interval
+
+    def add_job(
+        self, name: str, func: JobFunc, schedule: Daily | Every, jitter: float = 0.0, catch_up: bool = False
+    ) -> None:
+        self.jobs[name] = Job(name, func, schedule, jitter, catch_up)
+
+    def _next_run(self, job: Job, after: datetime) -> datetime:
+        moment = job.schedule.next_after(after)
+        if job.jitter > 0:
+            moment += timedelta(seconds=self.rng.uniform(0, job.jitter))
+        return moment
+
+    @staticmethod
+    def _missed(job: Job, scheduled_for: datetime, until: datetime, limit: int = 10000) -> int:
+        """Сколько плановых запусков после scheduled_for пришлось на время до until."""
+        missed, moment = 0, job.schedule.next_after(scheduled_for)
+        while moment <= until and missed < limit:
+            missed += 1
+            moment = job.schedule.next_after(moment)
+        return missed
+
+    # ==========================================
+    # ЖИЗНЕННЫЙ ЦИКЛ (dp.startup / dp.shutdown)
+    # ==========================================
+    async def start(self) -> None:
+        now = self.clock.now()
+        for job in self.jobs.values():
+            stored = await self.store.register(job.name, self._next_run(job, now))
+            if stored > now:
+                state = f"в {stored:%d.%m %H:%M} UTC"
+            elif job.catch_up:
+                state = f"пропущено запусков: {1 + self._missed(job, stored, now)}, догоняем по очереди"
+            else:
+                state = "пропущен, выполним сейчас"
+            logger.info(f"🗓 Задача {job.name} ({job.schedule}): {state}")
+        self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Останавливает цикл и ждёт выполняющиеся задачи до timeout секунд."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        running = list(self._running.values())
+        if running:
+            done, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                next_due = await self.run_pending()
+            except Exception as e:
+                logger.error(f"Ошибка планировщика: {e}", exc_info=True)
+                next_due = None
+
+            delay = self.poll_interval
+            if next_due is not None:
+                delay = min(delay, max(0.0, (next_due - self.clock.now()).total_seconds()))
+            sleeper = asyncio.ensure_future(self.clock.sleep(delay))
+            waker = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait({sleeper, waker}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                sleeper.cancel()
+                waker.cancel()
+
+    # ==========================================
+    # ЗАПУСК
+    # ==========================================
+    async def run_pending(self) -> Optional[datetime]:
+        """
+        Запускает все подошедшие задачи (каждую — отдельной asyncio-задачей).
+        Возвращает ближайшее время следующего запуска среди остальных.
+        """
+        now = self.clock.now()
+        next_due: Optional[datetime] = None
+
+        due_times = await self.store.due_times()
+        for job in self.jobs.values():
+            due_at = due_times.get(job.name)
+            if due_at is None or job.name in self._running:
+                continue
+            if due_at > now:
+                next_due = due_at if next_due is None else min(next_due, due_at)
+                continue
+
+            scheduled_for = await self.store.claim(job.name, now, now + timedelta(seconds=self.lease))
+            if scheduled_for is None:
+                continue
+
+            task = asyncio.create_task(self._execute(job, scheduled_for))
+            self._running[job.name] = task
+            task.add_done_callback(lambda _, name=job.name: self._running.pop(name, None))
+
+        return next_due
+
+    async def _execute(self, job: Job, scheduled_for: datetime) -> None:
+        started_at = self.clock.now()
+        started = time.perf_counter()
+        error = None
+        try:
+            await job.func(scheduled_for)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ Задача {job.name} упала: {error}", exc_info=True)
+        duration = time.perf_counter() - started
+
+        finished = self.clock.now()
+        retry_at = None
+        if error is not None:
+            retry_at = finished + timedelta(seconds=self.retry_delay)
+            if job.catch_up:
+                # Повторяем тот же плановый запуск (задача считает по нему дату), но не раньше retry_at
+                next_run = scheduled_for
+            else:
+                next_run = min(self._next_run(job, finished), retry_at)
+        elif job.catch_up:
+            # Следующий слот после выполненного: если он уже прошёл — выполним его сразу же
+            next_run = self._next_run(job, scheduled_for)
+            logger.info(
+                f"✅ Задача {job.name} за {scheduled_for:%d.%m %H:%M} UTC выполнена за {duration:.1f} с, "
+                + ("догоняем следующий пропущенный запуск" if next_run <= finished
+                   else f"следующий запуск {next_run:%d.%m %H:%M} UTC")
+            )
+        else:
+            next_run = self._next_run(job, finished)
+            skipped = self._missed(job, scheduled_for, finished)
+            if skipped:
+                logger.warning(f"⚠️ Задача {job.name}: пропущенные запуски ({skipped}) схлопнуты в один")
+            logger.info(f"✅ Задача {job.name} выполнена за {duration:.1f} с, следующий запуск {next_run:%d.%m %H:%M} UTC")
+
+        await self.store.complete(
+            job.name, next_run, started_at, duration, error,
+            locked_until=retry_at if job.catch_up else None,
+        )
+        self._running.pop(job.name, None)
+        self._wake.set()
+
+    def snapshot(self) -> dict:
+        return {"jobs": len(self.jobs), "running": sorted(self._running)}
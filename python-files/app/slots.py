@@ -0,0 +1,210 @@
+"""
+Движок слотов для «рп казино» (1x3) и «рп слоты» (3x3).
+
+Всё, что не зависит от конкретного спина, считается один раз при импорте:
+- накопленные веса барабана — символ выбирается bisect'ом по одному
+  random() (то же распределение, что random.choices(weights=...), но без
+  пересчёта весов на каждый вызов);
+- таблица выплат 1x3 — исход для каждой из n³ комбинаций;
+- таблица линии 3x3 — «какой символ собрала линия» для каждой тройки.
+
+spin() — один спин для хендлера, spin_many() — пачка спинов,
+payouts() — только выплаты пачки (симулятор RTP, benchmarks/rtp.py).
+Случайность берётся из rng движка: с seed результаты воспроизводимы.
+"""
+import random
+from bisect import bisect
+from itertools import accumulate, product
+from typing import NamedTuple, Optional, Sequence
+
+from config import (
+    SLOT_SYMBOLS,
+    SYMBOL_WEIGHTS,
+    SYMBOL_MULTIPLIERS,
+    SLOT3X3_SYMBOLS,
+    SLOT3X3_WEIGHTS,
+    SLOT3X3_MULTIPLIERS,
+)
+
+
+class Reel:
+    """Барабан: символы + накопленные веса."""
+
+    def __init__(self, symbols: Sequence[str], weights: Sequence[float]):
+        if len(symbols) != len(weights) or not symbols:
+            raise ValueError("У каждого символа должен быть вес")
+        self.symbols = list(symbols)
+        # Одинаковые символы в конфиге — один и тот же символ: сравниваем по первому вхождению
+        self.codes = [self.symbols.index(sym) for sym in self.symbols]
+        self.cum_weights = list(accumulate(weights))
+        self.total = self.cum_weights[-1]
+
+    def draw(self, rng: random.Random, k: int) -> list[int]:
+        """k кодов символов."""
+        cum, total, hi, codes, rand = self.cum_weights, self.total, len(self.cum_weights) - 1, self.codes, rng.random
+        return [codes[bisect(cum, rand() * total, 0, hi)] for _ in range(k)]
+
+    def probabilities(self) -> list[float]:
+        """Вероятность каждого кода символа (у повторов — 0, их вес у первого вхождения)."""
+        probs = [0.0] * len(self.symbols)
+        previous = 0.0
+        for code, cum in zip(self.codes, self.cum_weights):
+            probs[code] += (cum - previous) / self.total
+            previous = cum
+        return probs
+
+
+# ==========================================
+# КАЗИНО 1x3
+# ==========================================
+class Spin1x3(NamedTuple):
+    symbols: tuple[str, str, str]
+    winning_symbol: Optional[str]
+    multiplier: float        # 0 — проигрыш
+    jackpot: bool            # Три одинаковых
+
+    def payout(self, bet: int) -> int:
+        return int(bet * self.multiplier) if self.multiplier > 0 else 0
+
+
+class Slot1x3:
+    def __init__(self, symbols: Sequence[str], weights: Sequence[float], multipliers: dict[str, float]):
+        self.reel = Reel(symbols, weights)
+        self.rng = random.Random()
+        n = len(symbols)
+        self._n = n
+        # Исход для каждой комбинации (код1, код2, код3) — индекс code1*n² + code2*n + code3
+        self._table: list[Optional[tuple[int, float, bool]]] = []
+        for a, b, c in product(range(n), repeat=3):
+            if a == b == c:
+                self._table.append((a, multipliers[symbols[a]] * 3.0, True))
+            elif a == b or a == c:
+                self._table.append((a, multipliers[symbols[a]], False))
+            elif b == c:
+                self._table.append((b, multipliers[symbols[b]], False))
+            else:
+                self._table.append(None)
+
+    def _outcome(self, a: int, b: int, c: int) -> Spin1x3:
+        symbols = self.reel.symbols
+        hit = self._table[(a * self._n + b) * self._n + c]
+        shown = (symbols[a], symbols[b], symbols[c])
+        if hit is None:
+            return Spin1x3(shown, None, 0.0, False)
+        code, multiplier, jackpot = hit
+        return Spin1x3(shown, symbols[code], multiplier, jackpot)
+
+    def spin(self) -> Spin1x3:
+        return self._outcome(*self.reel.draw(self.rng, 3))
+
+    def spin_many(self, count: int) -> list[Spin1x3]:
+        codes = self.reel.draw(self.rng, count * 3)
+        return [self._outcome(*codes[i:i + 3]) for i in range(0, len(codes), 3)]
+
+    def expected_return(self) -> float:
+        """Точный RTP (доля ставки, которая возвращается), без округления выигрыша до целых."""
+        p = self.reel.probabilities()
+        return sum(
+            p[a] * p[b] * p[c] * hit[1]
+            for (a, b, c), hit in zip(product(range(self._n), repeat=3), self._table) if hit
+        )
+
+    def payouts(self, count: int, bet: int) -> list[int]:
+        """Только выплаты count спинов — для симулятора, без сборки Spin1x3."""
+        n = self._n
+        multipliers = [hit[1] if hit else 0.0 for hit in self._table]
+        codes = self.reel.draw(self.rng, count * 3)
+        return [
+            int(bet * m) if (m := multipliers[(codes[i] * n + codes[i + 1]) * n + codes[i + 2]]) > 0 else 0
+            for i in range(0, len(codes), 3)
+        ]
+
+
+# ==========================================
+# СЛОТЫ 3x3
+# ==========================================
+# Клетки поля по строкам: 0 1 2 / 3 4 5 / 6 7 8
+PAYLINES: list[tuple[str, tuple[int, int, int]]] = [
+    ("Горизонталь 1", (0, 1, 2)),
+    ("Горизонталь 2", (3, 4, 5)),
+    ("Горизонталь 3", (6, 7, 8)),
+    ("Вертикаль 1", (0, 3, 6)),
+    ("Вертикаль 2", (1, 4, 7)),
+    ("Вертикаль 3", (2, 5, 8)),
+    ("Главная диагональ", (0, 4, 8)),
+    ("Побочная диагональ", (2, 4, 6)),
+]
+
+
+class WinningLine(NamedTuple):
+    symbol: str
+    name: str
+    symbol_multiplier: float
+
+
+class Spin3x3(NamedTuple):
+    grid: list[list[str]]            # 3 ряда по 3 символа
+    lines: list[WinningLine]
+    luck: float                      # Глобальный множитель удачи 0.8–1.2
+
+    def line_payout(self, bet: int, line: WinningLine) -> int:
+        return int(bet * line.symbol_multiplier * self.luck)
+
+    def payout(self, bet: int) -> int:
+        return sum(self.line_payout(bet, line) for line in self.lines)
+
+
+class Slot3x3:
+    def __init__(self, symbols: Sequence[str], weights: Sequence[float], multipliers: dict[str, float]):
+        self.reel = Reel(symbols, weights)
+        self.rng = random.Random()
+        n = len(symbols)
+        self._n = n
+        self._multipliers = [multipliers.get(sym, 0) for sym in symbols]
+        # Какой символ собрала линия: код или -1, по индексу code1*n² + code2*n + code3
+        self._line_table = [a if a == b == c else -1 for a, b, c in product(range(n), repeat=3)]
+
+    def _outcome(self, cells: Sequence[int], luck: float) -> Spin3x3:
+        n, table, symbols = self._n, self._line_table, self.reel.symbols
+        lines = []
+        for name, (a, b, c) in PAYLINES:
+            code = table[(cells[a] * n + cells[b]) * n + cells[c]]
+            if code >= 0:
+                lines.append(WinningLine(symbols[code], name, self._multipliers[code]))
+        grid = [[symbols[code] for code in cells[row:row + 3]] for row in (0, 3, 6)]
+        return Spin3x3(grid, lines, luck)
+
+    def _luck(self) -> float:
+        return round(self.rng.uniform(0.8, 1.2), 2)
+
+    def spin(self) -> Spin3x3:
+        return self._outcome(self.reel.draw(self.rng, 9), self._luck())
+
+    def spin_many(self, count: int) -> list[Spin3x3]:
+        codes = self.reel.draw(self.rng, count * 9)
+        return [self._outcome(codes[i:i + 9], self._luck()) for i in range(0, len(codes), 9)]
+
+    def expected_return(self) -> float:
+        """Точный RTP без округления выигрыша: линии независимы по матожиданию, средняя удача — 1.0."""
+        p = self.reel.probabilities()
+        return len(PAYLINES) * sum(p[code] ** 3 * m for code, m in enumerate(self._multipliers))
+
+    def payouts(self, count: int, bet: int) -> list[int]:
+        """Только выплаты count спинов — для симулятора, без сборки Spin3x3."""
+        n, table, multipliers = self._n, self._line_table, self._multipliers
+        lines = [cells for _, cells in PAYLINES]
+        codes = self.reel.draw(self.rng, count * 9)
+        result = []
+        for i in range(0, len(codes), 9):
+            luck = self._luck()
+            total = 0
+            for a, b, c in lines:
+                code = table[(codes[i + a] * n + codes[i + b]) * n + codes[i + c]]
+                if code >= 0:
+                    total += int(bet * multipliers[code] * luck)
+            result.append(total)
+        return result
+
+
+casino_1x3 = Slot1x3(SLOT_SYMBOLS, SYMBOL_WEIGHTS, SYMBOL_MULTIPLIERS)
+slots_3x3 = Slot3x3(SLOT3X3_SYMBOLS, SLOT3X3_WEIGHTS, SLOT3X3_MULTIPLIERS)
@@ -1,87 +1,289 @@
 import logging
 import asyncio
-from datetime import datetime, time, timedelta, timezone
-from aiogram import Bot
+from datetime import date, datetime, timedelta
+from typing import Optional
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from app.database.models import User, MemeCountry, History 
-from config import DAILY_BONUS_RATIO
+from app.broadcast import Broadcaster
+from app.scheduler import Scheduler, Clock, Daily, Every
+from app.database.models import MemeCountry
+from app.database.country_index import country_index
+from app.database.leaderboard import leaderboards
+from app.database.admin_levels import admin_levels
+from app.database.requests.ledger import CountryBonus, credit_country_bonus
+from app.database.requests.task_runs import lock_task_run, advance_task_run, finish_task_run
+from app.database.requests.countries import collect_taxes
+from app.database.requests.admins import expire_punishments
+from app.database.requests.rp_events import close_stale_rp_events
+from app.database.requests.fsm import delete_expired_fsm_records
+from config import (
+    DAILY_BONUS_RATIO,
+    DAILY_BONUS_CHUNK,
+    SCHEDULER_DAILY_BONUS_TIME,
+    SCHEDULER_TAXES_TIME,
+    SCHEDULER_PUNISHMENT_CHECK_SECONDS,
+    SCHEDULER_JITTER_SECONDS,
+    RP_EVENT_AUTO_CLOSE_HOURS,
+    FSM_STORAGE,
+    FSM_TTL_HOURS,
+)
 from app.utils.html_helpers import escape_html 
 
 logger = logging.getLogger(__name__)
 
-async def distribute_daily_influence_bonus(bot: Bot, session_factory: async_sessionmaker):
-    # Используем одну сессию на весь процесс
+DAILY_BONUS_TASK = "daily_bonus"
+TAXES_TASK = "taxes"
+
+async def distribute_daily_influence_bonus(
+    broadcaster: Broadcaster,
+    session_factory: async_sessionmaker,
+    run_date: Optional[date] = None,
+) -> list[CountryBonus]:
+    """
+    Ежедневный бонус гражданам по влиянию страны.
+
+    Страны идут кусками по DAILY_BONUS_CHUNK (по возрастанию country_id),
+    каждый кусок — одна транзакция: set-based начисление + сдвиг курсора
+    в task_runs. Повторный запуск за тот же день ничего не начислит,
+    а прерванный — доделает оставшиеся страны.
+    """
+    run_key = (run_date or date.today()).isoformat()
+    results: list[CountryBonus] = []
+
+    try:
+        while True:
+            async with session_factory() as session:
+                cursor = await lock_task_run(session, DAILY_BONUS_TASK, run_key)
+                if cursor is None:
+                    logger.info(f"Бонусы за {run_key} уже начислены.")
+                    return results
+
+                # Следующий кусок стран, которым вообще что-то положено
+                chunk = (await session.scalars(
+                    select(MemeCountry.country_id)
+                    .where(
+                        MemeCountry.country_id > cursor,
+                        MemeCountry.influence_points >= DAILY_BONUS_RATIO,
+                    )
+                    .order_by(MemeCountry.country_id)
+                    .limit(DAILY_BONUS_CHUNK)
+                )).all()
+
+                if not chunk:
+                    await finish_task_run(session, DAILY_BONUS_TASK, run_key)
+                    await session.commit()
+                    break
+
+                credited = await credit_country_bonus(session, chunk[0], chunk[-1], DAILY_BONUS_RATIO)
+                await advance_task_run(session, DAILY_BONUS_TASK, run_key, chunk[-1])
+                await session.commit()
+
+            results.extend(credited)
+            _notify_country_bonus(broadcaster, credited)
+
+        if results:
+            logger.info(
+                f"Успешно начислено бонусов {sum(r.citizens for r in results)} пользователям "
+                f"в {len(results)} странах ({sum(r.total for r in results)} RP)."
+            )
+        else:
+            logger.info("Стран для начисления бонусов не найдено.")
+
+    except Exception as e:
+        logger.error(f"Критическая ошибка начисления бонусов: {e}", exc_info=True)
+        raise  # Планировщик повторит запуск; сделанные куски не повторятся
+
+    return results
+
+
+def _notify_country_bonus(broadcaster: Broadcaster, credited: list[CountryBonus]) -> None:
+    # Оповещения — через очередь рассылок (уже после коммита: начисление важнее сообщения)
+    for country in credited:
+        if not country.chat_id:
+            continue
+        msg = (f"🎉 <b>Ежедневное начисление!</b>\n"
+               f"Страна <b>{escape_html(country.name)}</b> принесла гражданам по <b>{country.bonus}</b> RP.")
+        broadcaster.send(country.chat_id, msg, parse_mode='HTML')
+
+# ==========================================
+# НАЛОГИ, НАКАЗАНИЯ, ИВЕНТЫ
+# ==========================================
+async def collect_all_taxes(
+    broadcaster: Broadcaster,
+    session_factory: async_sessionmaker,
+    run_date: Optional[date] = None,
+) -> int:
+    """
+    Автосбор налогов во всех странах со ставкой > 0. Каждая страна — своя
+    транзакция со сдвигом курсора в task_runs: раз в день и без повторов.
+    Возвращает, сколько всего собрано.
+    """
+    run_key = (run_date or date.today()).isoformat()
+    collected = 0
+    while True:
+        async with session_factory() as session:
+            cursor = await lock_task_run(session, TAXES_TASK, run_key)
+            if cursor is None:
+                return collected
+
+            country = (await session.execute(
+                select(MemeCountry.country_id, MemeCountry.chat_id)
+                .where(MemeCountry.country_id > cursor, MemeCountry.tax_rate > 0)
+                .order_by(MemeCountry.country_id)
+                .limit(1)
+            )).first()
+            if country is None:
+                await finish_task_run(session, TAXES_TASK, run_key)
+                await session.commit()
+                break
+
+            success, msg = await collect_taxes(session, country.country_id)
+            await advance_task_run(session, TAXES_TASK, run_key, country.country_id)
+            await session.commit()
+
+        if success:
+            collected += 1
+            if country.chat_id:
+                broadcaster.send(country.chat_id, f"💰 <b>Автосбор налогов</b>\n{msg}", parse_mode='HTML')
+
+    logger.info(f"Налоги собраны автоматически в {collected} странах.")
+    return collected
+
+
+async def expire_punishments_job(session_factory: async_sessionmaker) -> None:
     async with session_factory() as session:
+        expired = await expire_punishments(session, datetime.utcnow())
+        await session.commit()
+    if expired:
+        logger.info(f"Снято истёкших наказаний: {expired}")
+
+
+async def close_stale_rp_events_job(
+    broadcaster: Broadcaster,
+    session_factory: async_sessionmaker,
+    max_age_hours: float,
+) -> None:
+    async with session_factory() as session:
+        closed = await close_stale_rp_events(session, timedelta(hours=max_age_hours))
+        await session.commit()
+
+    for event in closed:
+        broadcaster.send(
+            event.chat_id,
+            f"⌛ Ивент <b>{escape_html(event.title)}</b> завершён автоматически. Очки начислены всем участникам!",
+            parse_mode='HTML'
+        )
+    if closed:
+        logger.info(f"Автоматически закрыто РП-ивентов: {len(closed)}")
+
+
+async def expire_fsm_states_job(session_factory: async_sessionmaker, ttl_hours: float) -> None:
+    """Удаляет брошенные сценарии FSM (не менялись дольше ttl_hours)."""
+    async with session_factory() as session:
+        deleted = await delete_expired_fsm_records(session, datetime.utcnow() - timedelta(hours=ttl_hours))
+        await session.commit()
+    if deleted:
+        logger.info(f"Удалено брошенных сценариев FSM: {deleted}")
+
+
+# ==========================================
+# ПЛАНИРОВЩИК
+# ==========================================
+def create_scheduler(
+    broadcaster: Broadcaster,
+    session_factory: async_sessionmaker,
+    clock: Optional[Clock] = None,
+) -> Scheduler:
+    """Все периодические задачи бота. Запуск/остановка — в dp.startup/dp.shutdown."""
+    scheduler = Scheduler(session_factory, clock=clock)
+
+    # Дата запуска — по местному времени планового запуска, а не «сегодня»:
+    # после простоя каждый пропущенный день догоняется отдельным запуском (catch_up),
+    # а task_runs по этой дате не даст начислить за день дважды
+    def local_date(scheduled_for: datetime) -> date:
+        return scheduled_for.astimezone().date()
+
+    if SCHEDULER_DAILY_BONUS_TIME:
+        scheduler.add_job(
+            DAILY_BONUS_TASK,
+            lambda at: distribute_daily_influence_bonus(broadcaster, session_factory, local_date(at)),
+            Daily.parse(SCHEDULER_DAILY_BONUS_TIME),
+            jitter=SCHEDULER_JITTER_SECONDS,
+            catch_up=True,
+        )
+    if SCHEDULER_TAXES_TIME:
+        scheduler.add_job(
+            TAXES_TASK,
+            lambda at: collect_all_taxes(broadcaster, session_factory, local_date(at)),
+            Daily.parse(SCHEDULER_TAXES_TIME),
+            jitter=SCHEDULER_JITTER_SECONDS,
+            catch_up=True,
+        )
+    if SCHEDULER_PUNISHMENT_CHECK_SECONDS > 0:
+        scheduler.add_job(
+            "punishment_expiry",
+            lambda at: expire_punishments_job(session_factory),
+            Every(SCHEDULER_PUNISHMENT_CHECK_SECONDS),
+        )
+    if RP_EVENT_AUTO_CLOSE_HOURS > 0:
+        scheduler.add_job(
+            "rp_event_auto_close",
+            lambda at: close_stale_rp_events_job(broadcaster, session_factory, RP_EVENT_AUTO_CLOSE_HOURS),
+            Every(600),
+            jitter=SCHEDULER_JITTER_SECONDS,
+        )
+    if FSM_STORAGE != "memory" and FSM_TTL_HOURS > 0:
+        scheduler.add_job(
+            "fsm_expiry",
+            lambda at: expire_fsm_states_job(session_factory, FSM_TTL_HOURS),
+            Every(3600),
+            jitter=SCHEDULER_JITTER_SECONDS,
+        )
+    return scheduler
+
+
+async def country_index_watchdog(session_factory: async_sessionmaker, interval_minutes: int):
+    """Периодически сверяет индекс названий стран с БД (пересобирает при расхождении)."""
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
         try:
-            # 1. Загружаем страны СРАЗУ вместе с их гражданами (Eager Loading)
-            # Это ОДИН запрос к БД вместо десятков. Твой i5 скажет спасибо.
-            result = await session.execute(
-                select(MemeCountry).options(selectinload(MemeCountry.citizens))
-            )
-            countries = result.scalars().all()
-            
-            if not countries:
-                logger.info("Стран для начисления бонусов не найдено.")
-                return
-
-            total_updated = 0
-            
-            for country in countries:
-                influence = country.influence_points
-                daily_bonus = influence // DAILY_BONUS_RATIO
-                
-                if daily_bonus <= 0 or not country.citizens:
-                    continue
-
-                # Подготовка сообщения
-                c_name = escape_html(country.name)
-                description = f"Пассивный бонус страны '{c_name}' (Влияние: {influence}, Бонус: {daily_bonus} RP)."
-                
-                # Массовое обновление объектов в памяти
-                for user in country.citizens:
-                    user.points += daily_bonus
-                    
-                    # Создаем запись истории
-                    history = History(
-                        target_id=user.user_id,
-                        event_type="daily_bonus",
-                        description=description,
-                        timestamp=datetime.now(timezone.utc)
-                    )
-                    session.add(history)
-                    total_updated += 1
-
-                # Оповещаем чат страны (если есть ID)
-                if country.chat_id:
-                    try:
-                        msg = (f"🎉 <b>Ежедневное начисление!</b>\n"
-                               f"Страна <b>{c_name}</b> принесла гражданам по <b>{daily_bonus}</b> RP.")
-                        await bot.send_message(country.chat_id, msg, parse_mode='HTML')
-                    except Exception as e:
-                        logger.warning(f"Ошибка рассылки в чат {country.chat_id}: {e}")
-
-            # Фиксируем всё одним махом
-            if total_updated > 0:
-                logger.info(f"Успешно начислено бонусов {total_updated} пользователям.")
-            
+            async with session_factory() as session:
+                await country_index.check_consistency(session)
         except Exception as e:
-            logger.error(f"Критическая ошибка планировщика: {e}", exc_info=True)
-
-# Функция задержки (оставляем как была, она норм)
-def get_delay_until_next_run(hour: int, minute: int) -> int:
-    now = datetime.now()
-    target = datetime.combine(now.date(), time(hour, minute))
-    if now >= target:
-        target += timedelta(days=1)
-    return int((target - now).total_seconds())
-
-async def smart_daily_scheduler(bot: Bot, session_factory: async_sessionmaker):
-    TARGET_HOUR, TARGET_MINUTE = 0, 0
+            logger.error(f"Ошибка сверки индекса стран: {e}", exc_info=True)
+
+
+async def admin_levels_refresher(session_factory: async_sessionmaker, interval_minutes: float):
+    """Периодически перечитывает уровни админов (изменения из других процессов)."""
     while True:
-        delay = get_delay_until_next_run(TARGET_HOUR, TARGET_MINUTE)
-        logger.info(f"Бонусы через {delay} сек. ({TARGET_HOUR:02d}:{TARGET_MINUTE:02d})")
-        await asyncio.sleep(delay)
-        await distribute_daily_influence_bonus(bot, session_factory)
\ No newline at end of file
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            async with session_factory() as session:
+                await admin_levels.load(session)
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки уровней админов: {e}", exc_info=True)
+
+
+async def leaderboard_refresher(
+    session_factory: async_sessionmaker,
+    interval_seconds: float,
+    full_reload_minutes: float = 0,
+):
+    """
+    Перечитывает лидерборды, помеченные устаревшими (массовые начисления),
+    и раз в full_reload_minutes — все: так подтягиваются изменения других процессов.
+    """
+    loop = asyncio.get_running_loop()
+    last_full = loop.time()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with session_factory() as session:
+                if full_reload_minutes > 0 and loop.time() - last_full >= full_reload_minutes * 60:
+                    await leaderboards.load(session)
+                    last_full = loop.time()
+                elif refreshed := await leaderboards.refresh_stale(session):
+                    logger.info(f"🏆 Лидерборды перечитаны: {', '.join(refreshed)}")
+        except Exception as e:
+            logger.error(f"Ошибка обновления лидербордов: {e}", exc_info=True)
@@ -0,0 +1,123 @@
+"""
+Текстовые команды «рп ...» без цепочки F.text.lower().startswith(...).
+
+Раньше каждый такой фильтр на каждое текстовое сообщение заново делал
+lower() и startswith — по всем командам всех роутеров по очереди.
+Теперь:
+- все префиксы собираются в префиксное дерево (trie) при регистрации
+  хендлеров (TextCommand("рп казино") — добавляет префикс);
+- TextCommandMiddleware один раз на сообщение приводит текст к нижнему
+  регистру, проходит по дереву и кладёт результат в data["text_match"] —
+  множество всех совпавших префиксов и слова сообщения;
+- фильтр TextCommand лишь проверяет «есть ли мой префикс в множестве»
+  и отдаёт хендлеру разобранные аргументы (text_command: CommandArgs).
+
+Семантика та же, что у startswith: порядок роутеров и хендлеров, FSM,
+флаги и мидлвари aiogram не меняются. Сравнение с цепочкой —
+python -m benchmarks.text_router.
+"""
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.filters import BaseFilter
+from aiogram.types import Message, TelegramObject
+
+_END = None  # Ключ узла дерева: здесь заканчивается зарегистрированный префикс
+
+
+class CommandTrie:
+    """Префиксное дерево команд по символам."""
+
+    def __init__(self):
+        self._root: dict = {}
+        self.prefixes: list[str] = []
+
+    def add(self, prefix: str) -> None:
+        prefix = prefix.lower()
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if _END not in node:
+            node[_END] = prefix
+            self.prefixes.append(prefix)
+
+    def match(self, normalized: str) -> frozenset[str]:
+        """Все зарегистрированные префиксы, с которых начинается текст."""
+        found = []
+        node = self._root
+        for char in normalized:
+            node = node.get(char)
+            if node is None:
+                break
+            if _END in node:
+                found.append(node[_END])
+        return frozenset(found)
+
+
+@dataclass(frozen=True, slots=True)
+class TextMatch:
+    """Сообщение, разобранное один раз на все фильтры TextCommand."""
+    prefixes: frozenset[str]
+    words: tuple[str, ...]      # message.text.split() — в исходном регистре
+
+
+@dataclass(frozen=True, slots=True)
+class CommandArgs:
+    """Аргументы команды: слова сообщения после слов префикса («рп казино 100» -> ("100",))."""
+    command: str
+    args: tuple[str, ...]
+
+    def get(self, index: int, default: Optional[str] = None) -> Optional[str]:
+        return self.args[index] if -len(self.args) <= index < len(self.args) else default
+
+    def get_int(self, index: int) -> Optional[int]:
+        """Аргумент как целое (со знаком) или None."""
+        value = self.get(index)
+        if value is None or not value.lstrip("-").isdigit():
+            return None
+        return int(value)
+
+    @property
+    def rest(self) -> str:
+        return " ".join(self.args)
+
+
+text_commands = CommandTrie()
+
+
+def parse_text(text: str) -> TextMatch:
+    return TextMatch(text_commands.match(text.lower()), tuple(text.split()))
+
+
+class TextCommandMiddleware(BaseMiddleware):
+    """Разбирает текст сообщения один раз, до фильтров всех роутеров."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Message) and event.text:
+            data["text_match"] = parse_text(event.text)
+        return await handler(event, data)
+
+
+class TextCommand(BaseFilter):
+    """Замена F.text.lower().startswith(prefix): регистрирует префикс в дереве."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix.lower()
+        self._prefix_words = len(self.prefix.split())
+        text_commands.add(self.prefix)
+
+    async def __call__(self, message: Message, text_match: Optional[TextMatch] = None) -> bool | dict[str, Any]:
+        if text_match is None:
+            # Мидлварь не подключена (или сообщение без текста) — разбираем на месте
+            if not message.text:
+                return False
+            text_match = parse_text(message.text)
+        if self.prefix not in text_match.prefixes:
+            return False
+        return {"text_command": CommandArgs(self.prefix, text_match.words[self._prefix_words:])}
@@ -0,0 +1,122 @@
+"""
+Планировщик апдейтов: строго по очереди для одного (чат, пользователь),
+параллельно — для разных.
+
+aiogram запускает каждый апдейт отдельной задачей, поэтому два спина казино
+от одного игрока могли идти одновременно и гоняться за user.points.
+UpdateScheduler вешается outer-мидлварью на dp.update ДО SessionMiddleware:
+- апдейты одного ключа (chat_id, user_id) ждут друг друга (asyncio.Lock — FIFO);
+- очередь на ключ ограничена: лишнее при флуде отбрасывается (dropped);
+- поверх — общий потолок одновременных апдейтов, по умолчанию равный
+  размеру пула SQLAlchemy (pool_size + max_overflow): больше соединений
+  всё равно не будет, а ждать их внутри сессии хуже, чем здесь.
+
+Сессия открывается только после того, как апдейт дождался своей очереди,
+так что ожидающие апдейты соединения из пула не держат.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyQueue:
+    """Очередь одного ключа: замок + сколько апдейтов ждут или выполняются."""
+    __slots__ = ("lock", "size")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.size = 0
+
+
+class UpdateScheduler(BaseMiddleware):
+    def __init__(self, max_concurrency: int, max_queue_per_key: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue_per_key = max_queue_per_key
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._queues: Dict[Hashable, _KeyQueue] = {}
+
+        # Метрики
+        self.in_flight = 0
+        self.waiting = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_key_depth = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    @staticmethod
+    def get_key(data: Dict[str, Any]) -> Optional[Hashable]:
+        """Ключ очереди из контекста UserContextMiddleware (chat + user)."""
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        key = self.get_key(data)
+        if key is None:
+            return await self._run(handler, event, data, time.perf_counter())
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _KeyQueue()
+        if queue.size >= self.max_queue_per_key:
+            self.dropped += 1
+            logger.warning(f"⚠️ Очередь {key} переполнена ({queue.size}), апдейт отброшен.")
+            return None
+
+        queue.size += 1
+        self.max_key_depth = max(self.max_key_depth, queue.size)
+        started = time.perf_counter()
+        try:
+            async with queue.lock:
+                return await self._run(handler, event, data, started)
+        finally:
+            queue.size -= 1
+            if queue.size == 0:
+                self._queues.pop(key, None)
+
+    async def _run(self, handler, event, data, started: float) -> Any:
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+            self._slots.release()
+
+    def snapshot(self) -> dict:
+        """Текущие метрики для логов / админки."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting_for_slot": self.waiting,
+            "active_keys": len(self._queues),
+            "queued": sum(q.size for q in self._queues.values()),
+            "max_key_depth": self.max_key_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "avg_wait_ms": round(self.wait_time_total / self.processed * 1000, 2) if self.processed else 0.0,
+            "max_wait_ms": round(self.wait_time_max * 1000, 2),
+        }
@@ -0,0 +1,166 @@
+"""
+Режим вебхука (RUN_MODE=webhook) — альтернатива long polling.
+
+Telegram сам присылает апдейты POST-запросами на aiohttp-сервер,
+их разбирает штатный SimpleRequestHandler из aiogram, но:
+- одновременно обрабатывается не больше WEBHOOK_MAX_CONCURRENCY апдейтов,
+  остальные ждут слот (Telegram при этом просто держит соединение);
+- при остановке сервер перестаёт принимать апдейты (503 — Telegram повторит позже)
+  и ждёт завершения уже запущенных хендлеров до WEBHOOK_DRAIN_TIMEOUT секунд.
+
+Локально вебхук можно погонять скриптом webhook_harness.py.
+"""
+import asyncio
+import logging
+import signal
+from typing import Any, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_LISTEN_HOST,
+    WEBHOOK_LISTEN_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONCURRENCY,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler с лимитом параллельных апдейтов и мягкой остановкой."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, drain_timeout: float, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, **kwargs)
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._closing = False
+        self.in_flight = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._closing:
+            return web.Response(status=503, text="Shutting down")
+
+        # Слот занимаем до ответа Telegram: при перегрузке он сам притормозит
+        await self._slots.acquire()
+        self.in_flight += 1
+        released = False
+        try:
+            response = await super().handle(request)
+            if not self.handle_in_background or response.status != 200:
+                return response
+            # Фоновая задача отпустит слот сама (см. _background_feed_update)
+            released = True
+            return response
+        finally:
+            if not released:
+                self._release()
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot=bot, update=update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки апдейта из вебхука: {e}", exc_info=True)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def drain(self) -> None:
+        """Перестаёт принимать апдейты и ждёт уже запущенные хендлеры."""
+        self._closing = True
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+
+        logger.info(f"⏳ Дожидаюсь {len(tasks)} апдейтов в работе (до {self.drain_timeout} сек.)...")
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"⚠️ Не дождались {len(pending)} апдейтов — отменены.")
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, **data: Any) -> tuple[web.Application, LimitedRequestHandler]:
+    """Собирает aiohttp-приложение: маршрут вебхука, /healthz и startup/shutdown диспетчера."""
+    app = web.Application()
+    handler = LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+        drain_timeout=WEBHOOK_DRAIN_TIMEOUT,
+        secret_token=WEBHOOK_SECRET or None,
+        **data,
+    )
+    # Порядок важен: сначала drain хендлеров, потом shutdown диспетчера
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot, **data)
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({"in_flight": handler.in_flight, "closing": handler._closing})
+
+    app.router.add_get("/healthz", healthz)
+    return app, handler
+
+
+async def set_bot_webhook(bot: Bot, allowed_updates: list[str]) -> None:
+    """Регистрирует WEBHOOK_BASE_URL + WEBHOOK_PATH в Telegram (без WEBHOOK_BASE_URL — локальный режим)."""
+    if not WEBHOOK_BASE_URL:
+        logger.warning("⚠️ WEBHOOK_BASE_URL не задан — вебхук в Telegram не регистрирую (локальный режим).")
+        return
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=allowed_updates,
+    )
+    logger.info(f"✅ Вебхук зарегистрирован: {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+
+
+def install_stop_signals(stop: asyncio.Event) -> None:
+    """SIGINT/SIGTERM выставляют stop (на Windows остаётся KeyboardInterrupt)."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остаётся KeyboardInterrupt
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, **data: Any) -> None:
+    """Поднимает сервер, регистрирует вебхук в Telegram и работает до SIGINT/SIGTERM."""
+    app, _ = create_webhook_app(bot, dp, **data)
+
+    async def register_webhook(app: web.Application) -> None:
+        await set_bot_webhook(bot, dp.resolve_used_update_types())
+
+    app.on_startup.append(register_webhook)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT)
+    await site.start()
+    logger.info(f"🌐 Вебхук-сервер слушает {WEBHOOK_LISTEN_HOST}:{WEBHOOK_LISTEN_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    install_stop_signals(stop)
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("🛑 Останавливаю вебхук-сервер...")
+        # cleanup: закрывает порт -> on_shutdown (drain, shutdown диспетчера) -> on_cleanup
+        await runner.cleanup()
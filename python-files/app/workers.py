@@ -0,0 +1,519 @@
+"""
+Режим воркеров (WORKERS > 0): апдейты получает один процесс-супервизор
+(long polling или вебхук), а обрабатывают N процессов-воркеров. CPU-работа
+одного воркера (нечёткий поиск стран, сборка HTML) не тормозит остальных.
+
+- апдейт уходит воркеру по chat_id (chat_id % N) через очередь multiprocessing:
+  все апдейты чата обрабатывает один процесс и по порядку — на это рассчитаны
+  UpdateScheduler и кэш FSM (ключ — чат + юзер);
+- остальные кэши в памяти не привязаны к чату: профиль юзера меняется из
+  любого чата, индекс стран, уровни админов, лидерборды и версии рендера —
+  общие. Их изменения после коммита рассылаются всем воркерам через
+  отдельные очереди (app/database/peers.py) и применяются за миллисекунды;
+- воркер — обычный бот из app.dispatcher со своим пулом БД (всего соединений
+  до WORKERS × (DB_POOL_SIZE + DB_MAX_OVERFLOW)). Таблицы создаёт супервизор,
+  задачи по расписанию и прогрев GIF — воркер 0, лимит рассылок делится поровну;
+- раз в WORKER_HEALTH_SECONDS воркер присылает отчёт (обработано, в работе,
+  пул БД, очередь апдейтов). Супервизор отдаёт отчёты на /healthz и /metrics
+  (METRICS_LISTEN_PORT) и перезапускает упавшие воркеры.
+
+Остановка (SIGINT/SIGTERM): супервизор перестаёт принимать апдейты,
+воркеры дорабатывают свои очереди и выходят.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+from app.dispatcher import create_dispatcher, init_database, setup_services
+from app.fsm_storage import create_fsm_storage
+from app.database import peers
+from app.database.session import async_session, engine, pool_status
+from app.webhook import install_stop_signals, set_bot_webhook
+from config import (
+    RUN_MODE,
+    WEBHOOK_PATH,
+    WEBHOOK_LISTEN_HOST,
+    WEBHOOK_LISTEN_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_DRAIN_TIMEOUT,
+    METRICS_LISTEN_HOST,
+    METRICS_LISTEN_PORT,
+    WORKER_QUEUE_SIZE,
+    WORKER_MAX_IN_FLIGHT,
+    WORKER_HEALTH_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = None                   # Стоп-сигнал в очереди воркера: доработать и выйти
+POLLING_TIMEOUT = 30           # Секунд long polling в getUpdates
+RESTART_MIN_INTERVAL = 10      # Упавший воркер перезапускается не чаще раза в N секунд
+BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+def partition_key(update: dict[str, Any]) -> int:
+    """chat_id апдейта (без чата — id пользователя, например inline), 0 — если нет ни того, ни другого."""
+    for name, payload in update.items():
+        if name == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+def _make_bot(token: str) -> Bot:
+    return Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+
+# ==========================================
+# ВОРКЕР (отдельный процесс)
+# ==========================================
+class Worker:
+    def __init__(
+        self,
+        index: int,
+        count: int,
+        token: str,
+        updates: mp.Queue,
+        health: mp.Queue,
+        inboxes: list[mp.Queue],
+    ):
+        self.index = index
+        self.updates = updates
+        self.health = health
+        self.inbox = inboxes[index]
+        # Изменения кэшей после наших коммитов — остальным воркерам
+        peers.connect(index, inboxes)
+        self.bot = _make_bot(token)
+        self.dp = create_dispatcher(storage=create_fsm_storage(async_session))
+        setup_services(self.dp, self.bot, init_db=False, primary=index == 0, metrics=False, processes=count)
+        self._slots = asyncio.Semaphore(WORKER_MAX_IN_FLIGHT)
+        self._in_flight: set[asyncio.Task] = set()
+        self._parent = os.getppid()
+        self.processed = 0
+        self.failed = 0
+
+    async def run(self) -> None:
+        workflow = {"bot": self.bot, "dispatcher": self.dp, "bots": [self.bot]}
+        # Старые изменения (пока воркер перезапускался) покроет загрузка кэшей на старте,
+        # а всё, что придёт после этой точки, применится поверх неё
+        self._drain_inbox()
+        listener = asyncio.create_task(self._listen_peers())
+        await self.dp.emit_startup(**workflow)
+        self._report()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await self._consume()
+        finally:
+            heartbeat.cancel()
+            listener.cancel()
+            await self._drain()
+            await self.dp.emit_shutdown(**workflow)
+            await self.bot.session.close()
+            await engine.dispose()
+            logger.info(f"👋 Воркер {self.index} остановлен: обработано {self.processed}, ошибок {self.failed}")
+
+    def _next(self) -> Optional[dict]:
+        """Блокирующее чтение очереди (в потоке). Супервизор пропал — выходим."""
+        while True:
+            try:
+                return self.updates.get(timeout=1)
+            except queue.Empty:
+                if os.getppid() != self._parent:
+                    logger.error("Супервизор завершился — воркер выходит.")
+                    return _STOP
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Свободный слот — до чтения: переполненный воркер не забирает апдейты, очередь подпирает супервизор
+            await self._slots.acquire()
+            raw = await loop.run_in_executor(None, self._next)
+            if raw is _STOP:
+                self._slots.release()
+                return
+            try:
+                update = Update.model_validate(raw, context={"bot": self.bot})
+            except Exception as e:
+                self._slots.release()
+                self.failed += 1
+                logger.error(f"Не удалось разобрать апдейт {raw.get('update_id')}: {e}")
+                continue
+            task = asyncio.create_task(self._process(update))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update, dispatcher=self.dp, bots=[self.bot])
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}", exc_info=True)
+        finally:
+            self._slots.release()
+
+    def _drain_inbox(self) -> None:
+        while True:
+            try:
+                self.inbox.get_nowait()
+            except queue.Empty:
+                return
+
+    async def _listen_peers(self) -> None:
+        """Изменения кэшей от других воркеров: читаем в потоке, применяем в цикле событий."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                topic, payload = await loop.run_in_executor(None, self.inbox.get, True, 1)
+            except queue.Empty:
+                continue
+            try:
+                peers.apply(topic, payload)
+            except Exception as e:
+                logger.error(f"Не удалось применить изменения {topic}: {e}", exc_info=True)
+
+    async def _drain(self) -> None:
+        if not self._in_flight:
+            return
+        done, pending = await asyncio.wait(set(self._in_flight), timeout=WEBHOOK_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"⚠️ Не дождались {len(pending)} апдейтов — отменены.")
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_HEALTH_SECONDS)
+            self._report()
+
+    def _report(self) -> None:
+        report = {
+            "worker": self.index,
+            "pid": os.getpid(),
+            "at": time.time(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "in_flight": len(self._in_flight),
+            "db_pool": pool_status(),
+            "updates": self.dp["update_scheduler"].snapshot(),
+        }
+        try:
+            self.health.put_nowait(report)
+        except queue.Full:
+            pass
+
+
+def worker_main(
+    index: int,
+    count: int,
+    token: str,
+    updates: mp.Queue,
+    health: mp.Queue,
+    inboxes: list[mp.Queue],
+    log_level: int,
+) -> None:
+    """Точка входа процесса-воркера."""
+    # Сигналы остановки получает вся группа процессов — останавливает воркеры супервизор (через очередь)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    logging.basicConfig(
+        level=log_level,
+        format=f"%(asctime)s - %(levelname)s - [worker {index}] %(name)s - %(message)s",
+    )
+
+    async def run() -> None:
+        await Worker(index, count, token, updates, health, inboxes).run()
+
+    asyncio.run(run())
+
+
+# ==========================================
+# СУПЕРВИЗОР
+# ==========================================
+@dataclass
+class _WorkerHandle:
+    index: int
+    updates: mp.Queue
+    process: Optional[Any] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    report: dict = field(default_factory=dict)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)  # Порядок апдейтов в очереди воркера
+
+
+class Supervisor:
+    def __init__(self, token: str, count: int):
+        self.token = token
+        self.count = count
+        self._ctx = mp.get_context("spawn")
+        self._health = self._ctx.Queue()
+        self.workers = [_WorkerHandle(i, self._ctx.Queue(maxsize=WORKER_QUEUE_SIZE)) for i in range(count)]
+        # Изменения кэшей между воркерами: у каждого своя входящая очередь (без ограничения —
+        # отправка идёт из after_commit и ждать не может)
+        self._inboxes = [self._ctx.Queue() for _ in range(count)]
+        self.dispatched = 0
+        self.offset: Optional[int] = None
+        self._stopping = False
+
+    # ==========================================
+    # ПРОЦЕССЫ
+    # ==========================================
+    def _spawn(self, worker: _WorkerHandle) -> None:
+        worker.process = self._ctx.Process(
+            target=worker_main,
+            args=(
+                worker.index, self.count, self.token, worker.updates, self._health,
+                self._inboxes, logging.getLogger().level,
+            ),
+            name=f"rpbot-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.report = {}
+
+    def start(self) -> None:
+        for worker in self.workers:
+            self._spawn(worker)
+        logger.info(f"🧩 Запущено воркеров: {self.count}")
+
+    async def monitor(self) -> None:
+        """Собирает отчёты воркеров и перезапускает упавшие."""
+        while True:
+            await asyncio.sleep(1)
+            self._collect_reports()
+            if self._stopping:
+                continue
+            for worker in self.workers:
+                if worker.process.is_alive():
+                    continue
+                if time.monotonic() - worker.started_at < RESTART_MIN_INTERVAL:
+                    continue
+                logger.error(
+                    f"💥 Воркер {worker.index} (pid {worker.process.pid}) завершился "
+                    f"с кодом {worker.process.exitcode} — перезапускаю."
+                )
+                worker.restarts += 1
+                self._spawn(worker)
+
+    def _collect_reports(self) -> None:
+        while True:
+            try:
+                report = self._health.get_nowait()
+            except queue.Empty:
+                return
+            self.workers[report["worker"]].report = report
+
+    async def stop(self) -> None:
+        """Стоп-сигнал каждому воркеру (после уже стоящих в очереди апдейтов) и ожидание выхода."""
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            async with worker.lock:
+                await loop.run_in_executor(None, worker.updates.put, _STOP)
+        deadline = time.monotonic() + WEBHOOK_DRAIN_TIMEOUT + 30
+        for worker in self.workers:
+            await loop.run_in_executor(None, worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"⚠️ Воркер {worker.index} не остановился вовремя — завершаю принудительно.")
+                worker.process.terminate()
+
+    # ==========================================
+    # РАЗДАЧА АПДЕЙТОВ
+    # ==========================================
+    async def dispatch(self, raw: dict[str, Any]) -> None:
+        """Кладёт апдейт в очередь воркера его чата. Очередь полна — ждём (приём апдейтов притормаживает)."""
+        worker = self.workers[partition_key(raw) % self.count]
+        async with worker.lock:
+            try:
+                worker.updates.put_nowait(raw)
+            except queue.Full:
+                await asyncio.get_running_loop().run_in_executor(None, worker.updates.put, raw)
+        self.dispatched += 1
+
+    async def poll(self, bot: Bot, allowed_updates: list[str]) -> None:
+        """Long polling: getUpdates -> dispatch, пока задачу не отменят."""
+        # Если раньше работали через вебхук — снимаем его, иначе getUpdates не работает
+        await bot.delete_webhook()
+        backoff = Backoff(config=BACKOFF)
+        request_timeout = int(bot.session.timeout + POLLING_TIMEOUT) if bot.session.timeout else None
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=self.offset,
+                    timeout=POLLING_TIMEOUT,
+                    allowed_updates=allowed_updates,
+                    request_timeout=request_timeout,
+                )
+            except Exception as e:
+                logger.error(f"Не удалось получить апдейты: {e} — повтор через {backoff.next_delay:.1f} сек.")
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                await self.dispatch(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+                self.offset = update.update_id + 1
+
+    async def confirm_offset(self, bot: Bot) -> None:
+        """Подтверждает Telegram уже розданные апдейты, чтобы после перезапуска они не пришли снова."""
+        if self.offset is None:
+            return
+        try:
+            await bot.get_updates(offset=self.offset, timeout=0, limit=1)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось подтвердить offset {self.offset}: {e}")
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401, text="Unauthorized")
+        if self._stopping:
+            return web.Response(status=503, text="Shutting down")
+        await self.dispatch(await request.json())
+        return web.Response()
+
+    # ==========================================
+    # ЗДОРОВЬЕ
+    # ==========================================
+    def _healthy(self, worker: _WorkerHandle) -> bool:
+        return (
+            worker.process is not None
+            and worker.process.is_alive()
+            and bool(worker.report)
+            and time.time() - worker.report["at"] < WORKER_HEALTH_SECONDS * 3
+        )
+
+    def snapshot(self) -> list[dict]:
+        result = []
+        for worker in self.workers:
+            try:
+                queued = worker.updates.qsize()
+            except NotImplementedError:  # macOS
+                queued = -1
+            report = worker.report
+            result.append({
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "healthy": self._healthy(worker),
+                "restarts": worker.restarts,
+                "queued": queued,
+                "last_report_s": round(time.time() - report["at"], 1) if report else None,
+                "processed": report.get("processed", 0),
+                "failed": report.get("failed", 0),
+                "in_flight": report.get("in_flight", 0),
+                "db_pool": report.get("db_pool", {}),
+                "updates": report.get("updates", {}),
+            })
+        return result
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        workers = self.snapshot()
+        ok = all(w["healthy"] for w in workers)
+        return web.json_response(
+            {"ok": ok, "dispatched": self.dispatched, "workers": workers},
+            status=200 if ok else 503,
+        )
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        lines = [
+            "# TYPE rpbot_supervisor_dispatched counter",
+            f"rpbot_supervisor_dispatched {self.dispatched}",
+        ]
+        for w in self.snapshot():
+            label = f'{{worker="{w["worker"]}"}}'
+            values = {
+                "up": int(w["healthy"]),
+                "restarts": w["restarts"],
+                "queued": w["queued"],
+                "processed": w["processed"],
+                "failed": w["failed"],
+                "in_flight": w["in_flight"],
+                **{f"db_pool_{k}": v for k, v in w["db_pool"].items()},
+                **{f"updates_{k}": v for k, v in w["updates"].items()},
+            }
+            lines.extend(f"rpbot_worker_{name}{label} {value}" for name, value in values.items())
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain", charset="utf-8")
+
+
+# ==========================================
+# ЗАПУСК
+# ==========================================
+async def _start_site(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
+
+
+async def run_supervisor(token: str, count: int) -> None:
+    """Режим воркеров: таблицы, процессы-воркеры и приём апдейтов до SIGINT/SIGTERM."""
+    await init_database()
+    # Соединения супервизору больше не нужны: у каждого воркера свой пул
+    await engine.dispose()
+    # Диспетчер здесь — только чтобы узнать, какие типы апдейтов слушают роутеры
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+
+    supervisor = Supervisor(token, count)
+    supervisor.start()
+    monitor = asyncio.create_task(supervisor.monitor())
+    bot = _make_bot(token)
+    stop = asyncio.Event()
+    install_stop_signals(stop)
+
+    health_app = web.Application()
+    health_app.router.add_get("/healthz", supervisor.healthz)
+    health_app.router.add_get("/metrics", supervisor.metrics)
+    health_runner = None
+    if METRICS_LISTEN_PORT > 0:
+        health_runner = await _start_site(health_app, METRICS_LISTEN_HOST, METRICS_LISTEN_PORT)
+        logger.info(f"📈 Здоровье воркеров: http://{METRICS_LISTEN_HOST}:{METRICS_LISTEN_PORT}/healthz и /metrics")
+
+    try:
+        if RUN_MODE == "webhook":
+            app = web.Application()
+            app.router.add_post(WEBHOOK_PATH, supervisor.handle_webhook)
+            app.router.add_get("/healthz", supervisor.healthz)
+            webhook_runner = await _start_site(app, WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT)
+            logger.info(f"🌐 Вебхук-сервер слушает {WEBHOOK_LISTEN_HOST}:{WEBHOOK_LISTEN_PORT}{WEBHOOK_PATH}")
+            try:
+                await set_bot_webhook(bot, allowed_updates)
+                await stop.wait()
+            finally:
+                # Сначала перестаём принимать: Telegram повторит то, что не дошло
+                await webhook_runner.cleanup()
+        else:
+            logger.info("Starting bot polling (workers mode)...")
+            receiver = asyncio.create_task(supervisor.poll(bot, allowed_updates))
+            stopped = asyncio.create_task(stop.wait())
+            done, _ = await asyncio.wait({receiver, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+            if receiver in done and receiver.exception() is not None:
+                logger.error(f"Приём апдейтов остановился с ошибкой: {receiver.exception()}")
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+            await supervisor.confirm_offset(bot)
+    finally:
+        logger.info("🛑 Останавливаю воркеры...")
+        await supervisor.stop()
+        monitor.cancel()
+        if health_runner is not None:
+            await health_runner.cleanup()
+        await bot.session.close()
@@ -0,0 +1,16 @@
+"""
+Бенчмарки бота: прогон синтетических апдейтов через настоящий Dispatcher.
+
+    python -m benchmarks                       # все сценарии
+    python -m benchmarks casino join -n 1000 -c 50
+
+Собирается тот же Dispatcher, что и в RPBot3.0.py (app.dispatcher),
+запросы к Telegram перехватывает MockSession (сеть не нужна),
+база — настоящий Postgres из .env (нужны CTE-DML и pg_trgm, SQLite не подойдёт).
+Лучше запускать на отдельной БД: сценарии создают своих пользователей,
+страну и РП-ивент в зарезервированном диапазоне id и удаляют их в конце.
+
+RTP казино (без бота и БД) считает отдельный симулятор: python -m benchmarks.rtp
+Выбор хендлера по тексту «рп ...» (без бота и БД): python -m benchmarks.text_router
+Планировщик на поддельных часах (без бота и БД): python -m benchmarks.scheduler
+"""
@@ -0,0 +1,156 @@
+"""
+Точка входа: python -m benchmarks [сценарии...] [-n N] [-c C] [--users U]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from collections import Counter
+
+from aiogram import Bot, Dispatcher
+from sqlalchemy import event
+
+from app.broadcast import Broadcaster
+from app.dispatcher import create_dispatcher, prepare_database
+from app.database.session import engine, async_session
+from app.media import MediaRegistry, SLOTS_PATH
+from benchmarks.mock_session import MockSession
+from benchmarks.scenarios import SCENARIOS, BenchContext, seed, cleanup
+
+logger = logging.getLogger("benchmarks")
+
+
+class QueryCounter:
+    """Считает SQL-запросы, ушедшие в базу через engine."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_scenario(
+    dp: Dispatcher,
+    bot: Bot,
+    ctx: BenchContext,
+    name: str,
+    count: int,
+    concurrency: int,
+    queries: QueryCounter,
+) -> dict:
+    make_update = SCENARIOS[name]
+    updates = [make_update(ctx, i) for i in range(count)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def feed(update) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                errors += 1
+                logger.debug("Ошибка в сценарии %s: %s", name, e)
+            latencies.append(time.perf_counter() - started)
+
+    bot.session.calls.clear()
+    queries_before = queries.count
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "updates": count,
+        "errors": errors,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "queries_per_update": (queries.count - queries_before) / count,
+        "api_calls_per_update": sum(bot.session.calls.values()) / count,
+        "api_calls": dict(Counter(bot.session.calls).most_common()),
+    }
+
+
+def print_report(results: list[dict]) -> None:
+    header = f"{'сценарий':<10} {'апдейтов':>8} {'ошибок':>6} {'upd/s':>9} {'p50 мс':>8} {'p99 мс':>8} {'SQL/upd':>8} {'API/upd':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['updates']:>8} {r['errors']:>6} {r['throughput']:>9.1f} "
+            f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries_per_update']:>8.2f} {r['api_calls_per_update']:>8.2f}"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    dp = create_dispatcher()
+    bot = Bot("42:BENCH", session=MockSession())
+    broadcaster = Broadcaster(bot)
+    dp["broadcaster"] = broadcaster
+    slot_media = MediaRegistry(SLOTS_PATH, async_session, prefix="slot", suffix=".gif")
+    dp["slot_media"] = slot_media
+
+    queries = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", queries)
+
+    await prepare_database()
+    await slot_media.load()
+    await broadcaster.start()
+    ctx = await seed(args.users)
+    results = []
+    try:
+        for name in args.scenarios or list(SCENARIOS):
+            # Прогрев: кэши, пул соединений, подготовленные запросы
+            await run_scenario(dp, bot, ctx, name, min(args.users, args.count), args.concurrency, queries)
+            results.append(await run_scenario(dp, bot, ctx, name, args.count, args.concurrency, queries))
+    finally:
+        await broadcaster.stop(timeout=0)
+        if not args.keep:
+            await cleanup(ctx)
+        event.remove(engine.sync_engine, "before_cursor_execute", queries)
+        await engine.dispose()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Нагрузочный прогон Dispatcher'а")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"какие сценарии гонять (по умолчанию все): {', '.join(SCENARIOS)}")
+    parser.add_argument("-n", "--count", type=int, default=500, help="апдейтов на сценарий")
+    parser.add_argument("-c", "--concurrency", type=int, default=20, help="одновременно обрабатываемых апдейтов")
+    parser.add_argument("--users", type=int, default=100, help="сколько тестовых игроков шлют апдейты")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--keep", action="store_true", help="не удалять тестовые данные после прогона")
+    parser.add_argument("-v", "--verbose", action="store_true", help="логи бота и ошибки хендлеров")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    )
+    asyncio.run(main(args))
@@ -0,0 +1,56 @@
+"""
+Сессия aiogram без сети: любые вызовы Bot API сразу «успешны».
+"""
+import time
+import typing
+from collections import Counter
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, User
+
+
+class MockSession(BaseSession):
+    """Отвечает на методы Bot API заглушками и считает, что вызывалось."""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.calls: Counter[str] = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        returning = method.__returning__
+        options = typing.get_args(returning) or (returning,)
+
+        if Message in options:
+            return self._fake_message(bot, method)
+        if bool in options:
+            return True
+        return None
+
+    def _fake_message(self, bot: Bot, method: TelegramMethod[Any]) -> Message:
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", None)
+        return Message(
+            message_id=self._message_id,
+            date=int(time.time()),
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="supergroup"),
+            from_user=User(id=bot.id, is_bot=True, first_name="Bench"),
+            text=getattr(method, "text", None),
+        )
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[dict] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,192 @@
+"""
+Симулятор RTP казино: сколько очков возвращают «рп казино» (1x3) и
+«рп слоты» (3x3) на каждую поставленную сотню — без бота и без БД.
+
+    python -m benchmarks.rtp                               # текущий config.txt, по 1 млн спинов
+    python -m benchmarks.rtp -n 20000000 -j 8              # 20 млн спинов на 8 процессах
+    python -m benchmarks.rtp --config new.txt --max-rtp 1.0  # проверка правки конфига
+
+Спины крутит тот же движок, что и хендлеры (app/slots.py), с таблицами из
+config.build_casino_tables — включая случайный множитель удачи 3x3 и
+округление выигрыша до целых. Рядом печатается точный RTP из таблиц
+(без округления): на маленьких ставках симуляция ниже на потерю от
+округления, на больших (--bet 1000000) они должны совпасть в пределах 3σ.
+
+С --min-rtp / --max-rtp работает как регрессионный тест: код выхода 1,
+если RTP какого-то казино вышел за границы (±3σ на шум симуляции).
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import config
+from app.slots import Slot1x3, Slot3x3
+
+MACHINES = {
+    "casino": ("рп казино (1x3)", Slot1x3, "SLOT_SYMBOLS", "SYMBOL_WEIGHTS", "SYMBOL_MULTIPLIERS"),
+    "slots": ("рп слоты (3x3)", Slot3x3, "SLOT3X3_SYMBOLS", "SLOT3X3_WEIGHTS", "SLOT3X3_MULTIPLIERS"),
+}
+
+CHUNK = 200_000  # Спинов за один вызов payouts(): память на пачку — несколько МБ
+
+
+@dataclass
+class Totals:
+    spins: int = 0
+    hits: int = 0
+    paid: int = 0
+    paid_sq: float = 0.0     # Σ (выплата/ставка)² — для дисперсии
+    max_payout: int = 0
+
+    def add(self, other: "Totals") -> None:
+        self.spins += other.spins
+        self.hits += other.hits
+        self.paid += other.paid
+        self.paid_sq += other.paid_sq
+        self.max_payout = max(self.max_payout, other.max_payout)
+
+
+def load_tables(path: Optional[str]) -> dict:
+    """Таблицы казино из config.txt бота или из другого файла (поверх стандартных настроек)."""
+    if path is None:
+        return config.build_casino_tables(config.CONFIG)
+    # read_config_txt молча пропускает отсутствующий файл — здесь это означало бы проверку стандартных таблиц
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Конфиг не найден: {path}")
+    conf = config.STANDARD.copy()
+    conf.update(config.read_config_txt(os.path.abspath(path)))
+    return config.build_casino_tables(conf)
+
+
+def make_engine(machine: str, tables: dict, seed: Optional[int] = None):
+    _, engine_cls, symbols, weights, multipliers = MACHINES[machine]
+    engine = engine_cls(tables[symbols], tables[weights], tables[multipliers])
+    engine.rng.seed(seed)
+    return engine
+
+
+def _simulate(machine: str, tables: dict, count: int, bet: int, seed: Optional[int]) -> Totals:
+    """Одна порция спинов (выполняется в процессе-воркере)."""
+    engine = make_engine(machine, tables, seed)
+    totals = Totals()
+    done = 0
+    while done < count:
+        payouts = engine.payouts(min(CHUNK, count - done), bet)
+        done += len(payouts)
+        totals.spins += len(payouts)
+        totals.hits += sum(1 for p in payouts if p > 0)
+        totals.paid += sum(payouts)
+        totals.paid_sq += sum((p / bet) ** 2 for p in payouts)
+        totals.max_payout = max(totals.max_payout, max(payouts))
+    return totals
+
+
+def simulate(machine: str, tables: dict, count: int, bet: int, workers: int, seed: Optional[int]) -> dict:
+    parts = max(1, workers)
+    sizes = [count // parts + (1 if i < count % parts else 0) for i in range(parts)]
+    seeds = [None if seed is None else seed * 1000 + i for i in range(parts)]
+
+    started = time.perf_counter()
+    totals = Totals()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate, machine, tables, size, bet, s) for size, s in zip(sizes, seeds) if size]
+            for future in futures:
+                totals.add(future.result())
+    else:
+        totals.add(_simulate(machine, tables, count, bet, seed))
+    elapsed = time.perf_counter() - started
+
+    n = totals.spins
+    rtp = totals.paid / (n * bet)
+    variance = max(0.0, totals.paid_sq / n - rtp * rtp)
+    return {
+        "machine": machine,
+        "spins": n,
+        "bet": bet,
+        "rtp": rtp,
+        "rtp_stderr": math.sqrt(variance / n),
+        "exact_rtp": make_engine(machine, tables).expected_return(),
+        "variance": variance,
+        "hit_rate": totals.hits / n,
+        "max_win_x": totals.max_payout / bet,
+        "net_per_1000": (rtp - 1) * 1000,   # Сколько очков казино печатает (−сжигает) на 1000 поставленных
+        "spins_per_sec": n / elapsed if elapsed else 0.0,
+        "totals": asdict(totals),
+    }
+
+
+def print_report(results: list[dict]) -> None:
+    header = (f"{'казино':<16} {'спинов':>11} {'RTP':>8} {'±3σ':>7} {'точный':>8} "
+              f"{'дисп.':>8} {'попад.':>7} {'макс.x':>7} {'на 1000':>8} {'спин/с':>10}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{MACHINES[r['machine']][0]:<16} {r['spins']:>11} {r['rtp']:>8.2%} {3 * r['rtp_stderr']:>7.2%} "
+            f"{r['exact_rtp']:>8.2%} {r['variance']:>8.3f} {r['hit_rate']:>7.1%} {r['max_win_x']:>7.1f} "
+            f"{r['net_per_1000']:>+8.0f} {r['spins_per_sec']:>10.0f}"
+        )
+
+
+def check_bounds(results: list[dict], min_rtp: Optional[float], max_rtp: Optional[float]) -> list[str]:
+    """Нарушения границ RTP с учётом шума симуляции (3σ)."""
+    problems = []
+    for r in results:
+        margin = 3 * r["rtp_stderr"]
+        name = MACHINES[r["machine"]][0]
+        if max_rtp is not None and r["rtp"] - margin > max_rtp:
+            problems.append(f"{name}: RTP {r['rtp']:.2%} выше {max_rtp:.2%}")
+        if min_rtp is not None and r["rtp"] + margin < min_rtp:
+            problems.append(f"{name}: RTP {r['rtp']:.2%} ниже {min_rtp:.2%}")
+    return problems
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.rtp", description="Монте-Карло RTP казино")
+    parser.add_argument("machines", nargs="*", metavar="machine",
+                        help=f"какие казино считать (по умолчанию все): {', '.join(MACHINES)}")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000, help="спинов на казино")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="процессов (по умолчанию 1)")
+    parser.add_argument("--bet", type=int, default=100, help="ставка: влияет на округление выигрыша до целых")
+    parser.add_argument("--seed", type=int, help="seed для воспроизводимого прогона")
+    parser.add_argument("--config", help="другой config.txt (по умолчанию — тот, что читает бот)")
+    parser.add_argument("--min-rtp", type=float, help="минимально допустимый RTP, доля (0.9 = 90%%)")
+    parser.add_argument("--max-rtp", type=float, help="максимально допустимый RTP, доля")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+    unknown = set(args.machines) - set(MACHINES)
+    if unknown:
+        parser.error(f"неизвестные казино: {', '.join(sorted(unknown))}")
+    if args.count <= 0 or args.bet <= 0:
+        parser.error("--count и --bet должны быть положительными")
+    if args.config is not None and not os.path.isfile(args.config):
+        parser.error(f"файл конфига не найден: {args.config}")
+    return args
+
+
+def main(args: argparse.Namespace) -> int:
+    tables = load_tables(args.config)
+    results = [
+        simulate(machine, tables, args.count, args.bet, args.workers, args.seed)
+        for machine in args.machines or list(MACHINES)
+    ]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    problems = check_bounds(results, args.min_rtp, args.max_rtp)
+    for problem in problems:
+        print(f"❌ {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,206 @@
+"""
+Тестовые данные и генераторы апдейтов для сценариев бенчмарка.
+
+Все сущности бенчмарка живут в зарезервированном диапазоне id
+(BENCH_USER_BASE ... BENCH_USER_BASE + users), cleanup удаляет только
+строки этого диапазона — настоящих игроков он не задевает.
+"""
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from aiogram.types import Update
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database.models import (
+    User, History, MemeCountry, CountryReview, CountryBlacklist, RPEvent, RPParticipant
+)
+from app.database.session import async_session
+
+BENCH_USER_BASE = 9_100_000_000
+BENCH_CHAT_ID = -9_100_000_000
+BENCH_COUNTRY_NAME = "Бенчляндия"
+BENCH_START_POINTS = 100_000_000
+
+_update_ids = itertools.count(1)
+
+
+@dataclass
+class BenchContext:
+    users: int
+    country_id: int
+    event_id: int
+
+    def user_id(self, i: int) -> int:
+        # Нулевой — правитель страны и автор ивента, игроки начинаются с 1
+        return BENCH_USER_BASE + 1 + i % self.users
+
+    def owns(self, column):
+        """Условие «id из диапазона, который создал seed» (игроки 0..users)."""
+        return column.between(BENCH_USER_BASE, BENCH_USER_BASE + self.users)
+
+
+# ==========================================
+# ДАННЫЕ
+# ==========================================
+async def seed(users: int) -> BenchContext:
+    """Создаёт (или переиспользует) игроков, страну и РП-ивент бенчмарка."""
+    async with async_session() as session:
+        await session.execute(
+            insert(User)
+            .values([
+                dict(
+                    user_id=BENCH_USER_BASE + i,
+                    username=f"bench{i}",
+                    userfullname=f"Bench {i}",
+                    position="Путешественник",
+                    points=BENCH_START_POINTS,
+                    adminlevel=0,
+                    lost_in_casino=0,
+                    is_ruler=False,
+                )
+                for i in range(users + 1)
+            ])
+            .on_conflict_do_update(index_elements=[User.user_id], set_={"points": BENCH_START_POINTS})
+        )
+
+        country = await session.scalar(select(MemeCountry).where(MemeCountry.chat_id == BENCH_CHAT_ID))
+        if country is None:
+            country = MemeCountry(
+                ruler_id=BENCH_USER_BASE,
+                chat_id=BENCH_CHAT_ID,
+                name=BENCH_COUNTRY_NAME,
+                memename="Бенчмем",
+                ideology="Нагрузочное тестирование",
+            )
+            session.add(country)
+
+        event = await session.scalar(
+            select(RPEvent).where(RPEvent.admin_id == BENCH_USER_BASE, RPEvent.status == "active")
+        )
+        if event is None:
+            event = RPEvent(admin_id=BENCH_USER_BASE, chat_id=BENCH_CHAT_ID, title="Бенч-ивент")
+            session.add(event)
+
+        await session.flush()
+        context = BenchContext(users=users, country_id=country.country_id, event_id=event.event_id)
+        await session.commit()
+        return context
+
+
+async def cleanup(ctx: BenchContext) -> None:
+    """Удаляет всё, что насоздавали сценарии: только строки игроков, созданных seed."""
+    bench_countries = select(MemeCountry.country_id).where(ctx.owns(MemeCountry.ruler_id))
+    bench_events = select(RPEvent.event_id).where(ctx.owns(RPEvent.admin_id))
+    async with async_session() as session:
+        await session.execute(delete(History).where(or_(
+            ctx.owns(History.target_id), ctx.owns(History.admin_id)
+        )))
+        await session.execute(delete(RPParticipant).where(or_(
+            ctx.owns(RPParticipant.user_id), RPParticipant.event_id.in_(bench_events)
+        )))
+        await session.execute(delete(RPEvent).where(ctx.owns(RPEvent.admin_id)))
+        await session.execute(delete(CountryReview).where(or_(
+            ctx.owns(CountryReview.user_id), CountryReview.country_id.in_(bench_countries)
+        )))
+        await session.execute(delete(CountryBlacklist).where(CountryBlacklist.country_id.in_(bench_countries)))
+        await session.execute(update(User).where(ctx.owns(User.user_id)).values(country_id=None))
+        await session.execute(delete(MemeCountry).where(MemeCountry.country_id.in_(bench_countries)))
+        await session.execute(delete(User).where(ctx.owns(User.user_id)))
+        await session.commit()
+
+
+# ==========================================
+# АПДЕЙТЫ
+# ==========================================
+def _tg_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Bench {user_id}", "username": f"bench{user_id}"}
+
+
+def message_update(user_id: int, text: str) -> Update:
+    update_id = next(_update_ids)
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": BENCH_CHAT_ID, "type": "supergroup", "title": "Bench"},
+            "from": _tg_user(user_id),
+            "text": text,
+        },
+    })
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    update_id = next(_update_ids)
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": "bench",
+            "from": _tg_user(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": BENCH_CHAT_ID, "type": "supergroup", "title": "Bench"},
+                "text": "bench",
+            },
+        },
+    })
+
+
+def _casino(ctx: BenchContext, i: int) -> Update:
+    return message_update(ctx.user_id(i), "рп казино 10")
+
+
+def _slots(ctx: BenchContext, i: int) -> Update:
+    return message_update(ctx.user_id(i), "рп слоты 10")
+
+
+def _join(ctx: BenchContext, i: int) -> Update:
+    # Через раз — с опечаткой, чтобы гонять нечёткий поиск
+    name = BENCH_COUNTRY_NAME if i % 2 else "бенчлянди"
+    return message_update(ctx.user_id(i), f"/join {name}")
+
+
+def _top(ctx: BenchContext, i: int) -> Update:
+    # /top и его листалка — страны, «рп топ» — игроки по очкам
+    match i % 3:
+        case 0:
+            return message_update(ctx.user_id(i), "/top")
+        case 1:
+            # Следующая страница по рейтингу: курсор «после оценки 5.0»
+            return callback_update(ctx.user_id(i), "top_page:rating:2:n5.0_0")
+        case _:
+            return message_update(ctx.user_id(i), "рп топ")
+
+
+def _transfer(ctx: BenchContext, i: int) -> Update:
+    return message_update(ctx.user_id(i), f"рп передать 1 {ctx.user_id(i + 1)}")
+
+
+def _rp_event(ctx: BenchContext, i: int) -> Update:
+    # Каждый игрок по очереди входит и выходит из ивента, каждый пятый смотрит список
+    if i % 5 == 4:
+        action = "list_participants_"
+    else:
+        action = "join_rp_" if (i // ctx.users) % 2 == 0 else "leave_rp_"
+    return callback_update(ctx.user_id(i), f"{action}{ctx.event_id}")
+
+
+def _profile(ctx: BenchContext, i: int) -> Update:
+    return message_update(ctx.user_id(i), "рп профиль")
+
+
+SCENARIOS: dict[str, Callable[[BenchContext, int], Update]] = {
+    "casino": _casino,
+    "slots": _slots,
+    "join": _join,
+    "top": _top,
+    "transfer": _transfer,
+    "rp_event": _rp_event,
+    "profile": _profile,
+}
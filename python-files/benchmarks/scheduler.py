@@ -0,0 +1,104 @@
+"""
+Проверка планировщика (app/scheduler.py) на поддельных часах — без бота и без БД.
+
+    python -m benchmarks.scheduler
+
+Планировщик гоняется на FakeClock и MemoryJobStore через простой в
+несколько суток и через полночь:
+- ежедневная задача с catch_up=True выполняется за каждый пропущенный день,
+  по порядку и с плановым временем этого дня;
+- без catch_up пропуски схлопываются в один запуск (за первый пропущенный);
+- упавший догоняющий запуск повторяется с тем же плановым временем.
+
+Код выхода 1, если что-то разошлось с ожидаемым.
+"""
+import asyncio
+import logging
+import sys
+from datetime import date, datetime, timezone
+
+from app.scheduler import Daily, FakeClock, MemoryJobStore, Scheduler
+
+START = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)      # Бот поднялся днём 5 января
+DOWN_SINCE = datetime(2026, 1, 2, 0, 0, tzinfo=timezone.utc)  # Первый пропущенный плановый запуск
+
+
+class Recorder:
+    """Задача, которая запоминает даты своих запусков и может упасть на заданной дате."""
+
+    def __init__(self, fail_on: date | None = None):
+        self.dates: list[date] = []
+        self.fail_on = fail_on
+
+    async def __call__(self, scheduled_for: datetime) -> None:
+        run_date = scheduled_for.date()
+        if run_date == self.fail_on:
+            self.fail_on = None
+            raise RuntimeError(f"сбой за {run_date}")
+        self.dates.append(run_date)
+
+
+async def settle(clock: FakeClock, rounds: int = 50) -> None:
+    """Даёт планировщику доработать всё, что уже подошло (время не двигается)."""
+    for _ in range(rounds):
+        await clock.advance(0)
+
+
+def days(*numbers: int) -> list[date]:
+    return [date(2026, 1, n) for n in numbers]
+
+
+async def run_checks() -> list[str]:
+    clock = FakeClock(START)
+    store = MemoryJobStore()
+    scheduler = Scheduler(None, clock=clock, store=store, poll_interval=60, retry_delay=300)
+
+    catch_up, collapsed, flaky = Recorder(), Recorder(), Recorder(fail_on=date(2026, 1, 3))
+    midnight = Daily(0, 0, tz=timezone.utc)
+    scheduler.add_job("catch_up", catch_up, midnight, catch_up=True)
+    scheduler.add_job("collapsed", collapsed, midnight)
+    scheduler.add_job("flaky", flaky, midnight, catch_up=True)
+    for name in scheduler.jobs:
+        store.next_run[name] = DOWN_SINCE
+
+    problems = []
+
+    def expect(what: str, actual, expected) -> None:
+        status = "✅" if actual == expected else "❌"
+        print(f"{status} {what}: {actual}")
+        if actual != expected:
+            problems.append(f"{what}: ожидалось {expected}, получено {actual}")
+
+    await scheduler.start()
+    try:
+        await settle(clock)
+        expect("catch_up после простоя", catch_up.dates, days(2, 3, 4, 5))
+        expect("без catch_up после простоя", collapsed.dates, days(2))
+        expect("упавший запуск ждёт повтора", flaky.dates, days(2))
+
+        # Через retry_delay упавший день повторяется, затем догоняются остальные
+        await clock.advance(301)
+        await settle(clock)
+        expect("повтор упавшего дня", flaky.dates, days(2, 3, 4, 5))
+
+        # Через полночь — ровно по одному запуску за 6 января
+        await clock.advance((datetime(2026, 1, 6, 0, 0, 1, tzinfo=timezone.utc) - clock.now()).total_seconds())
+        await settle(clock)
+        expect("catch_up после полуночи", catch_up.dates, days(2, 3, 4, 5, 6))
+        expect("без catch_up после полуночи", collapsed.dates, days(2, 6))
+        expect("следующий запуск", store.next_run["catch_up"], datetime(2026, 1, 7, tzinfo=timezone.utc))
+    finally:
+        await scheduler.stop(timeout=0)
+    return problems
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    problems = asyncio.run(run_checks())
+    for problem in problems:
+        print(f"❌ {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Маршрутизация текстовых команд «рп ...»: старая цепочка фильтров
+F.text.lower().startswith(...) против префиксного дерева (app/text_commands.py).
+
+    python -m benchmarks.text_router            # по 200 тыс. сообщений на случай
+    python -m benchmarks.text_router -n 1000000
+
+Префиксы берутся из настоящего Dispatcher (app.dispatcher.create_dispatcher):
+все TextCommand-фильтры всех роутеров в порядке, в котором их проверяет
+aiogram. Меряется только выбор хендлера, без БД: сообщение проверяется
+фильтрами по этому порядку до первого совпадения. Худший случай — обычный
+текст, не похожий ни на одну команду: его проверяют все фильтры.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from aiogram import Dispatcher, F
+from aiogram.types import Chat, Message
+
+from app.dispatcher import create_dispatcher
+from app.text_commands import TextCommand, parse_text
+
+
+def make_message(text: str) -> Message:
+    return Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), text=text)
+
+
+def routed_prefixes(dp: Dispatcher) -> list[str]:
+    """Префиксы TextCommand в порядке маршрутизации: роутеры как в chain_tail, хендлеры как зарегистрированы."""
+    prefixes = []
+    for router in dp.chain_tail:
+        for handler in router.message.handlers:
+            for filter_object in handler.filters or ():
+                if isinstance(filter_object.callback, TextCommand):
+                    prefixes.append(filter_object.callback.prefix)
+    return prefixes
+
+
+def cases(prefixes: list[str]) -> list[tuple[str, str]]:
+    return [
+        ("первая команда", f"{prefixes[0].upper()} 100"),
+        ("последняя команда", f"{prefixes[-1]} 100 @user"),
+        ("обычный текст", "всем привет, кто сегодня играет в рп?"),
+    ]
+
+
+def run_chain(filters: list, message: Message, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        for magic in filters:
+            if magic.resolve(message):
+                break
+    return time.perf_counter() - started
+
+
+def run_trie(prefixes: list[str], message: Message, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        # Мидлварь: один разбор; фильтры: проверка по множеству
+        matched = parse_text(message.text).prefixes
+        for prefix in prefixes:
+            if prefix in matched:
+                break
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.text_router",
+                                     description="Цепочка startswith против префиксного дерева")
+    parser.add_argument("-n", "--count", type=int, default=200_000, help="сообщений на случай")
+    args = parser.parse_args()
+
+    dp = create_dispatcher()
+    prefixes = routed_prefixes(dp)
+    filters = [F.text.lower().startswith(prefix) for prefix in prefixes]
+    handlers = sum(len(router.message.handlers) for router in dp.chain_tail)
+    print(f"Текстовых команд в цепочке: {len(prefixes)} (всего хендлеров сообщений: {handlers})")
+
+    header = f"{'случай':<20} {'цепочка, сообщ/с':>18} {'дерево, сообщ/с':>18} {'ускорение':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, text in cases(prefixes):
+        message = make_message(text)
+        chain_time = run_chain(filters, message, args.count)
+        trie_time = run_trie(prefixes, message, args.count)
+        print(f"{name:<20} {args.count / chain_time:>18.0f} {args.count / trie_time:>18.0f} "
+              f"{chain_time / trie_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
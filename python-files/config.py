@@ -60,7 +60,33 @@ def get_standard_settings() -> dict:
         "BOT_ID": 0,
         "BOT": "", 
         "LOG_ALL_MESSAGES": "False",
-        
+
+        # --- Режим запуска: polling или webhook ---
+        "RUN_MODE": "polling",
+        "WEBHOOK_BASE_URL": "",            # Публичный https-адрес, напр. https://bot.example.com
+        "WEBHOOK_PATH": "/webhook",
+        "WEBHOOK_LISTEN_HOST": "0.0.0.0",
+        "WEBHOOK_LISTEN_PORT": 8080,
+        "WEBHOOK_SECRET": "",              # X-Telegram-Bot-Api-Secret-Token
+        "WEBHOOK_MAX_CONCURRENCY": 64,     # Сколько апдейтов обрабатываем одновременно
+        "WEBHOOK_MAX_CONNECTIONS": 40,     # Сколько соединений Telegram держит к нам (1-100)
+        "WEBHOOK_DRAIN_TIMEOUT": 30,       # Сколько секунд ждать хендлеры при остановке
+
+        # --- Режим воркеров: один процесс получает апдейты, N процессов их обрабатывают ---
+        "WORKERS": 0,                      # Процессов-воркеров (0 — всё в одном процессе)
+        "WORKER_QUEUE_SIZE": 1000,         # Апдейтов в очереди одного воркера (дальше приём ждёт)
+        "WORKER_MAX_IN_FLIGHT": 100,       # Сколько апдейтов воркер обрабатывает одновременно
+        "WORKER_HEALTH_SECONDS": 5,        # Как часто воркер присылает отчёт о себе
+
+        # --- Пул соединений с PostgreSQL ---
+        "DB_POOL_SIZE": 10,                # Постоянных соединений в пуле
+        "DB_MAX_OVERFLOW": 10,             # Сколько можно открыть сверх пула на пиках
+        "DB_POOL_TIMEOUT": 30,             # Сколько секунд ждать свободное соединение
+        "DB_POOL_RECYCLE": 1800,           # Пересоздавать соединение старше N секунд (-1 — никогда)
+        "DB_POOL_PRE_PING": "True",        # Проверять соединение перед выдачей из пула
+        "DB_STATEMENT_CACHE_SIZE": 100,    # Кэш подготовленных запросов asyncpg (0 — для pgbouncer)
+        "DB_JIT": "False",                 # JIT Postgres: на коротких OLTP-запросах только мешает
+
         # --- Игровые константы (Общие) ---
         "FUZZY_MATCH_THRESHOLD": 75,
         "RP_TO_INFLUENCE_RATIO": 1000,
@@ -69,6 +95,54 @@ def get_standard_settings() -> dict:
 
         #Бонус за Влияние
         "DAILY_BONUS_RATIO": 100, 
+        "DAILY_BONUS_CHUNK": 500,   # Сколько стран начислять за одну транзакцию
+
+        # --- Кэш пользователей (UserMiddleware) ---
+        "USER_CACHE_TTL": 60,        # Сколько секунд профиль живёт в памяти (0 — выключить)
+        "USER_CACHE_SIZE": 10000,    # Максимум профилей в кэше
+
+        # --- Планировщик апдейтов (очередь на чат+юзера) ---
+        "UPDATE_MAX_CONCURRENCY": 0,  # Потолок одновременных апдейтов (0 — по размеру пула БД)
+        "UPDATE_QUEUE_PER_KEY": 10,   # Сколько апдейтов одного юзера в чате может ждать очереди
+
+        # --- Индекс названий стран ---
+        "COUNTRY_INDEX_CHECK_MINUTES": 60,  # Как часто сверять индекс с БД (0 — не сверять)
+
+        # --- Уровни админов в памяти (проверка прав без запросов) ---
+        "ADMIN_LEVELS_RELOAD_MINUTES": 5,   # Полная перезагрузка (изменения из других процессов, 0 — нет)
+
+        # --- Лидерборды в памяти (топы игроков и стран) ---
+        "LEADERBOARD_REFRESH_SECONDS": 30,      # Как часто перечитывать устаревшие после массовых начислений
+        "LEADERBOARD_FULL_RELOAD_MINUTES": 10,  # Полная перезагрузка (изменения из других процессов, 0 — нет)
+        "RENDER_CACHE_TTL": 30,                 # Сколько секунд живёт готовая карточка/страница топа (0 — без кэша)
+        "RENDER_CACHE_SIZE": 2000,              # Максимум готовых сообщений в кэше
+        "MEDIA_UPLOAD_CHAT_ID": 0,              # Чат для загрузки GIF казино на старте (0 — загружать при первом спине)
+
+        # --- Хранилище FSM (шаги создания/редактирования страны) ---
+        "FSM_STORAGE": "database",   # database — в Postgres, переживает перезапуск; memory — в памяти процесса
+        "FSM_TTL_HOURS": 24,         # Сценарий без изменений дольше — брошен, удаляется (0 — хранить вечно)
+        "FSM_FLUSH_SECONDS": 1,      # Как часто писать накопленные изменения в БД (0 — сразу)
+        "FSM_CACHE_SIZE": 10000,     # Сколько ключей держать в памяти процесса
+
+        # --- Профайлер хендлеров (SQL на апдейт) ---
+        "PROFILER_SLOW_HANDLER_MS": 500,   # Хендлер дольше — пишем в лог (0 — не писать)
+        "PROFILER_MAX_QUERIES": 20,        # Больше SQL-запросов на апдейт — пишем в лог (0 — не писать)
+        "METRICS_LISTEN_HOST": "127.0.0.1",
+        "METRICS_LISTEN_PORT": 0,          # Порт /metrics (0 — не поднимать)
+
+        # --- Очередь рассылок (лимиты Telegram) ---
+        "BROADCAST_WORKERS": 4,            # Сколько сообщений отправляется параллельно
+        "BROADCAST_GLOBAL_RATE": 25,       # Сообщений в секунду на бота (лимит Telegram ~30)
+        "BROADCAST_GROUP_PER_MINUTE": 20,  # Сообщений в минуту в одну группу
+        "BROADCAST_MAX_RETRIES": 3,        # Повторов после flood control / сетевой ошибки
+        "BROADCAST_QUEUE_SIZE": 10000,     # Максимум неотправленных сообщений
+
+        # --- Планировщик фоновых задач (app/scheduler.py) ---
+        "SCHEDULER_DAILY_BONUS_TIME": "00:00",      # Ежедневный бонус, местное время (пусто — выключить)
+        "SCHEDULER_TAXES_TIME": "",                 # Автосбор налогов, напр. "12:00" (пусто — только /collect)
+        "SCHEDULER_PUNISHMENT_CHECK_SECONDS": 60,   # Как часто снимать истёкшие наказания (0 — не снимать)
+        "SCHEDULER_JITTER_SECONDS": 60,             # Случайный сдвиг запуска тяжёлых задач
+        "RP_EVENT_AUTO_CLOSE_HOURS": 0,             # Закрывать РП-ивенты старше N часов (0 — не закрывать, по умолчанию выкл.)
 
         # --- Настройки Казино (Параметры для 1x3) ---
         "SLOT_SYMBOLS": '["🍒", "🍋", "🦷", "⭐", "👼🏿"]', # Храним как строку, чтобы легко читать из TXT
@@ -76,6 +150,7 @@ def get_standard_settings() -> dict:
         "CASINO_MULT_STEP": 1.5,
         "CASINO_BASE_WEIGHT": 50,
         "CASINO_WEIGHT_DIVISOR": 2.8,
+        "CASINO_REVEAL_DELAY": 1.0,         # Пауза перед показом результата, сек (идёт в фоне: БД и слот обработки уже свободны)
         
         #Настройки Казино (Параметры для 3x3)
         "SLOT3X3_SYMBOLS": ["🎸", "👼🏿", "🐸", "✅", "🚹"],
@@ -102,6 +177,13 @@ for k, v in TXT_CONF.items():
 # 2. Перезапись из .env (если есть)
 CONFIG["OWNER_ID"] = os.getenv("OWNER_ID", CONFIG["OWNER_ID"])
 CONFIG["BOT"] = os.getenv("BOT", CONFIG["BOT"])
+CONFIG["RUN_MODE"] = os.getenv("RUN_MODE", CONFIG["RUN_MODE"])
+CONFIG["WEBHOOK_BASE_URL"] = os.getenv("WEBHOOK_BASE_URL", CONFIG["WEBHOOK_BASE_URL"])
+CONFIG["WEBHOOK_SECRET"] = os.getenv("WEBHOOK_SECRET", CONFIG["WEBHOOK_SECRET"])
+CONFIG["WORKERS"] = os.getenv("WORKERS", CONFIG["WORKERS"])
+for key in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE",
+            "DB_POOL_PRE_PING", "DB_STATEMENT_CACHE_SIZE", "DB_JIT"):
+    CONFIG[key] = os.getenv(key, CONFIG[key])
 # ... (и другие настройки, которые вы хотите взять из .env)
 
 # ------------------------------------------------------------
@@ -114,14 +196,88 @@ BOT_ID = int(CONFIG.get("BOT_ID", 0)) # Используем .get для бол
 BOT_TOKEN = CONFIG["BOT"]
 LOG_ALL_MESSAGES = str(CONFIG["LOG_ALL_MESSAGES"]).lower() == "true"
 
+# Режим запуска и вебхук
+RUN_MODE = str(CONFIG["RUN_MODE"]).strip().lower()
+WEBHOOK_BASE_URL = str(CONFIG["WEBHOOK_BASE_URL"]).strip()
+WEBHOOK_PATH = str(CONFIG["WEBHOOK_PATH"]).strip()
+WEBHOOK_LISTEN_HOST = str(CONFIG["WEBHOOK_LISTEN_HOST"]).strip()
+WEBHOOK_LISTEN_PORT = int(CONFIG["WEBHOOK_LISTEN_PORT"])
+WEBHOOK_SECRET = str(CONFIG["WEBHOOK_SECRET"]).strip()
+WEBHOOK_MAX_CONCURRENCY = int(CONFIG["WEBHOOK_MAX_CONCURRENCY"])
+WEBHOOK_MAX_CONNECTIONS = int(CONFIG["WEBHOOK_MAX_CONNECTIONS"])
+WEBHOOK_DRAIN_TIMEOUT = float(CONFIG["WEBHOOK_DRAIN_TIMEOUT"])
+
+# Режим воркеров
+WORKERS = int(CONFIG["WORKERS"])
+WORKER_QUEUE_SIZE = int(CONFIG["WORKER_QUEUE_SIZE"])
+WORKER_MAX_IN_FLIGHT = int(CONFIG["WORKER_MAX_IN_FLIGHT"])
+WORKER_HEALTH_SECONDS = float(CONFIG["WORKER_HEALTH_SECONDS"])
+
+# Пул соединений с PostgreSQL
+DB_POOL_SIZE = int(CONFIG["DB_POOL_SIZE"])
+DB_MAX_OVERFLOW = int(CONFIG["DB_MAX_OVERFLOW"])
+DB_POOL_TIMEOUT = float(CONFIG["DB_POOL_TIMEOUT"])
+DB_POOL_RECYCLE = int(CONFIG["DB_POOL_RECYCLE"])
+DB_POOL_PRE_PING = str(CONFIG["DB_POOL_PRE_PING"]).lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(CONFIG["DB_STATEMENT_CACHE_SIZE"])
+DB_JIT = str(CONFIG["DB_JIT"]).lower() == "true"
+
 # 2. Игровые константы
 FUZZY_MATCH_THRESHOLD = int(CONFIG["FUZZY_MATCH_THRESHOLD"])
 RP_TO_INFLUENCE_RATIO = int(CONFIG["RP_TO_INFLUENCE_RATIO"])
 MIN_POINTS_TO_CREATE_COUNTRY = int(CONFIG["MIN_POINTS_TO_CREATE_COUNTRY"])
 COUNTRY_CREATION_COOLDOWN_HOURS = int(CONFIG["COUNTRY_CREATION_COOLDOWN_HOURS"])
 DAILY_BONUS_RATIO = int(CONFIG["DAILY_BONUS_RATIO"])
+DAILY_BONUS_CHUNK = int(CONFIG["DAILY_BONUS_CHUNK"])
 REVIEW_COOLDOWN_DAYS = int(CONFIG.get("REVIEW_COOLDOWN_DAYS", 7))  # Новая константа для оценки страны
 
+# Кэш пользователей
+USER_CACHE_TTL = float(CONFIG["USER_CACHE_TTL"])
+USER_CACHE_SIZE = int(CONFIG["USER_CACHE_SIZE"])
+
+# Планировщик апдейтов
+UPDATE_MAX_CONCURRENCY = int(CONFIG["UPDATE_MAX_CONCURRENCY"])
+UPDATE_QUEUE_PER_KEY = int(CONFIG["UPDATE_QUEUE_PER_KEY"])
+
+# Индекс названий стран
+COUNTRY_INDEX_CHECK_MINUTES = int(CONFIG["COUNTRY_INDEX_CHECK_MINUTES"])
+
+# Уровни админов
+ADMIN_LEVELS_RELOAD_MINUTES = float(CONFIG["ADMIN_LEVELS_RELOAD_MINUTES"])
+
+# Лидерборды
+LEADERBOARD_REFRESH_SECONDS = float(CONFIG["LEADERBOARD_REFRESH_SECONDS"])
+LEADERBOARD_FULL_RELOAD_MINUTES = float(CONFIG["LEADERBOARD_FULL_RELOAD_MINUTES"])
+RENDER_CACHE_TTL = float(CONFIG["RENDER_CACHE_TTL"])
+RENDER_CACHE_SIZE = int(CONFIG["RENDER_CACHE_SIZE"])
+MEDIA_UPLOAD_CHAT_ID = int(CONFIG["MEDIA_UPLOAD_CHAT_ID"])
+
+# Хранилище FSM
+FSM_STORAGE = str(CONFIG["FSM_STORAGE"]).strip().lower()
+FSM_TTL_HOURS = float(CONFIG["FSM_TTL_HOURS"])
+FSM_FLUSH_SECONDS = float(CONFIG["FSM_FLUSH_SECONDS"])
+FSM_CACHE_SIZE = int(CONFIG["FSM_CACHE_SIZE"])
+
+# Профайлер хендлеров и /metrics
+PROFILER_SLOW_HANDLER_MS = float(CONFIG["PROFILER_SLOW_HANDLER_MS"])
+PROFILER_MAX_QUERIES = int(CONFIG["PROFILER_MAX_QUERIES"])
+METRICS_LISTEN_HOST = str(CONFIG["METRICS_LISTEN_HOST"]).strip()
+METRICS_LISTEN_PORT = int(CONFIG["METRICS_LISTEN_PORT"])
+
+# Очередь рассылок
+BROADCAST_WORKERS = int(CONFIG["BROADCAST_WORKERS"])
+BROADCAST_GLOBAL_RATE = float(CONFIG["BROADCAST_GLOBAL_RATE"])
+BROADCAST_GROUP_PER_MINUTE = float(CONFIG["BROADCAST_GROUP_PER_MINUTE"])
+BROADCAST_MAX_RETRIES = int(CONFIG["BROADCAST_MAX_RETRIES"])
+BROADCAST_QUEUE_SIZE = int(CONFIG["BROADCAST_QUEUE_SIZE"])
+
+# Планировщик фоновых задач
+SCHEDULER_DAILY_BONUS_TIME = str(CONFIG["SCHEDULER_DAILY_BONUS_TIME"]).strip().strip('"')
+SCHEDULER_TAXES_TIME = str(CONFIG["SCHEDULER_TAXES_TIME"]).strip().strip('"')
+SCHEDULER_PUNISHMENT_CHECK_SECONDS = float(CONFIG["SCHEDULER_PUNISHMENT_CHECK_SECONDS"])
+SCHEDULER_JITTER_SECONDS = float(CONFIG["SCHEDULER_JITTER_SECONDS"])
+RP_EVENT_AUTO_CLOSE_HOURS = float(CONFIG["RP_EVENT_AUTO_CLOSE_HOURS"])
+
 def parse_emoji_list(s):
     """
     Парсит список эмодзи из строки, например:
@@ -150,33 +306,56 @@ def parse_emoji_list(s):
     
     return result
 
-# 3. Казино 1x3: Парсинг и Генерация
-SLOT_SYMBOLS_RAW = CONFIG["SLOT_SYMBOLS"]
-try:
-    SLOT_SYMBOLS = parse_emoji_list(SLOT_SYMBOLS_RAW)
-except:
-    SLOT_SYMBOLS = parse_emoji_list(STANDARD["SLOT_SYMBOLS"])
-
-# Генерация финальных констант для 1x3:
-SYMBOL_MULTIPLIERS, SYMBOL_WEIGHTS = generate_symbols_data(
-    SLOT_SYMBOLS,
-    base_mult=float(CONFIG["CASINO_BASE_MULT"]),
-    mult_step=float(CONFIG["CASINO_MULT_STEP"]),
-    base_weight=int(CONFIG["CASINO_BASE_WEIGHT"]),
-    weight_step=float(CONFIG["CASINO_WEIGHT_DIVISOR"])
-)
-
-# 4. Казино 3x3: Парсинг и Генерация
-SLOT3X3_SYMBOLS_RAW = CONFIG["SLOT3X3_SYMBOLS"]
-try:
-    SLOT3X3_SYMBOLS = parse_emoji_list(SLOT3X3_SYMBOLS_RAW)
-except:
-    SLOT3X3_SYMBOLS = parse_emoji_list(STANDARD["SLOT3X3_SYMBOLS"])
-
-SLOT3X3_MULTIPLIERS, SLOT3X3_WEIGHTS = generate_symbols_data(
-    SLOT3X3_SYMBOLS,
-    base_mult=float(CONFIG["SLOT3X3_BASE_MULT"]),
-    mult_step=float(CONFIG["SLOT3X3_MULT_STEP"]),
-    base_weight=int(CONFIG["SLOT3X3_BASE_WEIGHT"]),
-    weight_step=float(CONFIG["SLOT3X3_WEIGHT_STEP"])
-)
\ No newline at end of file
+def build_casino_tables(conf: dict) -> dict:
+    """
+    Символы, множители и веса обоих казино из словаря настроек.
+    Его же использует симулятор RTP (python -m benchmarks.rtp), чтобы проверить config.txt без бота.
+    """
+    def symbols(key):
+        raw = conf[key]
+        if isinstance(raw, list):  # Стандартные настройки хранят список, а не строку
+            return raw
+        try:
+            return parse_emoji_list(raw)
+        except:
+            return symbols_default(key)
+
+    def symbols_default(key):
+        raw = STANDARD[key]
+        return raw if isinstance(raw, list) else parse_emoji_list(raw)
+
+    # 3. Казино 1x3: Парсинг и Генерация
+    slot_symbols = symbols("SLOT_SYMBOLS")
+    multipliers, weights = generate_symbols_data(
+        slot_symbols,
+        base_mult=float(conf["CASINO_BASE_MULT"]),
+        mult_step=float(conf["CASINO_MULT_STEP"]),
+        base_weight=int(conf["CASINO_BASE_WEIGHT"]),
+        weight_step=float(conf["CASINO_WEIGHT_DIVISOR"])
+    )
+
+    # 4. Казино 3x3: Парсинг и Генерация
+    slot3x3_symbols = symbols("SLOT3X3_SYMBOLS")
+    multipliers3x3, weights3x3 = generate_symbols_data(
+        slot3x3_symbols,
+        base_mult=float(conf["SLOT3X3_BASE_MULT"]),
+        mult_step=float(conf["SLOT3X3_MULT_STEP"]),
+        base_weight=int(conf["SLOT3X3_BASE_WEIGHT"]),
+        weight_step=float(conf["SLOT3X3_WEIGHT_STEP"])
+    )
+
+    return {
+        "SLOT_SYMBOLS": slot_symbols,
+        "SYMBOL_MULTIPLIERS": multipliers,
+        "SYMBOL_WEIGHTS": weights,
+        "SLOT3X3_SYMBOLS": slot3x3_symbols,
+        "SLOT3X3_MULTIPLIERS": multipliers3x3,
+        "SLOT3X3_WEIGHTS": weights3x3,
+    }
+
+_CASINO = build_casino_tables(CONFIG)
+SLOT_SYMBOLS = _CASINO["SLOT_SYMBOLS"]
+SYMBOL_MULTIPLIERS, SYMBOL_WEIGHTS = _CASINO["SYMBOL_MULTIPLIERS"], _CASINO["SYMBOL_WEIGHTS"]
+SLOT3X3_SYMBOLS = _CASINO["SLOT3X3_SYMBOLS"]
+SLOT3X3_MULTIPLIERS, SLOT3X3_WEIGHTS = _CASINO["SLOT3X3_MULTIPLIERS"], _CASINO["SLOT3X3_WEIGHTS"]
+CASINO_REVEAL_DELAY = float(CONFIG["CASINO_REVEAL_DELAY"])
\ No newline at end of file
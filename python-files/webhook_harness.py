@@ -0,0 +1,90 @@
+"""
+Локальная проверка вебхука: шлёт синтетические апдейты на запущенный бот.
+
+    RUN_MODE=webhook python RPBot3.0.py          # в одном терминале
+    python webhook_harness.py --count 500 --concurrency 50
+
+Каждый апдейт — текстовое сообщение от случайного из --users пользователей
+в случайном из --chats чатов. Ответы бота в Telegram при этом уходят в реальный
+API (с тестовым токеном — с ошибкой), поэтому смотрим на коды ответов вебхука,
+задержку и /healthz, а не на сообщения в чате.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import aiohttp
+
+from config import WEBHOOK_LISTEN_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+TEXTS = ["рп профиль", "/start", "рандом", "/top", "привет"]
+
+
+def make_update(update_id: int, user_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"Harness {chat_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    url = args.url or f"http://127.0.0.1:{WEBHOOK_LISTEN_PORT}{WEBHOOK_PATH}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    statuses: Counter = Counter()
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def post(http: aiohttp.ClientSession, update_id: int) -> None:
+        update = make_update(
+            update_id,
+            user_id=1000 + random.randrange(args.users),
+            chat_id=-1000 - random.randrange(args.chats),
+            text=random.choice(TEXTS),
+        )
+        async with sem:
+            started = time.perf_counter()
+            try:
+                async with http.post(url, json=update, headers=headers) as resp:
+                    statuses[resp.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(post(http, i) for i in range(1, args.count + 1)))
+        elapsed = time.perf_counter() - started
+
+        health_url = url.rsplit(WEBHOOK_PATH, 1)[0] + "/healthz"
+        try:
+            async with http.get(health_url) as resp:
+                health = await resp.json()
+        except aiohttp.ClientError:
+            health = "недоступен"
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    print(f"Отправлено: {args.count} за {elapsed:.2f} сек. ({args.count / elapsed:.1f} апд/сек)")
+    print(f"Коды ответов: {dict(statuses)}")
+    print(f"Задержка ответа: p50={p50:.1f} мс, p99={p99:.1f} мс")
+    print(f"/healthz: {health}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетическая нагрузка на вебхук бота")
+    parser.add_argument("--url", help="Адрес вебхука (по умолчанию локальный из config)")
+    parser.add_argument("--count", type=int, default=200, help="Сколько апдейтов отправить")
+    parser.add_argument("--concurrency", type=int, default=20, help="Сколько запросов одновременно")
+    parser.add_argument("--users", type=int, default=50, help="Сколько разных пользователей")
+    parser.add_argument("--chats", type=int, default=5, help="Сколько разных чатов")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET, help="Секрет вебхука")
+    asyncio.run(main(parser.parse_args()))